@@ -0,0 +1,73 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import argparse
+import runpy
+import sys
+from pathlib import Path
+from src.results import RESULT_FORMATS
+
+# the commands running the CLI of a module, each module is only imported by its own command
+MODULE_COMMANDS = {
+    "batch": ("src.detector", "detect the takeoffs of every log of a directory into an output file"),
+    "plot": ("src.visualize", "plot the flight data and takeoff of every log of a detector output file"),
+    "bench": ("src.bench", "benchmark the takeoff detection pipeline"),
+    "index": ("src.flight_index", "query the takeoffs of the flight index"),
+    "sweep": ("src.sweep", "sweep the takeoff detection thresholds over every log"),
+    "watch": ("src.watch", "detect the takeoff of every log written to a directory"),
+    "archive": ("src.archive", "pack the logs into a memory mapped archive and query it"),
+}
+
+
+def detect(args: argparse.Namespace) -> int:
+    # imported here so the other commands do not load pandas and shapely
+    from src.detector import _process_file_safe, check_detection_options
+    from src.geo_utils import check_runway_engine
+    from src.results import format_result
+
+    try:
+        check_runway_engine()
+        check_detection_options(args.mode, args.stream)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    status = 0
+    for filepath in args.files:
+        result, _, _ = _process_file_safe(filepath, args.mode, args.stream)
+        if result["error"] is not None:
+            print(f"Failed {filepath.name}: {result['error']}", file=sys.stderr)
+            status = 1
+        sys.stdout.write(format_result(result, args.format))
+    return status
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(prog="python -m src", description="Flight log takeoff detection")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    detect_parser = commands.add_parser("detect", help="print the takeoff of the given logs")
+    detect_parser.add_argument("files", type=Path, nargs="+", help="paths of the logs")
+    # detector.DETECTION_MODES, repeated to parse the arguments before importing the detector
+    detect_parser.add_argument("--mode", choices=("vectorized", "reference"), default="vectorized")
+    detect_parser.add_argument("--stream", action="store_true", help="read each log in chunks, only up to its takeoff")
+    detect_parser.add_argument("--format", choices=RESULT_FORMATS, default="text")
+
+    for command, (_, description) in MODULE_COMMANDS.items():
+        commands.add_parser(command, help=description, add_help=False)
+
+    # the arguments of the module commands are parsed by the module itself
+    if argv and argv[0] in MODULE_COMMANDS:
+        module = MODULE_COMMANDS[argv[0]][0]
+        sys.argv[1:] = argv[1:]
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+        return 0
+
+    args = parser.parse_args(argv)
+    return detect(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from pathlib import Path
+from src.detector import get_filepaths, parse_airport_code
+from src.flight import DOUBLE_PRECISION_CHANNELS, TIME_COLUMNS
+from src.log_reader import read_log
+from src.utils import CSVColumns, MISSING_TIMESTAMP, TIMESTAMP_COLUMN, create_timestamps
+
+# bump when the layout of the archive changes, an archive of another version must be rebuilt
+ARCHIVE_VERSION = 1
+ARCHIVE_PATH = Path(
+    os.getenv("SENSOR_DATA_ARCHIVE", Path(__file__).parent.parent / ".cache" / "archive")
+)
+MANIFEST = "manifest.json"
+
+# the text channels, stored as int32 codes into a table of categories like Flight, -1 for missing values.
+# The other channels are stored as float32, or float64 for the coordinates.
+TEXT_CHANNELS = (CSVColumns.ActiveWaypoint, CSVColumns.HSIS, CSVColumns.GPSfix)
+
+# the samples of a channel converted at once by FleetArchive.flight_stats
+STATS_CHUNK_SAMPLES = 1 << 22
+
+# the per-flight metadata arrays, one value per flight
+METADATA = {"offsets": np.int64, "start_ts": np.int64, "end_ts": np.int64}
+
+
+def _channel_dtype(name: str) -> np.dtype:
+    if name == TIMESTAMP_COLUMN:
+        return np.dtype(np.int64)
+    if name in TEXT_CHANNELS:
+        return np.dtype(np.int32)
+    return np.dtype(np.float64 if name in DOUBLE_PRECISION_CHANNELS else np.float32)
+
+
+def build_archive(filepaths: list[Path], path: Path = ARCHIVE_PATH) -> "FleetArchive":
+    """
+    Pack the logs into a columnar archive: every channel of every log is appended to one flat binary file per
+    channel, next to the offsets of every flight within the channels and the time span and airport of every
+    flight. The logs are read one at a time, so building the archive only holds one log in memory.
+
+    The channels are the columns of the first log read, with the local date and time columns replaced by the
+    TIMESTAMP_COLUMN. A channel missing from a log is filled with NaN, or -1 for a text channel, and the
+    columns of a log missing from the first log are not archived. A log that cannot be read is skipped with a
+    message on stderr. The archive replaces any archive at path once complete.
+
+    Returns:
+        the archive, see FleetArchive
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    channels: list[str] | None = None
+    files: dict[str, object] = {}
+    categories: dict[str, dict[str, int]] = {}
+    names, airports = [], []
+    metadata = {key: [] for key in METADATA}
+    samples = 0
+
+    try:
+        for fp in filepaths:
+            # every channel of the log is converted before any is written, so a failed log leaves no samples
+            try:
+                df = read_log(fp)
+                log_channels = channels or [TIMESTAMP_COLUMN] + [col for col in df.columns if col not in TIME_COLUMNS]
+                log_categories = {name: dict(categories.get(name, {})) for name in log_channels if name in TEXT_CHANNELS}
+                timestamps = create_timestamps(df[CSVColumns.LocalDate], df[CSVColumns.LocalTime], df[CSVColumns.UTCOffset])
+                columns = {}
+                for name in log_channels:
+                    if name == TIMESTAMP_COLUMN:
+                        values = timestamps
+                    elif name in TEXT_CHANNELS:
+                        values = _encode(df[name] if name in df else pd.Series([np.nan] * len(df)), log_categories[name])
+                    elif name in df:
+                        values = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=_channel_dtype(name))
+                    else:
+                        values = np.full(len(df), np.nan, dtype=_channel_dtype(name))
+                    columns[name] = np.ascontiguousarray(values, dtype=_channel_dtype(name))
+                airport = parse_airport_code(fp)
+            except Exception as e:
+                print(f"Skipped {fp.name}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+
+            if channels is None:
+                channels = log_channels
+                files = {name: open(tmp_path / f"c{idx}.bin", "wb") for idx, name in enumerate(channels)}
+            categories = log_categories
+            for name in channels:
+                files[name].write(columns[name].tobytes())
+
+            recorded = timestamps[timestamps != MISSING_TIMESTAMP]
+            names.append(fp.name)
+            airports.append(airport)
+            metadata["offsets"].append(samples)
+            metadata["start_ts"].append(recorded.min() if len(recorded) else MISSING_TIMESTAMP)
+            metadata["end_ts"].append(recorded.max() if len(recorded) else MISSING_TIMESTAMP)
+            samples += len(df)
+    finally:
+        for f in files.values():
+            f.close()
+
+    metadata["offsets"].append(samples)
+    for key, dtype in METADATA.items():
+        np.save(tmp_path / f"{key}.npy", np.asarray(metadata[key], dtype=dtype))
+
+    manifest = {
+        "version": ARCHIVE_VERSION,
+        "samples": samples,
+        "flights": names,
+        "airports": airports,
+        "channels": [
+            {"name": name, "file": f"c{idx}.bin", "dtype": _channel_dtype(name).str}
+            for idx, name in enumerate(channels or [])
+        ],
+        "categories": {name: list(values) for name, values in categories.items()},
+    }
+    with open(tmp_path / MANIFEST, "w") as f:
+        json.dump(manifest, f)
+
+    # swap the complete archive in, readers of the previous archive keep their open files
+    old_path = path.with_name(path.name + ".old")
+    shutil.rmtree(old_path, ignore_errors=True)
+    if path.exists():
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    return FleetArchive(path)
+
+
+def _encode(values: pd.Series, categories: dict[str, int]) -> np.ndarray:
+    # the codes of the values into the archive-wide categories, extended with the new values
+    values = values.where(values.isna(), values.astype(str).str.strip())
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    lookup = np.array([categories.setdefault(value, len(categories)) for value in uniques] + [-1], dtype=np.int32)
+    return lookup[codes]
+
+
+class FleetArchive:
+    """
+    Read-only view of an archive written by build_archive.
+
+    The channels are memory mapped on first use, so reading a channel of any set of flights is a slice of the
+    mapped file: no parsing, no copy, and only the pages touched are read from disk.
+    """
+
+    def __init__(self, path: Path = ARCHIVE_PATH):
+        self.path = Path(path)
+        with open(self.path / MANIFEST) as f:
+            manifest = json.load(f)
+        if manifest["version"] != ARCHIVE_VERSION:
+            raise ValueError(f"Archive version {manifest['version']} of {self.path}, expected {ARCHIVE_VERSION}")
+
+        self.samples: int = manifest["samples"]
+        self.flights: list[str] = manifest["flights"]
+        self.airports = np.array(manifest["airports"], dtype=str)
+        self.categories = {name: np.array(values, dtype=str) for name, values in manifest["categories"].items()}
+        self._channels = {channel["name"]: channel for channel in manifest["channels"]}
+        self._mapped: dict[str, np.ndarray] = {}
+
+        self.offsets = np.load(self.path / "offsets.npy")
+        self.start_ts = np.load(self.path / "start_ts.npy")
+        self.end_ts = np.load(self.path / "end_ts.npy")
+
+    def __len__(self) -> int:
+        return len(self.flights)
+
+    def __repr__(self) -> str:
+        return f"FleetArchive({str(self.path)!r}, flights={len(self)}, samples={self.samples}, channels={len(self._channels)})"
+
+    @property
+    def channels(self) -> list[str]:
+        return list(self._channels)
+
+    def channel(self, name: str) -> np.ndarray:
+        """
+        The read-only samples of a channel across all flights, in flight order, see offsets
+        """
+        if name not in self._mapped:
+            channel = self._channels[name]
+            dtype = np.dtype(channel["dtype"])
+            if self.samples == 0:
+                self._mapped[name] = np.empty(0, dtype=dtype)
+            else:
+                self._mapped[name] = np.memmap(self.path / channel["file"], dtype=dtype, mode="r", shape=(self.samples,))
+        return self._mapped[name]
+
+    def flight_index(self, name: str) -> int:
+        return self.flights.index(name)
+
+    def flight(self, flight: int, name: str) -> np.ndarray:
+        """
+        The samples of a channel of one flight, a view of the mapped channel
+        """
+        return self.channel(name)[self.offsets[flight]:self.offsets[flight + 1]]
+
+    def select(self, airport_code: str | None = None, start: datetime | None = None, end: datetime | None = None) -> np.ndarray:
+        """
+        The indices of the flights of an airport and overlapping [start, end), naive datetimes are UTC
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if airport_code is not None:
+            selected &= self.airports == airport_code
+        if start is not None:
+            selected &= self.end_ts >= _epoch(start)
+        if end is not None:
+            selected &= (self.start_ts < _epoch(end)) & (self.start_ts != MISSING_TIMESTAMP)
+        return np.flatnonzero(selected)
+
+    def gather(self, name: str, flights: np.ndarray | list[int]) -> list[np.ndarray]:
+        """
+        The samples of a channel of every flight of flights, views of the mapped channel
+        """
+        return [self.flight(flight, name) for flight in flights]
+
+    def decode(self, name: str, codes: np.ndarray) -> np.ndarray:
+        """
+        The values of the codes of a text channel, with None for missing values
+        """
+        values = np.empty(len(codes), dtype=object)
+        valid = codes >= 0
+        values[valid] = self.categories[name][codes[valid]]
+        return values
+
+    def flight_stats(self, name: str, flights: np.ndarray | list[int] | None = None) -> pd.DataFrame:
+        """
+        The number of valid samples and the mean, minimum and maximum of a numeric channel per flight, ignoring
+        the missing values. A whole-fleet query reads the channel once from start to end.
+        """
+        flights = np.arange(len(self)) if flights is None else np.asarray(flights, dtype=np.int64)
+        starts, ends = self.offsets[flights], self.offsets[flights + 1]
+
+        stats = {"count": np.zeros(len(flights), dtype=np.int64)}
+        for key in ("mean", "min", "max"):
+            stats[key] = np.full(len(flights), np.nan)
+
+        # the selected flights are reduced in batches of adjacent flights, each batch read from the mapped
+        # channel in one sequential pass and converted to float64 in memory of at most STATS_CHUNK_SAMPLES
+        batch_start = 0
+        for i in range(1, len(flights) + 1):
+            if i < len(flights) and starts[i] == ends[i - 1] and ends[i] - starts[batch_start] <= STATS_CHUNK_SAMPLES:
+                continue
+            batch = np.arange(batch_start, i)
+            batch_start = i
+            batch = batch[ends[batch] > starts[batch]]
+            if len(batch) == 0:
+                continue
+
+            values = np.asarray(self.channel(name)[starts[batch[0]]:ends[batch[-1]]], dtype=np.float64)
+            bounds = starts[batch] - starts[batch[0]]
+            valid = ~np.isnan(values)
+            count = np.add.reduceat(valid, bounds)
+            stats["count"][batch] = count
+            with np.errstate(invalid="ignore", divide="ignore"):
+                stats["mean"][batch] = np.add.reduceat(np.where(valid, values, 0.0), bounds) / count
+            stats["min"][batch] = np.fmin.reduceat(values, bounds)
+            stats["max"][batch] = np.fmax.reduceat(values, bounds)
+
+        return pd.DataFrame({"flight": [self.flights[flight] for flight in flights], "airport": self.airports[flights], **stats})
+
+
+def _epoch(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the flight logs into a memory mapped archive and query it")
+    parser.add_argument("--archive", type=Path, default=ARCHIVE_PATH, help="directory of the archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="pack every log of a directory into the archive")
+    build.add_argument("--data-dir", type=Path, default=None, help="directory of the logs")
+    stats = commands.add_parser("stats", help="print the statistics of a channel per flight")
+    stats.add_argument("channel", help="e.g. 'E1 CHT1'")
+    stats.add_argument("--airport", default=None, help="airport code, e.g. KPAO")
+    stats.add_argument("--start", type=datetime.fromisoformat, default=None, help="first UTC date, e.g. 2020-11-01")
+    stats.add_argument("--end", type=datetime.fromisoformat, default=None, help="UTC date after the last flight")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        archive = build_archive(get_filepaths(args.data_dir), args.archive)
+        print(archive)
+    else:
+        archive = FleetArchive(args.archive)
+        selected = archive.select(args.airport, args.start, args.end)
+        print(archive.flight_stats(args.channel, selected).to_string(index=False))
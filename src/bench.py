@@ -0,0 +1,197 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src import detector, geo_utils, log_reader
+from src.detector import DATA_DIR, SMOOTHED_COLUMNS, SMOOTHING_WINDOW, get_filepaths, read_data
+from src.filters import moving_average
+from src.geo_utils import load_airport_runways, on_runway, runway_index
+from src.synthetic import generate_corpus
+from src.utils import CSVColumns, moving_average_filter
+
+BENCH_SCHEMA_VERSION = 1
+# the number of logs in data/cessna_182t, a corpus of scale N holds N times as many synthetic logs
+SAMPLE_CORPUS_SIZE = 36
+BENCH_CORPUS_DIR = Path(__file__).parent.parent / ".cache" / "bench"
+
+
+def measure(name: str, func, items: int, unit: str, repeat: int = 3) -> dict:
+    """
+    Time func repeat times and return the benchmark record
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    best = min(durations)
+    return {
+        "name": name,
+        "items": items,
+        "unit": unit,
+        "runs": repeat,
+        "min_s": best,
+        "mean_s": float(np.mean(durations)),
+        "per_second": items / best if best > 0 else None,
+    }
+
+
+@contextlib.contextmanager
+def _log_cache(enabled: bool):
+    previous = log_reader.CACHE_ENABLED
+    log_reader.CACHE_ENABLED = enabled
+    try:
+        yield
+    finally:
+        log_reader.CACHE_ENABLED = previous
+
+
+def prepare_corpus(scale: int, seed: int = 0, jobs: int = 1) -> Path:
+    """
+    Return the directory of a synthetic corpus of scale times the sample logs, generating it on first use
+    """
+    corpus_dir = BENCH_CORPUS_DIR / f"scale-{scale}-seed-{seed}"
+    count = scale * SAMPLE_CORPUS_SIZE
+    if len(get_filepaths(corpus_dir)) != count:
+        generate_corpus(corpus_dir, count, seed=seed, jobs=jobs)
+    return corpus_dir
+
+
+def run_benchmarks(corpus_dir: Path, repeat: int = 3, jobs: int = 1, reference: bool = True) -> list[dict]:
+    """
+    Benchmark the stages of the detection pipeline on the largest log of the corpus, and the batch over the corpus
+    """
+    filepaths = get_filepaths(corpus_dir)
+    filepath = max(filepaths, key=lambda fp: fp.stat().st_size)
+    airport_code = detector.parse_airport_code(filepath)
+
+    df, runways = read_data(filepath)
+    samples = len(df)
+    lat = df[CSVColumns.Latitude].to_numpy()
+    lng = df[CSVColumns.Longitude].to_numpy()
+    raw = log_reader.read_log(filepath, SMOOTHED_COLUMNS)[SMOOTHED_COLUMNS].to_numpy(dtype=float)
+
+    def load_runways_cold():
+        geo_utils.get_runway_catalog.cache_clear()
+        load_airport_runways(airport_code)
+
+    def read_data_parse():
+        with _log_cache(False):
+            read_data(filepath)
+
+    results = [
+        measure("read_data.parse", read_data_parse, samples, "samples", repeat),
+        measure("read_data.cached", lambda: read_data(filepath), samples, "samples", repeat),
+        measure(
+            "moving_average_filter",
+            lambda: [moving_average_filter(raw[:, col], SMOOTHING_WINDOW) for col in range(raw.shape[1])],
+            samples, "samples", repeat,
+        ),
+        measure("filters.moving_average", lambda: moving_average(raw, SMOOTHING_WINDOW), samples, "samples", repeat),
+        measure("load_airport_runways.cold", load_runways_cold, 1, "calls", repeat),
+        measure("load_airport_runways.warm", lambda: load_airport_runways(airport_code), 1, "calls", repeat),
+        measure("on_runway", lambda: [on_runway(la, lo, runways) for la, lo in zip(lat, lng)], samples, "samples", repeat),
+        measure("runway_index", lambda: runway_index(lat, lng, runways), samples, "samples", repeat),
+        measure(
+            "detect_valid_takeoff_timestamp.vectorized",
+            lambda: detector.detect_valid_takeoff_timestamp(df, runways, "vectorized"),
+            samples, "samples", repeat,
+        ),
+    ]
+    if reference:
+        results.append(measure(
+            "detect_valid_takeoff_timestamp.reference",
+            lambda: detector.detect_valid_takeoff_timestamp(df, runways, "reference"),
+            samples, "samples", repeat,
+        ))
+
+    with tempfile.TemporaryDirectory() as tmp_dir, contextlib.redirect_stdout(io.StringIO()):
+        output_file_path = str(Path(tmp_dir) / "output.txt")
+        # the first batch fills the log cache, the batches are timed with a warm cache
+        detector.main(output_file_path, data_dir=corpus_dir)
+
+        results.append(measure(
+            "main.sequential", lambda: detector.main(output_file_path, data_dir=corpus_dir),
+            len(filepaths), "files", repeat,
+        ))
+        if jobs > 1:
+            results.append(measure(
+                f"main.jobs_{jobs}", lambda: detector.main(output_file_path, jobs=jobs, data_dir=corpus_dir),
+                len(filepaths), "files", repeat,
+            ))
+        results.append(measure(
+            "main.stream", lambda: detector.main(output_file_path, stream=True, data_dir=corpus_dir),
+            len(filepaths), "files", repeat,
+        ))
+
+    return results
+
+
+def environment() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(description="Benchmark the takeoff detection pipeline")
+    corpus = parser.add_mutually_exclusive_group()
+    corpus.add_argument("--scale", type=int, default=0, help="synthetic corpus of SCALE times the sample logs")
+    corpus.add_argument("--data-dir", type=Path, default=None, help="directory of logs, defaults to the sample logs")
+    parser.add_argument("-o", "--output", default="bench_output.json", help="JSON results file")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes of the batch benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus")
+    parser.add_argument("--skip-reference", action="store_true", help="skip the row by row detection benchmark")
+    args = parser.parse_args(argv)
+
+    if args.scale > 0:
+        corpus_dir = prepare_corpus(args.scale, args.seed, args.jobs)
+    else:
+        corpus_dir = args.data_dir or DATA_DIR
+
+    filepaths = get_filepaths(corpus_dir)
+    report = {
+        "schema_version": BENCH_SCHEMA_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "corpus": {
+            "directory": str(Path(corpus_dir).resolve()),
+            "synthetic": args.scale > 0,
+            "scale": args.scale,
+            "files": len(filepaths),
+            "bytes": sum(fp.stat().st_size for fp in filepaths),
+        },
+        "benchmarks": run_benchmarks(corpus_dir, args.repeat, args.jobs, not args.skip_reference),
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for result in report["benchmarks"]:
+        print(f"{result['name']:<45} {result['min_s'] * 1000:>10.2f} ms  {result['items']:>8} {result['unit']}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
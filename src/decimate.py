@@ -0,0 +1,88 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import numpy as np
+
+
+def _lttb_segment(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets over x[0]..x[-1]: both ends are kept and each of the points buckets
+    # of the interior samples contributes the sample forming the largest triangle with the sample kept
+    # in the previous bucket and the average of the next bucket
+    n = len(x)
+    if points >= n - 2:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points + 1).astype(np.int64)
+    selected = np.empty(points + 2, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    # the average of every bucket, followed by the last sample which closes the last bucket's triangle
+    sizes = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / sizes, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / sizes, y[-1])
+
+    previous = 0
+    for bucket in range(points):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        x_prev, y_prev = x[previous], y[previous]
+
+        # twice the triangle areas, the constant factor does not change the largest one
+        areas = np.abs((x_prev - next_x) * (y[lo:hi] - y_prev) - (x_prev - x[lo:hi]) * (next_y - y_prev))
+        previous = lo + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int, keep: list[int] | tuple[int, ...] = ()) -> np.ndarray:
+    """
+    Downsample a series for display with Largest-Triangle-Three-Buckets, which keeps the peaks and the
+    shape of the line unlike taking every n-th sample.
+
+    Params:
+        x: sample positions, increasing
+        y: sample values, NaN values count as the previous valid value when picking the samples
+        max_points: the number of samples to keep, at least 2 plus the kept samples
+        keep: indices of samples that are always kept, e.g. the takeoff sample. Negative indices are ignored.
+
+    Returns:
+        sorted indices of the samples to plot, all samples when the series is short enough
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    # the series is split at the kept samples and each segment is decimated between its fixed ends,
+    # spreading the remaining points in proportion to the segment lengths
+    anchors = np.unique(np.concatenate(([0, n - 1], [k for k in keep if 0 <= k < n]))).astype(np.int64)
+    budget = max(max_points - len(anchors), 0)
+    interior = np.diff(anchors) - 1
+    shares = np.floor(budget * interior / max(interior.sum(), 1)).astype(np.int64)
+
+    # NaN values would make every triangle area NaN, they are replaced by the previous valid value
+    valid = ~np.isnan(y)
+    if not valid.all():
+        last_valid = np.maximum.accumulate(np.where(valid, np.arange(n), 0))
+        y = np.where(valid, y, y[last_valid])
+        y = np.nan_to_num(y, nan=0.0)
+
+    indices = [anchors[:1]]
+    for start, end, points in zip(anchors[:-1], anchors[1:], shares):
+        indices.append(start + _lttb_segment(x[start:end + 1], y[start:end + 1], int(points))[1:])
+    return np.concatenate(indices)
+
+
+def decimate(x: np.ndarray, y: np.ndarray, max_points: int | None, keep: list[int] | tuple[int, ...] = ()) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the (x, y) samples of a series to plot, see lttb_indices. No decimation when max_points is None.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if max_points is None:
+        return x, y
+    indices = lttb_indices(x, y, max_points, keep)
+    return x[indices], y[indices]
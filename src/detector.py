@@ -2,10 +2,24 @@
 # Copyright: Jose Rojas, 2024
 #
 
+import argparse
+import contextlib
+import os
+import time
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from heapq import nlargest
+from itertools import repeat
 from pathlib import Path
 from shapely import Polygon, Point
-from src.geo_utils import load_airport_runways, on_runway
+from src import metrics
+from src.results import RESULT_FORMATS, ResultWriter, make_result
+from src.filters import moving_average
+from src.flight import Flight
+from src.geo_utils import check_runway_engine, get_runway_catalog, load_airport_runways, on_runway, runway_index
+from src.log_reader import read_log
+from src.resample import REPAIR_GAPS, SOURCE_ROW_COLUMN, VALID_COLUMN, repair_gaps
 import sys
 
 VISUALIZE = True
@@ -14,55 +28,194 @@ ENGINE_SPEED_PREFLIGHT_THRESHOLD = 1500
 ENGINE_SPEED_TAKEOFF_THRESHOLD = 1200
 ALTITUDE_ERROR = 50
 
+# "vectorized" evaluates the takeoff conditions on whole arrays, "reference" is the original row by row scan
+DETECTION_MODES = ("vectorized", "reference")
+
 from src.utils import (
     create_timestamp,
+    create_timestamps,
     CSVColumns,
-    moving_average_filter
+    MISSING_TIMESTAMP,
+    TIMESTAMP_COLUMN
 )
 
 
-def get_filepaths() -> list[Path]:
-    data_dir = Path(__file__).parent / ".." / "data" / "cessna_182t"
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+
+def get_filepaths(data_dir: Path | None = None) -> list[Path]:
+    data_dir = Path(data_dir) if data_dir is not None else DATA_DIR
     data_files = data_dir.glob("*.csv")
-    return list(data_files)
-
-
-def read_data(filepath: Path) -> tuple[pd.DataFrame, list[tuple[Polygon, float]]]:
-    columns = [
-        CSVColumns.Latitude,
-        CSVColumns.Longitude,
-        CSVColumns.UTCOffset,
-        CSVColumns.LocalDate,
-        CSVColumns.LocalTime,
-        CSVColumns.GndSpd,
-        CSVColumns.E1_RPM,
-        CSVColumns.AltMSL
-    ]
-
-    # the column header names are contained in the 2nd row of the file, thus header=1
-    # the CSV file contains tabs and extra spaces to separates columns so a regex is required for the delimiter
-    df = pd.read_csv(filepath, usecols=columns, header=1, delimiter=r',\s*', engine='python')
-
-    # Smooth the speed, engine rpm, altimeter values
-    for col in [CSVColumns.GndSpd, CSVColumns.E1_RPM, CSVColumns.AltMSL]:
-        df_in = df[col].to_numpy().transpose()
-        df_smoothed = moving_average_filter(
-           df_in, window_size=5
+    return sorted(data_files)
+
+
+# the columns read from each log, and the noisy sensor columns smoothed before detection
+READ_COLUMNS = [
+    CSVColumns.Latitude,
+    CSVColumns.Longitude,
+    CSVColumns.UTCOffset,
+    CSVColumns.LocalDate,
+    CSVColumns.LocalTime,
+    CSVColumns.GndSpd,
+    CSVColumns.E1_RPM,
+    CSVColumns.AltMSL
+]
+SMOOTHED_COLUMNS = [CSVColumns.GndSpd, CSVColumns.E1_RPM, CSVColumns.AltMSL]
+SMOOTHING_WINDOW = 5
+# the numeric columns resampled by read_data when repairing the dropouts
+RESAMPLED_COLUMNS = [CSVColumns.Latitude, CSVColumns.Longitude] + SMOOTHED_COLUMNS
+
+
+def parse_airport_code(filepath: Path) -> str:
+    # the log files are named log_<date>_<time>_<airport>.csv
+    return str(filepath).replace('.csv', '').split("_")[-1]
+
+
+def read_data(filepath: Path, repair: bool | None = None) -> tuple[pd.DataFrame, list[tuple[Polygon, float]]]:
+    """
+    Read a log, smooth its noisy sensor columns and add its UTC time axis.
+
+    Params:
+        repair: resample the log onto a uniform time axis first, interpolating the short dropouts, see
+            resample.repair_gaps. The samples are then no longer the rows of the log, the SOURCE_ROW_COLUMN
+            holds the row of every sample. Defaults to resample.REPAIR_GAPS.
+    """
+    if repair is None:
+        repair = REPAIR_GAPS
+
+    # the column header names are contained in the 2nd row of the file and the fields are padded with spaces,
+    # read_log tokenizes the file with the C engine and caches the parsed columns for re-runs
+    df = read_log(filepath, READ_COLUMNS)
+    metrics.set_rows(len(df))
+
+    # build the UTC time axis of the flight in one pass over the date, time and offset columns
+    with metrics.stage("timestamps", len(df)):
+        df[TIMESTAMP_COLUMN] = create_timestamps(
+            df[CSVColumns.LocalDate], df[CSVColumns.LocalTime], df[CSVColumns.UTCOffset]
         )
-        # ensure the smoothed data is the same size as original data samples
-        assert df_in.shape == df_smoothed.shape
-        df[col] = pd.DataFrame(df_smoothed.transpose())
+
+    # with a uniform time axis every smoothing window spans the same time, and a missing value is averaged
+    # out instead of blanking its window or the samples at the ends being averaged with zeros
+    if repair:
+        with metrics.stage("repair_gaps", len(df)):
+            df = repair_gaps(df, RESAMPLED_COLUMNS)
+
+    # Smooth the speed, engine rpm, altimeter values in one call over all three channels
+    with metrics.stage("smooth", len(df)):
+        values = df[SMOOTHED_COLUMNS].to_numpy(dtype=float)
+        if repair:
+            smoothed = moving_average(values, window_size=SMOOTHING_WINDOW, nan_policy="omit", edge="shrink")
+            smoothed[np.isnan(values)] = np.nan
+        else:
+            smoothed = moving_average(values, window_size=SMOOTHING_WINDOW)
+        df[SMOOTHED_COLUMNS] = smoothed
 
     # parse airport code
-    airport_code = str(filepath).replace('.csv', '').split("_")[-1]
+    airport_code = parse_airport_code(filepath)
 
     # read the airport file
-    runways = load_airport_runways(airport_code)
+    with metrics.stage("load_runways"):
+        runways = load_airport_runways(airport_code)
 
     return df, runways
 
 
-def detect_valid_takeoff_timestamp(df: pd.DataFrame, runways: list[tuple[Polygon, float]]) -> tuple[float | None, int, int]:
+def read_flight(filepath: Path, repair: bool | None = None) -> Flight:
+    """
+    Read a log like read_data into a compact Flight, holding the smoothed channels, the time axis
+    and the airport's runways. The log is read whole into a DataFrame first, so the Flight shrinks the memory
+    held once the log is read, not the peak memory of reading it.
+    """
+    df, runways = read_data(filepath, repair)
+    airport_code = parse_airport_code(filepath)
+
+    with metrics.stage("build_flight", len(df)):
+        return Flight.from_dataframe(
+            df, filepath.name, airport_code, runways, get_runway_catalog().runway_names(airport_code)
+        )
+
+
+def takeoff_mask(df: pd.DataFrame | Flight, runways: list[tuple[Polygon, float]]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate the takeoff conditions on every sample of smoothed flight data.
+
+    Returns:
+        (boolean mask of the samples meeting all takeoff conditions, runway id per sample or -1)
+    """
+    elevation = runways[0][1]
+
+    with metrics.stage("runway_lookup", len(df)):
+        runway_ids = runway_index(np.asarray(df[CSVColumns.Latitude]), np.asarray(df[CSVColumns.Longitude]), runways)
+
+    on_ground = np.abs(np.asarray(df[CSVColumns.AltMSL]) - elevation) < ALTITUDE_ERROR
+    threshold_reached = (np.asarray(df[CSVColumns.GndSpd]) > GROUND_SPEED_TAKEOFF_THRESHOLD) | \
+        (np.asarray(df[CSVColumns.E1_RPM]) > ENGINE_SPEED_TAKEOFF_THRESHOLD)
+
+    takeoff = on_ground & (runway_ids != -1) & threshold_reached
+    # the samples of a long dropout of a repaired log are never a takeoff
+    if VALID_COLUMN in df:
+        takeoff &= np.asarray(df[VALID_COLUMN]).astype(bool)
+
+    return takeoff, runway_ids
+
+
+def detect_valid_takeoff_timestamp(
+    df: pd.DataFrame | Flight, runways: list[tuple[Polygon, float]] | None = None, mode: str = "vectorized"
+) -> tuple[float | None, int, int]:
+    """
+    Detect the first valid takeoff initiation: the aircraft is on the ground, on a runway, and
+    has reached either the takeoff ground speed or the takeoff engine RPM.
+
+    Params:
+        df: the flight samples returned by read_data, or a Flight returned by read_flight
+        runways: the airport's runways returned by read_data, defaults to the Flight's runways
+        mode: one of DETECTION_MODES, both modes return the same result
+
+    Returns:
+        (utc timestamp or None, takeoff index or -1, runway id or -1)
+    """
+    if runways is None:
+        if not isinstance(df, Flight):
+            raise ValueError("The runways are required to detect the takeoff of a DataFrame")
+        runways = df.runways
+
+    if mode == "reference":
+        if isinstance(df, Flight):
+            raise ValueError("The reference mode scans the rows of a DataFrame, use read_data instead of read_flight")
+        if SOURCE_ROW_COLUMN in df:
+            raise ValueError("The reference mode scans the rows of the log, read the log without repairing it")
+        with metrics.stage("detect_rows", len(df)):
+            return detect_valid_takeoff_timestamp_reference(df, runways)
+    if mode != "vectorized":
+        raise ValueError(f"Unknown detection mode '{mode}', expected one of {DETECTION_MODES}")
+
+    takeoff, runway_ids = takeoff_mask(df, runways)
+
+    takeoff_idx = int(np.argmax(takeoff)) if takeoff.any() else -1
+
+    # like the row scan, report the runway of the takeoff sample, or of the last sample without a takeoff
+    if takeoff_idx >= 0:
+        runway_id = int(runway_ids[takeoff_idx])
+    else:
+        runway_id = int(runway_ids[-1]) if len(runway_ids) > 0 else -1
+
+    utc_timestamp = None
+    if takeoff_idx >= 0:
+        sample = takeoff_idx
+        # the takeoff of a repaired log is reported as the row of the log with its timestamp. The samples of an
+        # interpolated dropout map to the row recorded after it, whose own sample is the last one mapping to it.
+        if SOURCE_ROW_COLUMN in df:
+            rows = np.asarray(df[SOURCE_ROW_COLUMN])
+            takeoff_idx = int(rows[sample])
+            later_rows = np.flatnonzero(rows[sample:] != rows[sample])
+            sample += int(later_rows[0]) - 1 if len(later_rows) else len(rows) - 1 - sample
+        timestamp = np.asarray(df[TIMESTAMP_COLUMN])[sample]
+        utc_timestamp = float(timestamp) if timestamp != MISSING_TIMESTAMP else None
+
+    return utc_timestamp, takeoff_idx, runway_id
+
+
+def detect_valid_takeoff_timestamp_reference(df: pd.DataFrame, runways: list[tuple[Polygon, float]]) -> tuple[float | None, int, int]:
 
     runway_id = -1
     takeoff_idx = -1
@@ -100,32 +253,263 @@ def detect_valid_takeoff_timestamp(df: pd.DataFrame, runways: list[tuple[Polygon
     return utc_timestamp, takeoff_idx, runway_id
 
 
-def main(output_file_path: str):
-
-    output_data = []
-
-    data_filepaths = get_filepaths()
-
-    for idx, fp in enumerate(data_filepaths):
-        print(f"Reading {fp.name}...")
-
-        df, runways = read_data(fp)
+def check_detection_options(mode: str = "vectorized", stream: bool = False, repair: bool | None = None):
+    """
+    Validate a detection mode and the streaming reader against the gap repair, see read_data. The reference
+    mode scans the rows of the log and the streaming reader its chunks as recorded, neither repairs the gaps.
+
+    Raises:
+        ValueError for an unknown mode, or the reference mode or streaming with the repair on
+    """
+    if repair is None:
+        repair = REPAIR_GAPS
+    if mode not in DETECTION_MODES:
+        raise ValueError(f"Unknown detection mode '{mode}', expected one of {DETECTION_MODES}")
+    if repair and (stream or mode == "reference"):
+        reader = "streaming reader" if stream else "reference mode"
+        raise ValueError(f"The {reader} does not repair the gaps of the logs, unset SENSOR_DATA_REPAIR_GAPS")
+
+
+def process_file(filepath: Path, mode: str = "vectorized", stream: bool = False) -> tuple[float | str | None, int, int]:
+    """
+    Read a single log and detect its first valid takeoff.
+
+    Params:
+        filepath: path of the log
+        mode: one of DETECTION_MODES
+        stream: read the log in chunks and stop at the takeoff instead of loading the whole flight
+
+    Returns:
+        (utc timestamp or None, takeoff index or -1, runway id or -1)
+    """
+    if stream:
+        check_detection_options(mode, stream)
+        from src.streaming import detect_takeoff_streaming
+        return detect_takeoff_streaming(filepath)
+
+    if mode == "reference":
+        df, runways = read_data(filepath)
         if len(runways) > 0:
-            ts, ts_ind, runway_id = detect_valid_takeoff_timestamp(df, runways)
-        else:
-            ts = 'None'
-            ts_ind = -1
-            runway_id = -1
-
-        output_data.append(f"{fp.name}, {runway_id}, {ts}, {ts_ind}\n")
-
-    with open(output_file_path, "w") as f:
-        f.writelines(output_data)
+            return detect_valid_takeoff_timestamp(df, runways, mode)
+        return 'None', -1, -1
+
+    flight = read_flight(filepath)
+    if len(flight.runways) > 0:
+        return detect_valid_takeoff_timestamp(flight, mode=mode)
+
+    return 'None', -1, -1
+
+
+def _process_file_safe(
+    filepath: Path, mode: str, stream: bool, record_metrics: bool = False, trace_memory: bool = False, indexed: bool = False
+) -> tuple[dict, dict | None, dict | None]:
+    # returns the result of the file, see results.make_result, the file's metrics if recorded and the file's
+    # flight index entry if indexed
+    recorder = metrics.FileMetrics(filepath.name, trace_memory) if record_metrics else contextlib.nullcontext()
+    entry = None
+    start = time.perf_counter()
+    with recorder:
+        try:
+            if indexed:
+                from src.flight_index import index_file
+                (ts, ts_ind, runway_id), entry = index_file(filepath, mode)
+            else:
+                ts, ts_ind, runway_id = process_file(filepath, mode, stream)
+            error = None
+        except Exception as e:
+            ts, ts_ind, runway_id = 'None', -1, -1
+            error = f"{type(e).__name__}: {e}"
+    wall_s = time.perf_counter() - start
+
+    record = None
+    if record_metrics:
+        record = recorder.to_dict()
+        record.update(mode="stream" if stream and not indexed else mode, error=error)
+
+    return make_result(filepath.name, ts, ts_ind, runway_id, wall_s, error), record, entry
+
+
+def _init_worker():
+    # load the runway geometry once per worker process rather than once per file
+    get_runway_catalog()
+
+
+def main(
+    output_file_path: str,
+    mode: str = "vectorized",
+    jobs: int = 1,
+    stream: bool = False,
+    data_dir: Path | None = None,
+    metrics_path: str | None = None,
+    trace_memory: bool | None = None,
+    profile: int = 0,
+    profile_dir: Path = Path("profiles"),
+    index_path: Path | None = None,
+    output_format: str | None = None,
+    resume: bool = False,
+) -> list[tuple[str, str]]:
+    """
+    Detect the takeoffs of all logs and write one line per log to the output file, in file name order.
+    Every result is written as soon as the log is processed, the file is sorted once all logs are done.
+
+    Params:
+        output_file_path: path of the output file
+        mode: one of DETECTION_MODES
+        jobs: number of worker processes, 0 to use all CPUs
+        stream: read each log only up to its takeoff, see process_file
+        data_dir: directory of the logs, defaults to DATA_DIR
+        metrics_path: JSON-lines file of the wall time, rows and peak memory of every log and stage,
+            the instrumentation is off when None. Defaults to metrics.METRICS_PATH.
+        trace_memory: also record the peak memory, which slows the run down, defaults to metrics.TRACE_MEMORY
+        profile: re-run the slowest logs under cProfile after the batch, dumping one .prof file per log
+        profile_dir: directory of the cProfile dumps
+        index_path: flight index of the logs, see flight_index.FlightIndex. Only the logs that are new or
+            changed since the last run are read, the others are written from the index. The indexed logs
+            are always read whole, stream is ignored.
+        output_format: one of results.RESULT_FORMATS, defaults to the format of the output file's suffix. The
+            csv and jsonl formats add the time spent on every log and the error of the failed logs.
+        resume: skip the logs already in the output file of an interrupted run, the failed logs are retried.
+            The text format does not tell failed logs from logs without takeoff, both are retried, see
+            results.ResultWriter.completed
+
+    Returns:
+        (file name, error message) of every log that failed, these logs are written without a takeoff
+    """
+
+    # a bad configuration fails the run once, not every log
+    check_runway_engine()
+    check_detection_options(mode, stream)
+
+    failures = []
+    records = []
+
+    data_filepaths = get_filepaths(data_dir)
+    writer = ResultWriter(output_file_path, output_format, resume)
+
+    index = None
+    pending = data_filepaths
+    if index_path is not None:
+        from src.flight_index import FlightIndex
+        index = FlightIndex(index_path)
+        index.remove_missing(data_filepaths)
+        pending = index.stale(data_filepaths, mode)
+
+    if resume:
+        completed = writer.completed()
+        pending = [fp for fp in pending if fp.name not in completed]
+
+    if metrics_path is None:
+        metrics_path = metrics.METRICS_PATH
+    # the slowest logs are picked from the metrics, so they are recorded for profiling even without a metrics file
+    record_metrics = metrics_path is not None or profile > 0
+    if trace_memory is None:
+        trace_memory = metrics.TRACE_MEMORY
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    args = (pending, repeat(mode), repeat(stream), repeat(record_metrics), repeat(trace_memory), repeat(index is not None))
+    if jobs > 1 and len(pending) > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker)
+        # hand out several files per task to amortize the inter-process overhead on large batches
+        chunksize = max(1, len(pending) // (jobs * 8))
+        results = executor.map(_process_file_safe, *args, chunksize=chunksize)
+    else:
+        executor = None
+        results = map(_process_file_safe, *args)
+
+    try:
+        for fp, (result, record, entry) in zip(pending, results):
+            print(f"Read {fp.name}")
+            error = result["error"]
+            if error is not None:
+                print(f"Failed {fp.name}: {error}", file=sys.stderr)
+                failures.append((fp.name, error))
+            writer.write(result)
+            if record is not None:
+                records.append(record)
+            if index is not None:
+                index.add(fp, entry, mode, error)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if index is not None:
+            index.commit()
+        writer.close()
+
+    if index is not None:
+        # the logs that did not change since the last run
+        for fp in data_filepaths:
+            if fp.name not in writer.results:
+                writer.results[fp.name] = index.result(fp)
+        index.close()
+
+    writer.finish([fp.name for fp in data_filepaths])
+
+    if failures:
+        print(f"{len(failures)} of {len(data_filepaths)} files failed", file=sys.stderr)
+
+    if records:
+        if metrics_path is not None:
+            metrics.write_metrics(metrics_path, records)
+        print(metrics.format_summary(records))
+
+    if profile > 0:
+        profile_dir = Path(profile_dir)
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        durations = {record["file"]: record["wall_s"] for record in records}
+        for fp in nlargest(profile, pending, key=lambda fp: durations[fp.name]):
+            profile_path = profile_dir / f"{fp.stem}.prof"
+            try:
+                metrics.profile_call(profile_path, process_file, fp, mode, stream)
+            except Exception:
+                # the failure was already reported by the batch
+                pass
+            print(f"Profiled {fp.name} to {profile_path}")
+
+    return failures
 
 
 if __name__ == "__main__":
-    output_file_path = "output.txt"
-    if len(sys.argv) > 1:
-        output_file_path = sys.argv[1]
-
-    main(output_file_path)
+    from src.flight_index import INDEX_PATH
+
+    parser = argparse.ArgumentParser(description="Detect the first valid takeoff of every flight log")
+    parser.add_argument("output_file_path", nargs="?", default="output.txt")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes, 0 for all CPUs")
+    parser.add_argument("--mode", choices=DETECTION_MODES, default="vectorized")
+    parser.add_argument("--stream", action="store_true", help="read each log in chunks, only up to its takeoff")
+    parser.add_argument("--data-dir", type=Path, default=None, help="directory of the logs")
+    parser.add_argument(
+        "--metrics", default=None, metavar="PATH",
+        help="record the time, rows and peak memory of every log and stage to a JSON-lines file, "
+        "defaults to $SENSOR_DATA_METRICS",
+    )
+    parser.add_argument(
+        "--memory", action="store_true", default=None,
+        help="also record the peak memory of every log and stage, an order of magnitude slower",
+    )
+    parser.add_argument(
+        "--index", type=Path, nargs="?", const=INDEX_PATH, default=None, metavar="PATH",
+        help=f"only read the logs that are new or changed since the last run, keeping the results in a SQLite index "
+        f"(default {INDEX_PATH})",
+    )
+    parser.add_argument(
+        "--format", choices=RESULT_FORMATS, default=None,
+        help="format of the output file, defaults to csv for a .csv file, jsonl for a .jsonl file and text otherwise",
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="skip the logs already in the output file of an interrupted run"
+    )
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="dump cProfile statistics of the N slowest logs")
+    parser.add_argument("--profile-dir", type=Path, default=Path("profiles"), help="directory of the cProfile dumps")
+    args = parser.parse_args()
+    try:
+        check_runway_engine()
+        check_detection_options(args.mode, args.stream)
+    except ValueError as e:
+        parser.error(str(e))
+
+    main(
+        args.output_file_path, args.mode, args.jobs, args.stream, args.data_dir,
+        args.metrics, args.memory, args.profile, args.profile_dir, args.index, args.format, args.resume
+    )
@@ -0,0 +1,100 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import numpy as np
+
+
+def hysteresis_state(signal: np.ndarray, rise_threshold, fall_threshold) -> np.ndarray:
+    """
+    Compute the state of a hysteresis comparator over whole signals.
+
+    The state switches on when a value exceeds rise_threshold and off when a value is at or below
+    fall_threshold, otherwise (including NaN values) it keeps its previous value. It starts off.
+
+    Params:
+        signal: (n,) or (n, channels) array of sensor values
+        rise_threshold: scalar or per channel threshold to detect a rising edge
+        fall_threshold: scalar or per channel threshold to detect a falling edge, at most rise_threshold
+
+    Returns:
+        boolean array of the same shape as signal
+    """
+    signal = np.asarray(signal, dtype=float)
+    rise_threshold = np.asarray(rise_threshold, dtype=float)
+    fall_threshold = np.asarray(fall_threshold, dtype=float)
+    if np.any(fall_threshold > rise_threshold):
+        raise ValueError("fall_threshold must not exceed rise_threshold")
+
+    events = np.zeros(signal.shape, dtype=np.int8)
+    events[signal > rise_threshold] = 1
+    events[signal <= fall_threshold] = -1
+
+    # carry the last rise or fall event forward to every following sample
+    samples = np.arange(signal.shape[0]).reshape((-1,) + (1,) * (signal.ndim - 1))
+    last_event = np.where(events != 0, samples, -1)
+    np.maximum.accumulate(last_event, axis=0, out=last_event)
+
+    state = np.take_along_axis(events, np.maximum(last_event, 0), axis=0) == 1
+    return state & (last_event >= 0)
+
+
+def detect_edges(
+    signal: np.ndarray, rise_threshold, fall_threshold, min_dwell: int = 0
+) -> tuple[np.ndarray, np.ndarray] | list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Detect every rising and falling edge of a signal with hysteresis, see hysteresis_state.
+
+    Params:
+        signal: (n,) or (n, channels) array of sensor values
+        rise_threshold: scalar or per channel threshold to detect a rising edge
+        fall_threshold: scalar or per channel threshold to detect a falling edge, at most rise_threshold
+        min_dwell: drop pulses that stay on for fewer samples than this, to reject noise
+
+    Returns:
+        (rise indices, fall indices) of the pulses, the fall index is -1 for a pulse still on at the end
+        of the signal. A list with one such tuple per channel for a 2D signal.
+    """
+    signal = np.asarray(signal, dtype=float)
+    state = hysteresis_state(signal, rise_threshold, fall_threshold)
+    state = state.reshape(signal.shape[0], 1 if signal.ndim == 1 else signal.shape[1])
+
+    previous = np.zeros_like(state)
+    previous[1:] = state[:-1]
+    rise_samples, rise_channels = np.nonzero(state & ~previous)
+    fall_samples, fall_channels = np.nonzero(~state & previous)
+
+    # np.nonzero orders by sample, order by channel instead to split the edges per channel
+    rise_order = np.argsort(rise_channels, kind="stable")
+    fall_order = np.argsort(fall_channels, kind="stable")
+    rise_splits = np.searchsorted(rise_channels[rise_order], np.arange(1, state.shape[1]))
+    fall_splits = np.searchsorted(fall_channels[fall_order], np.arange(1, state.shape[1]))
+
+    edges = []
+    for rises, falls in zip(
+        np.split(rise_samples[rise_order], rise_splits), np.split(fall_samples[fall_order], fall_splits)
+    ):
+        # every fall closes the preceding rise, only the last pulse may still be on
+        falls = np.append(falls, [-1] * (len(rises) - len(falls))).astype(np.int64)
+
+        if min_dwell > 0:
+            duration = np.where(falls == -1, state.shape[0] - rises, falls - rises)
+            keep = duration >= min_dwell
+            rises, falls = rises[keep], falls[keep]
+
+        edges.append((rises.astype(np.int64), falls))
+
+    return edges[0] if signal.ndim == 1 else edges
+
+
+def first_spike(signal: np.ndarray, rise_threshold: float, fall_threshold: float) -> tuple[int, int]:
+    """
+    Array equivalent of feeding every sample to utils.SpikeDetect.
+
+    Returns:
+        (index of the first rising edge or -1, index of the falling edge that follows it or -1)
+    """
+    rises, falls = detect_edges(signal, rise_threshold, fall_threshold)
+    if len(rises) == 0:
+        return -1, -1
+    return int(rises[0]), int(falls[0])
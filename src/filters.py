@@ -0,0 +1,190 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import numpy as np
+
+NAN_POLICIES = ("propagate", "omit")
+EDGE_MODES = ("zero", "shrink")
+
+# windows up to this size are summed from shifted copies of the signal, which is faster than
+# cumulative sums for short windows and free of their rounding error
+SHIFTED_SUM_MAX_WINDOW = 16
+
+# the exponential filter is evaluated in closed form over blocks of samples, sized so the decay
+# factor within a block never drops below this value and the block sums keep their precision
+_MIN_BLOCK_DECAY = 1e-8
+
+
+def _as_channels(data: np.ndarray) -> np.ndarray:
+    # view 1D signals as a single channel
+    arr = np.asarray(data, dtype=np.float64)
+    return arr.reshape(arr.shape[0], int(np.prod(arr.shape[1:])))
+
+
+def _output_buffer(data: np.ndarray, out: np.ndarray | None) -> np.ndarray:
+    if out is None:
+        return np.empty(np.shape(data), dtype=np.float64)
+    if out.shape != np.shape(data):
+        raise ValueError(f"Output buffer shape {out.shape} does not match the data shape {np.shape(data)}")
+    return out
+
+
+def moving_average(
+    data: np.ndarray,
+    window_size: int,
+    out: np.ndarray | None = None,
+    nan_policy: str = "propagate",
+    edge: str = "zero",
+) -> np.ndarray:
+    """
+    Centered moving average of every channel, computed from shifted sums for short windows and
+    cumulative sums for long windows.
+
+    Params:
+        data: (n,) or (n, channels) array of sensor values, filtered along the first axis
+        window_size: How many values to include in the average
+        out: optional buffer of the same shape as data to write the result to, may be data itself
+        nan_policy: "propagate" makes every window containing a NaN NaN, "omit" averages the valid values only
+        edge: "zero" pads the signal with zeros like np.convolve(mode='same') and moving_average_filter,
+            "shrink" averages only the samples inside the signal at the edges
+
+    Returns:
+        Smoothed array, the same shape as data
+    """
+    if window_size < 1:
+        raise ValueError(f"window_size must be positive, got {window_size}")
+    if nan_policy not in NAN_POLICIES:
+        raise ValueError(f"Unknown nan_policy '{nan_policy}', expected one of {NAN_POLICIES}")
+    if edge not in EDGE_MODES:
+        raise ValueError(f"Unknown edge '{edge}', expected one of {EDGE_MODES}")
+
+    arr = _as_channels(data)
+    n, channels = arr.shape
+    result = _output_buffer(data, out)
+    # accumulate straight into the result unless it is written in place or has another dtype
+    if result.dtype == np.float64 and result.flags.c_contiguous and not np.shares_memory(result, arr):
+        totals = result.reshape(n, channels)
+    else:
+        totals = np.empty((n, channels), dtype=np.float64)
+
+    # the window of sample i spans [i - window_size // 2, i + (window_size - 1) // 2], like np.convolve(mode='same'),
+    # so the signal is zero padded by window_size // 2 before and (window_size - 1) // 2 after
+    before = window_size // 2
+    after = (window_size - 1) // 2
+
+    def window_totals(values: np.ndarray, totals: np.ndarray) -> np.ndarray:
+        if window_size <= SHIFTED_SUM_MAX_WINDOW:
+            # add the signal shifted by every offset of the window, the samples shifted past the edges are the zero padding
+            totals[...] = values
+            for shift in range(1, before + 1):
+                totals[shift:] += values[:n - shift]
+            for shift in range(1, after + 1):
+                totals[:n - shift] += values[shift:]
+            return totals
+
+        cumulative = np.zeros((n + window_size, channels), dtype=totals.dtype)
+        np.cumsum(values, axis=0, out=cumulative[before + 1:before + 1 + n])
+        cumulative[before + 1 + n:] = cumulative[before + n]
+        np.subtract(cumulative[window_size:], cumulative[:n], out=totals)
+        return totals
+
+    nan = np.isnan(arr)
+    has_nan = bool(nan.any())
+    window_sums = window_totals(np.where(nan, 0.0, arr) if has_nan else arr, totals)
+    window_nans = window_totals(nan.astype(np.float64), np.empty_like(totals)) if has_nan else None
+
+    if edge == "zero":
+        counts = float(window_size)
+    else:
+        idx = np.arange(n)
+        lo = np.maximum(idx - before, 0)
+        hi = np.minimum(idx + after + 1, n)
+        counts = (hi - lo).astype(np.float64)[:, None]
+
+    if window_nans is not None and nan_policy == "omit":
+        counts = counts - window_nans
+        with np.errstate(invalid="ignore", divide="ignore"):
+            np.divide(window_sums, counts, out=window_sums)
+        window_sums[counts <= 0] = np.nan
+    else:
+        np.divide(window_sums, counts, out=window_sums)
+        if window_nans is not None:
+            window_sums[window_nans > 0] = np.nan
+
+    if not np.shares_memory(window_sums, result):
+        np.copyto(result, window_sums.reshape(result.shape), casting="unsafe")
+    return result
+
+
+def exponential_filter(
+    data: np.ndarray,
+    alpha: float,
+    out: np.ndarray | None = None,
+    nan_policy: str = "propagate",
+) -> np.ndarray:
+    """
+    Discrete-time low-pass filter y[i] = alpha * y[i - 1] + (1 - alpha) * x[i] of every channel, starting from y[-1] = 0
+    like utils.low_pass_filter.
+
+    The recursion is unrolled in closed form over blocks of samples, so the work is vectorized over both the
+    samples of a block and the channels.
+
+    Params:
+        data: (n,) or (n, channels) array of sensor values, filtered along the first axis
+        alpha: Smoothing parameter in [0, 1). Higher alpha means more smoothing
+        out: optional buffer of the same shape as data to write the result to, may be data itself
+        nan_policy: "propagate" lets a NaN poison every later sample, "omit" holds the filter state over NaN samples
+
+    Returns:
+        Smoothed array, the same shape as data
+    """
+    if not 0 <= alpha < 1:
+        raise ValueError(f"alpha must be in [0, 1), got {alpha}")
+    if nan_policy not in NAN_POLICIES:
+        raise ValueError(f"Unknown nan_policy '{nan_policy}', expected one of {NAN_POLICIES}")
+
+    arr = _as_channels(data)
+    n, channels = arr.shape
+    result = _output_buffer(data, out)
+    result_channels = result.reshape(arr.shape)
+
+    if alpha == 0:
+        result_channels[...] = arr
+        if nan_policy == "omit":
+            # hold the last valid sample, the state before the first valid sample is zero
+            _hold_nan(result_channels)
+            result_channels[np.isnan(result_channels)] = 0.0
+        return result
+
+    block_size = max(1, int(np.log(_MIN_BLOCK_DECAY) / np.log(alpha)))
+    state = np.zeros(channels)
+
+    for start in range(0, n, block_size):
+        block = arr[start:start + block_size]
+
+        # per sample decay a[k] and input gain b[k], a NaN sample keeps the state when omitted
+        decay = np.full(block.shape, alpha)
+        gain = np.full(block.shape, 1 - alpha)
+        values = block
+        if nan_policy == "omit":
+            nan = np.isnan(block)
+            decay[nan] = 1.0
+            gain[nan] = 0.0
+            values = np.where(nan, 0.0, block)
+
+        # y[j] = P[j] * (y[-1] + sum_{k <= j} b[k] * x[k] / P[k]) with P[j] = prod_{k <= j} a[k]
+        decay_product = np.cumprod(decay, axis=0)
+        smoothed = decay_product * (state + np.cumsum(gain * values / decay_product, axis=0))
+
+        result_channels[start:start + block_size] = smoothed
+        state = smoothed[-1]
+
+    return result
+
+
+def _hold_nan(arr: np.ndarray):
+    # forward fill NaN samples of every channel with the last valid sample, in place
+    idx = np.where(np.isnan(arr), 0, np.arange(arr.shape[0])[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    arr[...] = np.take_along_axis(arr, idx, axis=0)
@@ -0,0 +1,111 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import numpy as np
+import pandas as pd
+from shapely import Polygon
+from src.utils import CSVColumns, TIMESTAMP_COLUMN
+
+# sensor channels are stored as float32, except the coordinates whose float32 resolution
+# (~0.5 m at these latitudes) is too coarse for the runway boundary tests
+DOUBLE_PRECISION_CHANNELS = (CSVColumns.Latitude, CSVColumns.Longitude)
+# the smoothed channels compared against the detector's strict thresholds are kept as float64 too, rounding
+# them to float32 could move a sample across a threshold and change the detected takeoff
+DETECTION_CHANNELS = (CSVColumns.GndSpd, CSVColumns.E1_RPM, CSVColumns.AltMSL)
+
+# the text columns replaced by the time axis
+TIME_COLUMNS = (CSVColumns.LocalDate, CSVColumns.LocalTime, CSVColumns.UTCOffset)
+
+
+class Flight:
+    """
+    Compact in-memory representation of a flight log.
+
+    Every channel is a contiguous typed array: float32 sensor values (float64 coordinates and DETECTION_CHANNELS),
+    and int32 codes into a table of categories for text channels. The local date, time and UTC offset text
+    columns are replaced by a single int64 axis of UTC epoch seconds. Channels and the time axis are read with
+    flight[name].
+    """
+
+    __slots__ = ("name", "airport_code", "runways", "runway_names", "timestamps", "channels", "categories")
+
+    def __init__(
+        self,
+        name: str,
+        airport_code: str,
+        runways: list[tuple[Polygon, float]],
+        timestamps: np.ndarray,
+        channels: dict[str, np.ndarray],
+        runway_names: list[str] | None = None,
+    ):
+        self.name = name
+        self.airport_code = airport_code
+        self.runways = runways
+        self.runway_names = runway_names or []
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        self.channels: dict[str, np.ndarray] = {}
+        self.categories: dict[str, np.ndarray] = {}
+
+        for col, values in channels.items():
+            values = np.asarray(values)
+            if len(values) != len(self.timestamps):
+                raise ValueError(f"Channel '{col}' has {len(values)} samples, expected {len(self.timestamps)}")
+
+            if values.dtype.kind in "fiub":
+                dtype = np.float64 if col in DOUBLE_PRECISION_CHANNELS or col in DETECTION_CHANNELS else np.float32
+                self.channels[col] = np.ascontiguousarray(values, dtype=dtype)
+            else:
+                codes, uniques = pd.factorize(values, use_na_sentinel=True)
+                self.channels[col] = np.ascontiguousarray(codes, dtype=np.int32)
+                self.categories[col] = np.asarray(uniques, dtype=str)
+
+    @classmethod
+    def from_dataframe(
+        cls, df: pd.DataFrame, name: str, airport_code: str, runways: list[tuple[Polygon, float]], runway_names: list[str] | None = None
+    ) -> "Flight":
+        """
+        Build a flight from a DataFrame returned by read_data, which must hold the time axis column
+        """
+        channels = {
+            col: df[col].to_numpy() for col in df.columns if col not in TIME_COLUMNS and col != TIMESTAMP_COLUMN
+        }
+        return cls(name, airport_code, runways, df[TIMESTAMP_COLUMN].to_numpy(), channels, runway_names)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __contains__(self, name: str) -> bool:
+        return name == TIMESTAMP_COLUMN or name in self.channels
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name == TIMESTAMP_COLUMN:
+            return self.timestamps
+        return self.channels[name]
+
+    def __repr__(self) -> str:
+        return f"Flight({self.name!r}, airport_code={self.airport_code!r}, samples={len(self)}, channels={len(self.channels)})"
+
+    def decode(self, name: str) -> np.ndarray:
+        """
+        Return the values of a text channel, with None for missing values
+        """
+        codes = self.channels[name]
+        values = np.empty(len(codes), dtype=object)
+        valid = codes >= 0
+        values[valid] = self.categories[name][codes[valid]]
+        return values
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory held by the sample arrays
+        """
+        return self.timestamps.nbytes + sum(values.nbytes for values in self.channels.values()) + \
+            sum(values.nbytes for values in self.categories.values())
+
+    def to_dataframe(self) -> pd.DataFrame:
+        data = {TIMESTAMP_COLUMN: self.timestamps}
+        for col, values in self.channels.items():
+            data[col] = self.decode(col) if col in self.categories else values
+        return pd.DataFrame(data)
@@ -0,0 +1,268 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+from datetime import datetime, timezone
+from pathlib import Path
+from src.detector import detect_valid_takeoff_timestamp, parse_airport_code, read_data, read_flight
+from src.resample import REPAIR_GAPS
+from src.results import format_result, make_result
+from src.utils import CSVColumns, MISSING_TIMESTAMP, TIMESTAMP_COLUMN
+
+# bump when the stored columns or the detection change, an index of another version is rebuilt
+INDEX_VERSION = 2
+INDEX_PATH = Path(
+    os.getenv("SENSOR_DATA_INDEX", Path(__file__).parent.parent / ".cache" / "flight_index.sqlite")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    airport_code TEXT NOT NULL,
+    samples INTEGER,
+    start_ts REAL,
+    end_ts REAL,
+    min_lat REAL,
+    max_lat REAL,
+    min_long REAL,
+    max_long REAL,
+    runway_id INTEGER NOT NULL,
+    takeoff_idx INTEGER NOT NULL,
+    takeoff_ts REAL,
+    mode TEXT NOT NULL,
+    repair INTEGER NOT NULL,
+    error TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS flights_airport_takeoff ON flights (airport_code, takeoff_ts);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+COLUMNS = (
+    "path", "name", "size", "mtime_ns", "airport_code", "samples", "start_ts", "end_ts", "min_lat", "max_lat",
+    "min_long", "max_long", "runway_id", "takeoff_idx", "takeoff_ts", "mode", "repair", "error", "indexed_at",
+)
+
+
+def _nan_to_none(value: float) -> float | None:
+    return None if np.isnan(value) else float(value)
+
+
+def describe_flight(data) -> dict:
+    """
+    Time span, sample count and bounding box of the samples returned by read_data or read_flight
+    """
+    timestamps = np.asarray(data[TIMESTAMP_COLUMN])
+    timestamps = timestamps[timestamps != MISSING_TIMESTAMP]
+    lat = np.asarray(data[CSVColumns.Latitude], dtype=float)
+    lng = np.asarray(data[CSVColumns.Longitude], dtype=float)
+    located = ~(np.isnan(lat) | np.isnan(lng))
+
+    summary = {
+        "samples": len(np.asarray(data[CSVColumns.Latitude])),
+        "start_ts": float(timestamps.min()) if len(timestamps) else None,
+        "end_ts": float(timestamps.max()) if len(timestamps) else None,
+        "min_lat": None, "max_lat": None, "min_long": None, "max_long": None,
+    }
+    if located.any():
+        summary.update(
+            min_lat=_nan_to_none(lat[located].min()), max_lat=_nan_to_none(lat[located].max()),
+            min_long=_nan_to_none(lng[located].min()), max_long=_nan_to_none(lng[located].max()),
+        )
+    return summary
+
+
+def index_file(
+    filepath: Path, mode: str = "vectorized", repair: bool | None = None
+) -> tuple[tuple[float | str | None, int, int], dict]:
+    """
+    Read a log, detect its takeoff like detector.process_file and describe the flight for the index.
+    repair defaults to resample.REPAIR_GAPS, see detector.read_data.
+
+    Returns:
+        (utc timestamp or None, takeoff index or -1, runway id or -1), the index entry of the log
+    """
+    if mode == "reference":
+        data, runways = read_data(filepath, repair)
+    else:
+        data = read_flight(filepath, repair)
+        runways = data.runways
+
+    result = detect_valid_takeoff_timestamp(data, runways, mode) if len(runways) > 0 else ('None', -1, -1)
+    ts, takeoff_idx, runway_id = result
+
+    entry = describe_flight(data)
+    entry.update(takeoff_ts=ts if isinstance(ts, float) else None, takeoff_idx=takeoff_idx, runway_id=runway_id)
+    return result, entry
+
+
+class FlightIndex:
+    """
+    SQLite index of the processed logs: the detected takeoff and a summary of every flight, keyed on the
+    log's path and invalidated when the log's size or modification time change.
+    """
+
+    def __init__(self, path: Path = INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.row_factory = sqlite3.Row
+
+        version = None
+        if self._conn.execute("SELECT name FROM sqlite_master WHERE name = 'meta'").fetchone():
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            version = row["value"] if row else None
+        if version != str(INDEX_VERSION):
+            self._conn.executescript("DROP TABLE IF EXISTS flights; DROP TABLE IF EXISTS meta;")
+
+        self._conn.executescript(SCHEMA)
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self) -> "FlightIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @staticmethod
+    def _key(filepath: Path) -> str:
+        return str(Path(filepath).resolve())
+
+    def stale(self, filepaths: list[Path], mode: str = "vectorized", repair: bool | None = None) -> list[Path]:
+        """
+        Return the logs that are not indexed, changed since they were indexed, were indexed with another
+        detection mode or gap repair setting (defaults to resample.REPAIR_GAPS), or failed
+        """
+        repair = REPAIR_GAPS if repair is None else repair
+        indexed = {
+            row["path"]: row for row in self._conn.execute("SELECT path, size, mtime_ns, mode, repair, error FROM flights")
+        }
+        stale = []
+        for fp in filepaths:
+            row = indexed.get(self._key(fp))
+            stat = os.stat(fp) if row is not None else None
+            if row is None or row["size"] != stat.st_size or row["mtime_ns"] != stat.st_mtime_ns or \
+                    row["mode"] != mode or row["repair"] != int(repair) or row["error"] is not None:
+                stale.append(fp)
+        return stale
+
+    def add(
+        self, filepath: Path, entry: dict | None, mode: str = "vectorized", error: str | None = None, repair: bool | None = None
+    ):
+        """
+        Store the entry of a log returned by index_file, replacing its previous entry. A failed log
+        is stored without a takeoff along with the error. repair defaults to resample.REPAIR_GAPS.
+        """
+        try:
+            stat = os.stat(filepath)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            size, mtime_ns = -1, -1
+
+        row = dict.fromkeys(COLUMNS)
+        row.update(runway_id=-1, takeoff_idx=-1)
+        row.update(entry or {})
+        row.update(
+            path=self._key(filepath),
+            name=Path(filepath).name,
+            size=size,
+            mtime_ns=mtime_ns,
+            airport_code=parse_airport_code(Path(filepath)),
+            mode=mode,
+            repair=int(REPAIR_GAPS if repair is None else repair),
+            error=error,
+            indexed_at=time.time(),
+        )
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO flights ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [row[col] for col in COLUMNS],
+        )
+
+    def commit(self):
+        self._conn.commit()
+
+    def remove_missing(self, filepaths: list[Path]) -> int:
+        """
+        Drop the entries of the logs under the directories of filepaths that are no longer in filepaths
+        """
+        keep = {self._key(fp) for fp in filepaths}
+        directories = {str(Path(key).parent) for key in keep}
+        removed = [
+            row["path"] for row in self._conn.execute("SELECT path FROM flights")
+            if row["path"] not in keep and str(Path(row["path"]).parent) in directories
+        ]
+        self._conn.executemany("DELETE FROM flights WHERE path = ?", [(path,) for path in removed])
+        self._conn.commit()
+        return len(removed)
+
+    def get(self, filepath: Path) -> sqlite3.Row | None:
+        return self._conn.execute("SELECT * FROM flights WHERE path = ?", (self._key(filepath),)).fetchone()
+
+    def result(self, filepath: Path) -> dict:
+        """
+        The detector result of an indexed log, see results.make_result
+        """
+        row = self.get(filepath)
+        return make_result(row["name"], row["takeoff_ts"], row["takeoff_idx"], row["runway_id"], error=row["error"])
+
+    def output_line(self, filepath: Path) -> str:
+        """
+        The detector output line of an indexed log
+        """
+        return format_result(self.result(filepath), "text")
+
+    def takeoffs(
+        self, airport_code: str | None = None, start: datetime | None = None, end: datetime | None = None
+    ) -> list[sqlite3.Row]:
+        """
+        The indexed flights with a takeoff, ordered by takeoff time, without reading any log.
+
+        Params:
+            airport_code: only the flights of this airport
+            start, end: only the takeoffs in [start, end), naive datetimes are UTC
+        """
+        query = "SELECT * FROM flights WHERE takeoff_ts IS NOT NULL"
+        params = []
+        if airport_code is not None:
+            query += " AND airport_code = ?"
+            params.append(airport_code)
+        if start is not None:
+            query += " AND takeoff_ts >= ?"
+            params.append(_epoch(start))
+        if end is not None:
+            query += " AND takeoff_ts < ?"
+            params.append(_epoch(end))
+        return self._conn.execute(query + " ORDER BY takeoff_ts", params).fetchall()
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the takeoffs of the flight index built by the detector")
+    parser.add_argument("--index", type=Path, default=INDEX_PATH, help="path of the index")
+    parser.add_argument("--airport", default=None, help="airport code, e.g. KPAO")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="first UTC date, e.g. 2020-11-01")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="UTC date after the last takeoff")
+    args = parser.parse_args()
+
+    with FlightIndex(args.index) as index:
+        for row in index.takeoffs(args.airport, args.start, args.end):
+            takeoff = datetime.fromtimestamp(row["takeoff_ts"], timezone.utc).isoformat()
+            print(f"{row['name']}, {row['airport_code']}, {row['runway_id']}, {takeoff}, {row['takeoff_idx']}")
@@ -1,12 +1,105 @@
 import json
+import os
 import pathlib
-from shapely import contains
+import numpy as np
+from functools import lru_cache
+from shapely import STRtree, contains, contains_xy, points, prepare
 from shapely.geometry import Point, Polygon, shape
 from typing import Optional
+from src.runway_frame import ASSET_FILEPATH, EARTH_RADIUS_M, RunwayFrame, local_projection
+
+# the point-in-runway engine of runway_index: "shapely", or "numpy" for runway_frame.RunwayFrame which
+# tests the runways in meters, widened by RUNWAY_BUFFER_M meters
+RUNWAY_ENGINES = ("shapely", "numpy")
+RUNWAY_ENGINE = os.getenv("SENSOR_DATA_RUNWAY_ENGINE", "shapely")
+RUNWAY_BUFFER_M = float(os.getenv("SENSOR_DATA_RUNWAY_BUFFER_M", "0"))
+
+
+class RunwayCatalog:
+    """
+    The runways of every airport in a GeoJSON file, parsed once and indexed by airport id.
+
+    The polygons are prepared so repeated point-in-polygon tests are fast, and an STRtree
+    over all runways answers lookups across airports.
+    """
+
+    def __init__(self, features: list[dict]):
+        self._airports: dict[str, list[tuple[Polygon, float]]] = {}
+        self._runway_names: dict[str, list[str]] = {}
+        entries: list[tuple[str, int]] = []
+        polygons = []
+
+        for feat in features:
+            properties = feat["properties"]
+            airport_id = properties["airportId"]
+            polygon: Polygon = shape(feat["geometry"]) #type: ignore
+            prepare(polygon)
+
+            runways = self._airports.setdefault(airport_id, [])
+            entries.append((airport_id, len(runways)))
+            runways.append((polygon, properties["elevationFtMSL"]))
+            self._runway_names.setdefault(airport_id, []).append(properties.get("runwayId", ""))
+            polygons.append(polygon)
+
+        self._tree = STRtree(polygons)
+        # the airport and runway id of each polygon in the tree
+        self._entry_airports = np.array([entry[0] for entry in entries], dtype=object)
+        self._entry_runways = np.array([entry[1] for entry in entries], dtype=np.int64)
+
+    @classmethod
+    def from_file(cls, filepath: pathlib.Path) -> "RunwayCatalog":
+        with open(filepath, "r") as f:
+            return cls(json.load(f)["features"])
+
+    @property
+    def airports(self) -> list[str]:
+        return list(self._airports)
+
+    def runways(self, airportId: str) -> list[tuple[Polygon, float]]:
+        """
+        Return the airport's runway polygons with the airport elevation in feet MSL,
+        in file order, or an empty list for an unknown airport
+        """
+        return list(self._airports.get(airportId, []))
+
+    def runway_names(self, airportId: str) -> list[str]:
+        """
+        Return the runway designators (e.g. '13/31') of the airport, in the order of runways()
+        """
+        return list(self._runway_names.get(airportId, []))
+
+    def locate(self, lat: np.ndarray, long: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the runway under each sample, across all airports.
+
+        Returns:
+            (airport id per sample or '', runway id within the airport or -1)
+        """
+        lat = np.asarray(lat, dtype=float)
+        long = np.asarray(long, dtype=float)
+        airport_ids = np.full(lat.shape, "", dtype=object)
+        runway_ids = np.full(lat.shape, -1, dtype=np.int64)
+
+        sample_idx, tree_idx = self._tree.query(points(long, lat), predicate="within")
+
+        # keep the lowest runway per sample, matching on_runway for a single airport
+        order = np.lexsort((tree_idx, sample_idx))
+        samples, first = np.unique(sample_idx[order], return_index=True)
+        matches = tree_idx[order][first]
+
+        airport_ids[samples] = self._entry_airports[matches]
+        runway_ids[samples] = self._entry_runways[matches]
+
+        return airport_ids, runway_ids
+
+
+@lru_cache(maxsize=None)
+def get_runway_catalog(filepath: pathlib.Path = ASSET_FILEPATH) -> RunwayCatalog:
+    """
+    Return the process-wide catalog of the runway file, parsing it on first use
+    """
+    return RunwayCatalog.from_file(filepath)
 
-ASSET_FILEPATH = (
-    pathlib.Path(__file__).parent.parent / "data" / "geometry" / "runways.geojson"
-)
 
 def load_airport_runways(
     airportId: str,
@@ -15,22 +108,101 @@ def load_airport_runways(
     Load the airport's runways and return polygons of the boundaries, along with the
     elevation of the airport in feet MSL
     """
-    with open(ASSET_FILEPATH, "r") as f:
-        features = json.load(f)["features"]
-
-        retval = []
-
-        for feat in features:
-            if feat["properties"]["airportId"] == airportId:
-                retval.append((shape(feat["geometry"]), feat["properties"]["elevationFtMSL"])) #type: ignore
-
-        return retval
+    return get_runway_catalog().runways(airportId)
 
 def find_index_of_first_true(lst):
     return next((i for i, x in enumerate(lst) if x), -1)
 
 def get_points_near(center: Point, radius: float, points: list[Point]) -> list[Point]:
-    return [x for x in points if center.distance(x) < radius]
+    if len(points) == 0:
+        return []
+    coords = np.array([(p.y, p.x) for p in points])
+    return [points[i] for i in points_near(coords[:, 0], coords[:, 1], center.y, center.x, radius)]
+
+def _within(
+    lat: np.ndarray, long: np.ndarray, center_lat: float, center_long: float, radius: float, metric: bool
+) -> np.ndarray:
+    if metric:
+        east, north = local_projection(lat, long, center_lat, center_long)
+        return np.hypot(east, north) < radius
+    # planar distance in degrees, like shapely's distance between (long, lat) points
+    return np.hypot(long - center_long, lat - center_lat) < radius
+
+def points_near(
+    lat: np.ndarray, long: np.ndarray, center_lat: float, center_long: float, radius: float, metric: bool = False
+) -> np.ndarray:
+    """
+    Vectorized get_points_near over arrays of coordinates.
+
+    Params:
+        radius: in degrees like get_points_near, or in meters when metric is set
+        metric: measure the distance in meters on a local projection around the center, see local_projection
+
+    Returns:
+        sorted indices of the samples strictly closer than radius to the center
+    """
+    lat = np.asarray(lat, dtype=float)
+    long = np.asarray(long, dtype=float)
+    return np.flatnonzero(_within(lat, long, center_lat, center_long, radius, metric))
+
+class PointGrid:
+    """
+    The samples of a flight bucketed into a regular grid of lat/long cells, so a radius query only
+    tests the samples of the cells overlapping the circle instead of every sample.
+    """
+
+    def __init__(self, lat: np.ndarray, long: np.ndarray, cell_size: float = 0.005):
+        """
+        Params:
+            lat, long: coordinates of the samples, NaN samples are never returned
+            cell_size: side of the cells in degrees, about the radius of the typical query
+        """
+        self.lat = np.asarray(lat, dtype=float)
+        self.long = np.asarray(long, dtype=float)
+        self.cell_size = cell_size
+
+        valid = np.flatnonzero(~(np.isnan(self.lat) | np.isnan(self.long)))
+        rows = np.floor(self.lat[valid] / cell_size).astype(np.int64)
+        cols = np.floor(self.long[valid] / cell_size).astype(np.int64)
+        self._row0 = int(rows.min()) if len(valid) else 0
+        self._col0 = int(cols.min()) if len(valid) else 0
+        self._cols = int(cols.max()) - self._col0 + 1 if len(valid) else 1
+        self._rows = int(rows.max()) - self._row0 + 1 if len(valid) else 0
+
+        # the samples ordered by row-major cell key, a run of cells of one row is a contiguous slice
+        keys = (rows - self._row0) * self._cols + (cols - self._col0)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._samples = valid[order]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def query(self, center_lat: float, center_long: float, radius: float, metric: bool = False) -> np.ndarray:
+        """
+        Same result as points_near over the samples of the grid
+        """
+        if metric:
+            # the extent of the circle in degrees, widened slightly for the curvature of the parallels
+            lat_extent = np.degrees(radius / EARTH_RADIUS_M) * 1.01
+            long_extent = lat_extent / max(np.cos(np.radians(abs(center_lat) + lat_extent)), 1e-12)
+        else:
+            lat_extent = long_extent = radius
+
+        row_lo = max(int(np.floor((center_lat - lat_extent) / self.cell_size)) - self._row0, 0)
+        row_hi = min(int(np.floor((center_lat + lat_extent) / self.cell_size)) - self._row0, self._rows - 1)
+        col_lo = max(int(np.floor((center_long - long_extent) / self.cell_size)) - self._col0, 0)
+        col_hi = min(int(np.floor((center_long + long_extent) / self.cell_size)) - self._col0, self._cols - 1)
+        if row_lo > row_hi or col_lo > col_hi:
+            return np.empty(0, dtype=np.int64)
+
+        row_keys = np.arange(row_lo, row_hi + 1) * self._cols
+        starts = np.searchsorted(self._keys, row_keys + col_lo, side="left")
+        ends = np.searchsorted(self._keys, row_keys + col_hi, side="right")
+        candidates = np.concatenate([self._samples[start:end] for start, end in zip(starts, ends)])
+
+        near = _within(self.lat[candidates], self.long[candidates], center_lat, center_long, radius, metric)
+        return np.sort(candidates[near])
 
 def on_runway(lat: float, long: float, runways: tuple[Polygon, float] | list[tuple[Polygon, float]]) -> int:
 
@@ -43,3 +215,66 @@ def on_runway(lat: float, long: float, runways: tuple[Polygon, float] | list[tup
 
     runway: Polygon = runways[0] # type: ignore
     return 0 if runway.contains(Point(long, lat)) else -1
+
+def check_runway_engine(engine: str | None = None, buffer_m: float | None = None) -> tuple[str, float]:
+    """
+    Validate the runway engine and buffer of runway_index, defaulting to RUNWAY_ENGINE and RUNWAY_BUFFER_M.
+    The batch tools call it once before reading any log, so a bad configuration fails the run instead of
+    every log.
+
+    Returns:
+        (engine, buffer_m)
+
+    Raises:
+        ValueError for an unknown engine, or a nonzero buffer with the shapely engine which does not buffer
+        the runways
+    """
+    engine = engine or RUNWAY_ENGINE
+    buffer_m = RUNWAY_BUFFER_M if buffer_m is None else float(buffer_m)
+    if engine not in RUNWAY_ENGINES:
+        raise ValueError(f"Unknown runway engine {engine}, expected one of {RUNWAY_ENGINES}")
+    if engine == "shapely" and buffer_m != 0:
+        raise ValueError(
+            f"The shapely runway engine does not buffer the runways, got a {buffer_m} m buffer, "
+            "set SENSOR_DATA_RUNWAY_ENGINE=numpy"
+        )
+    return engine, buffer_m
+
+
+@lru_cache(maxsize=64)
+def _runway_frame(runways: tuple[tuple[Polygon, float], ...], buffer_m: float) -> RunwayFrame:
+    # the runways of an airport are projected once per process, the runways are hashed by their coordinates
+    return RunwayFrame.from_polygons(list(runways), buffer_m)
+
+
+def runway_index(
+    lat: np.ndarray,
+    long: np.ndarray,
+    runways: list[tuple[Polygon, float]],
+    engine: str | None = None,
+    buffer_m: float | None = None,
+) -> np.ndarray:
+
+    """
+    Vectorized on_runway over arrays of coordinates. Returns for every sample the runway id
+    of the first intersecting runway, otherwise -1
+
+    Params:
+        engine: one of RUNWAY_ENGINES, defaults to RUNWAY_ENGINE
+        buffer_m: the samples within this distance of a runway's edges are on the runway, defaults to
+            RUNWAY_BUFFER_M. Only the numpy engine buffers the runways, see check_runway_engine.
+    """
+
+    engine, buffer_m = check_runway_engine(engine, buffer_m)
+    if engine == "numpy":
+        return _runway_frame(tuple(runways), buffer_m).locate(lat, long)
+
+    lat = np.asarray(lat, dtype=float)
+    long = np.asarray(long, dtype=float)
+    ids = np.full(lat.shape, -1, dtype=np.int64)
+
+    # visit the runways last to first so the lowest matching runway id wins, like on_runway
+    for runway_id in reversed(range(len(runways))):
+        ids[contains_xy(runways[runway_id][0], long, lat)] = runway_id
+
+    return ids
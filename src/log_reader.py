@@ -0,0 +1,165 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Iterator
+from src import metrics
+
+# the column header names are contained in the 2nd row of the file, the 1st row holds the units
+HEADER_ROW = 1
+
+CACHE_VERSION = 1
+CACHE_DIR = Path(
+    os.getenv("SENSOR_DATA_CACHE_DIR", Path(__file__).parent.parent / ".cache" / "logs")
+)
+# set SENSOR_DATA_CACHE=0 to always re-tokenize the CSV files
+CACHE_ENABLED = os.getenv("SENSOR_DATA_CACHE", "1") != "0"
+
+
+def parse_log(filepath: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Parse a flight log CSV with the C tokenizer.
+
+    The logs pad every field with spaces after the comma, which the C engine strips with
+    skipinitialspace instead of the much slower regex delimiter of the python engine.
+
+    Params:
+        filepath: path of the CSV log
+        columns: the columns to keep, all columns when None
+
+    Returns:
+        DataFrame with the requested columns
+    """
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda name: name.strip() in wanted
+
+    df = pd.read_csv(
+        filepath, header=HEADER_ROW, skipinitialspace=True, usecols=usecols, engine="c"
+    )
+    df.columns = [name.strip() for name in df.columns]
+    return df
+
+
+def iter_log_chunks(filepath: Path, columns: list[str] | None = None, chunksize: int = 1024) -> Iterator[pd.DataFrame]:
+    """
+    Parse a flight log CSV incrementally, yielding DataFrames of at most chunksize samples.
+    The chunks keep the sample index of the whole file. Closing the generator stops reading the file.
+    """
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda name: name.strip() in wanted
+
+    with pd.read_csv(
+        filepath, header=HEADER_ROW, skipinitialspace=True, usecols=usecols, engine="c", chunksize=chunksize
+    ) as reader:
+        for chunk in reader:
+            chunk.columns = [name.strip() for name in chunk.columns]
+            yield chunk
+
+
+def cache_path(filepath: Path) -> Path:
+    """
+    Return the cache file of a log, keyed on the log's path, size and modification time
+    """
+    stat = os.stat(filepath)
+    key = f"{CACHE_VERSION}|{Path(filepath).resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return CACHE_DIR / f"{Path(filepath).stem}-{digest}.npz"
+
+
+def _write_cache(path: Path, df: pd.DataFrame):
+    arrays = {}
+    for idx, col in enumerate(df.columns):
+        values = df[col]
+        if values.dtype.kind in "biuf":
+            arrays[f"n{idx}"] = values.to_numpy()
+        else:
+            # text columns are stored as fixed width unicode, missing values as empty strings
+            arrays[f"s{idx}"] = values.fillna("").to_numpy(dtype=str)
+    arrays["columns"] = np.array(df.columns, dtype=str)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file first so concurrent readers never see a partial cache
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def _read_cache(path: Path, columns: list[str] | None) -> pd.DataFrame:
+    with np.load(path, allow_pickle=False) as npz:
+        names = [str(name) for name in npz["columns"]]
+        data = {}
+        for idx, col in enumerate(names):
+            if columns is not None and col not in columns:
+                continue
+            if f"n{idx}" in npz:
+                data[col] = npz[f"n{idx}"]
+            else:
+                values = npz[f"s{idx}"].astype(object)
+                values[values == ""] = np.nan
+                data[col] = pd.Series(values)
+    return pd.DataFrame(data)
+
+
+def read_log(filepath: Path, columns: list[str] | None = None, use_cache: bool | None = None) -> pd.DataFrame:
+    """
+    Read a flight log, using the columnar cache when the log has been parsed before.
+
+    The whole log is cached on the first read so later reads of any set of columns
+    skip tokenizing. The cache is invalidated whenever the log's size or mtime change.
+
+    Params:
+        filepath: path of the CSV log
+        columns: the columns to keep, all columns when None
+        use_cache: override CACHE_ENABLED
+
+    Returns:
+        DataFrame with the requested columns, in file order
+    """
+    if use_cache is None:
+        use_cache = CACHE_ENABLED
+
+    if not use_cache:
+        with metrics.stage("parse_csv") as stage:
+            df = parse_log(filepath, columns)
+            stage.rows = len(df)
+        return df
+
+    path = cache_path(filepath)
+    if path.exists():
+        try:
+            with metrics.stage("read_cache") as stage:
+                df = _read_cache(path, columns)
+                stage.rows = len(df)
+            return df
+        except (OSError, ValueError, KeyError):
+            # a corrupted cache file is simply rebuilt
+            pass
+
+    with metrics.stage("parse_csv") as stage:
+        df = parse_log(filepath)
+        stage.rows = len(df)
+    try:
+        with metrics.stage("write_cache", len(df)):
+            _write_cache(path, df)
+    except OSError:
+        # caching is best effort, e.g. on a read-only file system
+        pass
+
+    if columns is not None:
+        df = df[[col for col in df.columns if col in columns]]
+    return df
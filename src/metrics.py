@@ -0,0 +1,201 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+# set SENSOR_DATA_METRICS to a file path to record the metrics of every detector run
+METRICS_PATH = os.getenv("SENSOR_DATA_METRICS") or None
+# set SENSOR_DATA_METRICS_MEMORY=1 to also record peak memory, tracing the allocations slows the pipeline down
+# by an order of magnitude so the timings of such runs are only comparable with each other
+TRACE_MEMORY = os.getenv("SENSOR_DATA_METRICS_MEMORY", "0") == "1"
+
+# the file being recorded in this process, None when the instrumentation is off
+_active: "FileMetrics | None" = None
+
+
+class Stage:
+    """
+    Timed section of the pipeline, used as a context manager. Set rows inside the block when the
+    number of rows is only known once the stage has run.
+    """
+
+    __slots__ = ("name", "rows", "wall_s", "peak_bytes", "_start", "_base_bytes")
+
+    def __init__(self, name: str, rows: int | None = None):
+        self.name = name
+        self.rows = rows
+        self.wall_s = 0.0
+        self.peak_bytes: int | None = None
+
+    def __enter__(self) -> "Stage":
+        if _active is not None:
+            if _active.trace_memory:
+                _active.track_peak()
+                self.peak_bytes = 0
+                self._base_bytes = tracemalloc.get_traced_memory()[0]
+            _active.open_stages.append(self)
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if _active is not None:
+            self.wall_s = time.perf_counter() - self._start
+            if _active.trace_memory:
+                _active.track_peak()
+            _active.open_stages.pop()
+            _active.stages.append(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {"stage": self.name, "wall_s": self.wall_s, "rows": self.rows, "peak_bytes": self.peak_bytes}
+
+
+_DISABLED_STAGE = Stage("disabled")
+
+
+def stage(name: str, rows: int | None = None) -> Stage:
+    """
+    Time a stage of the file being recorded, a no-op when no file is recorded
+    """
+    if _active is None:
+        return _DISABLED_STAGE
+    return Stage(name, rows)
+
+
+class FileMetrics:
+    """
+    Wall time, rows and peak traced memory of one log and of every stage run while processing it.
+    Peak memory is measured above the memory in use when the file or stage started, and is None
+    unless trace_memory is set.
+    """
+
+    def __init__(self, name: str, trace_memory: bool = False):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.stages: list[Stage] = []
+        self.open_stages: list[Stage] = []
+        self.rows: int | None = None
+        self.wall_s = 0.0
+        self.peak_bytes: int | None = 0 if trace_memory else None
+
+    def track_peak(self):
+        # fold the traced peak since the last call into the file and every open stage, then restart the peak
+        peak = tracemalloc.get_traced_memory()[1]
+        self.peak_bytes = max(self.peak_bytes, peak - self._base_bytes)
+        for s in self.open_stages:
+            s.peak_bytes = max(s.peak_bytes, peak - s._base_bytes)
+        tracemalloc.reset_peak()
+
+    def __enter__(self) -> "FileMetrics":
+        global _active
+        self._started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            self._base_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        _active = self
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        self.wall_s = time.perf_counter() - self._start
+        if self.trace_memory:
+            self.track_peak()
+        _active = None
+        if self._started_tracing:
+            tracemalloc.stop()
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "file": self.name,
+            "wall_s": self.wall_s,
+            "rows": self.rows,
+            "peak_bytes": self.peak_bytes,
+            "stages": [s.to_dict() for s in self.stages],
+        }
+
+
+def set_rows(rows: int):
+    """
+    Record the number of rows of the file being recorded
+    """
+    if _active is not None:
+        _active.rows = rows
+
+
+def write_metrics(path: Path, records: list[dict]):
+    """
+    Write one JSON object per file to a JSON-lines file
+    """
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def summarize(records: list[dict]) -> list[dict]:
+    """
+    Aggregate the stages of every file record, in the order the stages first ran
+    """
+    totals: dict[str, dict] = {}
+    for record in records:
+        for s in record["stages"]:
+            total = totals.setdefault(
+                s["stage"], {"stage": s["stage"], "calls": 0, "wall_s": 0.0, "max_s": 0.0, "rows": 0, "peak_bytes": None}
+            )
+            total["calls"] += 1
+            total["wall_s"] += s["wall_s"]
+            total["max_s"] = max(total["max_s"], s["wall_s"])
+            total["rows"] += s["rows"] or 0
+            if s["peak_bytes"] is not None:
+                total["peak_bytes"] = max(total["peak_bytes"] or 0, s["peak_bytes"])
+    return list(totals.values())
+
+
+def _megabytes(nbytes: int | None) -> str:
+    return f"{'-':>8}" if nbytes is None else f"{nbytes / 2 ** 20:>8.1f}"
+
+
+def format_summary(records: list[dict], slowest: int = 5) -> str:
+    """
+    Table of the time spent per stage over all files, followed by the slowest files
+    """
+    total_s = sum(record["wall_s"] for record in records)
+    lines = [
+        f"{'stage':<20} {'calls':>6} {'total s':>9} {'share':>6} {'mean ms':>9} {'max ms':>9} {'rows/s':>11} {'peak MB':>8}"
+    ]
+    for total in summarize(records):
+        share = total["wall_s"] / total_s if total_s > 0 else 0.0
+        rate = f"{total['rows'] / total['wall_s']:>11.0f}" if total["rows"] and total["wall_s"] > 0 else f"{'-':>11}"
+        lines.append(
+            f"{total['stage']:<20} {total['calls']:>6} {total['wall_s']:>9.3f} {share:>6.1%} "
+            f"{total['wall_s'] / total['calls'] * 1000:>9.2f} {total['max_s'] * 1000:>9.2f} {rate} "
+            f"{_megabytes(total['peak_bytes'])}"
+        )
+
+    lines.append(f"{len(records)} files in {total_s:.3f} s, slowest:")
+    for record in sorted(records, key=lambda r: r["wall_s"], reverse=True)[:slowest]:
+        line = f"  {record['file']:<40} {record['wall_s'] * 1000:>9.2f} ms"
+        if record["peak_bytes"] is not None:
+            line += f" {record['peak_bytes'] / 2 ** 20:>8.1f} MB"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def profile_call(path: Path, func, *args):
+    """
+    Run func(*args) under cProfile and dump the statistics to path, readable with pstats
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(str(path))
@@ -0,0 +1,158 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import numpy as np
+import pandas as pd
+from shapely import Polygon
+from src.detector import (
+    ALTITUDE_ERROR,
+    ENGINE_SPEED_PREFLIGHT_THRESHOLD,
+    ENGINE_SPEED_TAKEOFF_THRESHOLD,
+    GROUND_SPEED_TAKEOFF_THRESHOLD,
+)
+from src.flight import Flight
+from src.geo_utils import runway_index
+from src.utils import CSVColumns
+
+# phase of every sample, see segment_phases
+ENGINE_OFF = 0
+TAXI = 1
+RUNUP = 2
+TAKEOFF_ROLL = 3
+AIRBORNE = 4
+LANDING_ROLL = 5
+PHASE_NAMES = ("engine-off", "taxi", "runup", "takeoff roll", "airborne", "landing roll")
+
+# below this engine speed the engine is considered stopped
+ENGINE_RUNNING_THRESHOLD = 500
+# the run-up is done at a standstill, at most at this ground speed in knots
+RUNUP_GROUND_SPEED = 5
+
+TAKEOFF = "takeoff"
+LANDING = "landing"
+
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    # replace the NaN samples by the last valid sample, leading NaN samples stay NaN
+    valid = ~np.isnan(values)
+    idx = np.maximum.accumulate(np.where(valid, np.arange(len(values)), 0))
+    return values[idx]
+
+
+def _next_true(mask: np.ndarray) -> np.ndarray:
+    # index of the first True sample at or after every sample, len(mask) when there is none
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(idx[::-1])[::-1]
+
+
+def _last_true(mask: np.ndarray) -> np.ndarray:
+    # index of the last True sample at or before every sample, -1 when there is none
+    idx = np.where(mask, np.arange(len(mask)), -1)
+    return np.maximum.accumulate(idx)
+
+
+def _fill_spans(n: int, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # boolean mask of the samples within any of the [start, end) spans
+    delta = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    return np.cumsum(delta[:-1]) > 0
+
+
+def segment_phases(
+    df: pd.DataFrame | Flight, runways: list[tuple[Polygon, float]] | None = None
+) -> tuple[np.ndarray, list[tuple[str, int, int]]]:
+    """
+    Label every sample of a flight with its phase and find every takeoff and landing, in one pass over
+    whole arrays.
+
+    The aircraft is on the ground within ALTITUDE_ERROR of the airport elevation, like the takeoff detection.
+    On the ground, a takeoff roll is the last run of samples on a runway at the takeoff ground speed or engine
+    speed before the aircraft climbs out. A landing roll starts when the aircraft descends to the ground and
+    lasts until it slows below the takeoff ground speed, or until takeoff power is applied again on a
+    touch-and-go. The other ground samples are engine-off, run-up (at a standstill above the preflight engine
+    speed) or taxi. Missing samples keep the value of the previous sample.
+
+    Params:
+        df: the flight samples returned by read_data, or a Flight returned by read_flight
+        runways: the airport's runways returned by read_data, defaults to the Flight's runways
+
+    Returns:
+        (int8 phase per sample, see PHASE_NAMES), [(TAKEOFF or LANDING, sample index, runway id or -1)]
+        with the events in sample order. The takeoff index is the start of the takeoff roll, the landing
+        index the first sample on the ground.
+    """
+    if runways is None:
+        if not isinstance(df, Flight):
+            raise ValueError("The runways are required to segment the phases of a DataFrame")
+        runways = df.runways
+
+    altitude = _forward_fill(np.asarray(df[CSVColumns.AltMSL], dtype=float))
+    ground_speed = _forward_fill(np.asarray(df[CSVColumns.GndSpd], dtype=float))
+    engine_speed = _forward_fill(np.asarray(df[CSVColumns.E1_RPM], dtype=float))
+    n = len(altitude)
+    phases = np.full(n, TAXI, dtype=np.int8)
+    if n == 0 or len(runways) == 0:
+        return phases, []
+
+    elevation = runways[0][1]
+    runway_ids = runway_index(np.asarray(df[CSVColumns.Latitude]), np.asarray(df[CSVColumns.Longitude]), runways)
+
+    # leading samples without an altitude are counted as on the ground
+    on_ground = ~(np.abs(altitude - elevation) >= ALTITUDE_ERROR)
+    # on the airport's runways the takeoff conditions of the detector, elsewhere (e.g. another airfield
+    # within the altitude tolerance) only the ground speed, as the engine is also run up off the runways
+    fast = ground_speed > GROUND_SPEED_TAKEOFF_THRESHOLD
+    rolling = fast | ((runway_ids != -1) & (engine_speed > ENGINE_SPEED_TAKEOFF_THRESHOLD))
+
+    # the [start, end) spans of the ground segments
+    edges = np.flatnonzero(np.diff(on_ground.astype(np.int8))) + 1
+    bounds = np.concatenate(([0], edges, [n]))
+    starts, ends = bounds[:-1], bounds[1:]
+    ground = on_ground[starts]
+    starts, ends = starts[ground], ends[ground]
+    after_flight = starts > 0
+    before_flight = ends < n
+
+    # the aircraft lands when it descends at speed and the power is reduced below the takeoff engine speed,
+    # without power reduction the descent is a low approach. A slow descent is altimeter noise while taxiing.
+    # Landing rolls last from the descent until the aircraft slows down, or until takeoff power is applied
+    # again on a touch-and-go.
+    idle = np.append(_next_true(engine_speed <= ENGINE_SPEED_TAKEOFF_THRESHOLD), n)
+    powered = np.append(_next_true(engine_speed > ENGINE_SPEED_TAKEOFF_THRESHOLD), n)
+    slowed = _next_true(ground_speed <= GROUND_SPEED_TAKEOFF_THRESHOLD)
+    descents = after_flight & fast[starts]
+    landed = descents & (idle[starts] < ends)
+    low_approach = descents & ~landed
+    landing_ends = np.minimum.reduce([slowed[starts], ends, powered[idle[starts]]])
+    landing_ends[~landed] = starts[~landed]
+
+    # takeoff rolls start at the last run of rolling samples before the climb out, after any landing roll
+    last_rolling = _last_true(rolling)
+    last_stopped = _last_true(~rolling)
+    roll_ends = last_rolling[np.maximum(ends - 1, 0)]
+    takeoff_starts = np.maximum(last_stopped[np.maximum(roll_ends, 0)] + 1, landing_ends)
+    has_roll = before_flight & (roll_ends >= landing_ends) & ~low_approach
+    takeoff_starts[~has_roll] = ends[~has_roll]
+
+    phases[~on_ground] = AIRBORNE
+    landing_rolls = _fill_spans(n, starts, landing_ends)
+    takeoff_rolls = _fill_spans(n, takeoff_starts, ends)
+    ground_samples = on_ground & ~landing_rolls & ~takeoff_rolls
+    phases[ground_samples & (engine_speed < ENGINE_RUNNING_THRESHOLD)] = ENGINE_OFF
+    phases[ground_samples & (engine_speed > ENGINE_SPEED_PREFLIGHT_THRESHOLD) & (ground_speed <= RUNUP_GROUND_SPEED)] = RUNUP
+    phases[landing_rolls] = LANDING_ROLL
+    phases[takeoff_rolls] = TAKEOFF_ROLL
+
+    # the landing is reported on the first runway the landing roll crosses
+    on_runway = _next_true(runway_ids != -1)
+    events = [
+        (LANDING, int(start), int(runway_ids[on_runway[start]]) if on_runway[start] < end else -1)
+        for start, end in zip(starts[landed], landing_ends[landed])
+    ]
+    events += [(TAKEOFF, int(start), int(runway_ids[start])) for start in takeoff_starts[has_roll]]
+    events.sort(key=lambda event: event[1])
+
+    return phases, events
@@ -0,0 +1,107 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import os
+import numpy as np
+import pandas as pd
+from src.utils import MISSING_TIMESTAMP, TIMESTAMP_COLUMN
+
+# set SENSOR_DATA_REPAIR_GAPS=1 to resample every log onto a uniform time axis before the detection
+REPAIR_GAPS = os.getenv("SENSOR_DATA_REPAIR_GAPS", "0") == "1"
+# the recorders log one sample per second
+SAMPLE_PERIOD = 1
+# dropouts of at most this many seconds are interpolated, longer ones are left missing
+MAX_GAP = int(os.getenv("SENSOR_DATA_MAX_GAP", "5"))
+
+# columns added by repair_gaps: whether every channel of the sample was recorded or interpolated, and the
+# first row of the log recorded at or after the sample
+VALID_COLUMN = "Valid"
+SOURCE_ROW_COLUMN = "Row"
+
+
+def resample_uniform(
+    timestamps: np.ndarray, values: np.ndarray, period: int = SAMPLE_PERIOD, max_gap: int = MAX_GAP
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Place the samples of a log on a uniform time axis and interpolate the short dropouts.
+
+    The rows without a timestamp are dropped, the first of the rows sharing a sample slot is kept, and the
+    rows are only sorted when the recorder clock went backwards. A channel missing for at most max_gap
+    seconds between two recorded values, either because rows are missing or because the values are NaN, is
+    linearly interpolated. Longer dropouts and the samples before the first or after the last recorded value
+    of a channel stay NaN.
+
+    Params:
+        timestamps: UTC epoch seconds of every row, MISSING_TIMESTAMP when unknown
+        values: (n,) or (n, channels) array of the numeric channels of every row
+        period: seconds between two samples of the uniform axis
+        max_gap: longest interpolated dropout in seconds
+
+    Returns:
+        (uniform time axis, values on the axis, whether every channel of the sample is known, the first row
+        recorded at or after every sample)
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    arr = values.reshape(len(values), -1)
+
+    rows = np.flatnonzero(timestamps != MISSING_TIMESTAMP)
+    if len(rows) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.empty((0,) + values.shape[1:]), np.empty(0, dtype=bool), empty
+    if (np.diff(timestamps[rows]) < 0).any():
+        rows = rows[np.argsort(timestamps[rows], kind="stable")]
+
+    start = timestamps[rows[0]]
+    slots = (timestamps[rows] - start) // period
+    first = np.append(True, np.diff(slots) > 0)
+    rows, slots = rows[first], slots[first]
+
+    m = int(slots[-1]) + 1
+    axis = start + np.arange(m, dtype=np.int64) * period
+    source_rows = rows[np.searchsorted(slots, np.arange(m), side="left")]
+
+    resampled = np.full((m, arr.shape[1]), np.nan)
+    resampled[slots] = arr[rows]
+
+    # the last and next recorded value of every sample and channel, in one pass each way
+    recorded = ~np.isnan(resampled)
+    idx = np.arange(m)[:, None]
+    previous = np.maximum.accumulate(np.where(recorded, idx, -1), axis=0)
+    following = np.minimum.accumulate(np.where(recorded, idx, m)[::-1], axis=0)[::-1]
+
+    dropout = ~recorded & (previous >= 0) & (following < m) & ((following - previous - 1) * period <= max_gap)
+    if dropout.any():
+        before = np.take_along_axis(resampled, np.maximum(previous, 0), axis=0)
+        after = np.take_along_axis(resampled, np.minimum(following, m - 1), axis=0)
+        weight = (idx - previous) / np.maximum(following - previous, 1)
+        resampled[dropout] = (before + weight * (after - before))[dropout]
+
+    valid = (recorded | dropout).all(axis=1)
+    return axis, resampled.reshape((m,) + values.shape[1:]), valid, source_rows
+
+
+def repair_gaps(df: pd.DataFrame, columns: list[str], period: int = SAMPLE_PERIOD, max_gap: int = MAX_GAP) -> pd.DataFrame:
+    """
+    Resample the rows of a log holding the TIMESTAMP_COLUMN onto a uniform time axis, see resample_uniform.
+
+    Params:
+        columns: the numeric columns to resample, the other columns take the value of the row recorded at or
+            after each sample
+
+    Returns:
+        the resampled rows with the VALID_COLUMN and SOURCE_ROW_COLUMN columns
+    """
+    axis, values, valid, source_rows = resample_uniform(
+        df[TIMESTAMP_COLUMN].to_numpy(), df[columns].to_numpy(dtype=float), period, max_gap
+    )
+
+    repaired = {
+        col: values[:, columns.index(col)] if col in columns else df[col].to_numpy()[source_rows]
+        for col in df.columns if col != TIMESTAMP_COLUMN
+    }
+    repaired[TIMESTAMP_COLUMN] = axis
+    repaired[VALID_COLUMN] = valid
+    repaired[SOURCE_ROW_COLUMN] = source_rows
+    return pd.DataFrame(repaired)
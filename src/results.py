@@ -0,0 +1,193 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import csv
+import io
+import json
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+# the output formats of the detector: the original "file, runway, timestamp, index" lines, or CSV and
+# JSON lines with every field of RESULT_FIELDS
+RESULT_FORMATS = ("text", "csv", "jsonl")
+RESULT_FIELDS = ("file", "runway_id", "takeoff_ts", "takeoff_idx", "wall_s", "error")
+
+
+def make_result(
+    name: str, ts: float | str | None, takeoff_idx: int, runway_id: int, wall_s: float | None = None, error: str | None = None
+) -> dict:
+    """
+    The result of a log, ts is the takeoff timestamp returned by process_file. wall_s is the time spent
+    on the log and error the failure message, both None when unknown.
+    """
+    return {
+        "file": name,
+        "runway_id": int(runway_id),
+        "takeoff_ts": float(ts) if isinstance(ts, float) else None,
+        "takeoff_idx": int(takeoff_idx),
+        "wall_s": wall_s,
+        "error": error,
+    }
+
+
+def result_format(path: str | Path, fmt: str | None = None) -> str:
+    """
+    The format of an output file: fmt when given, otherwise from the file's suffix, text by default
+    """
+    if fmt is not None:
+        if fmt not in RESULT_FORMATS:
+            raise ValueError(f"Unknown result format {fmt}, expected one of {RESULT_FORMATS}")
+        return fmt
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".jsonl", ".json"):
+        return "jsonl"
+    return "text"
+
+
+def _csv_header() -> str:
+    return ",".join(RESULT_FIELDS) + "\n"
+
+
+def format_result(result: dict, fmt: str) -> str:
+    """
+    The output line of a result, including the line break
+    """
+    if fmt == "jsonl":
+        return json.dumps({field: result[field] for field in RESULT_FIELDS}) + "\n"
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow(
+            ["" if result[field] is None else result[field] for field in RESULT_FIELDS]
+        )
+        return buffer.getvalue()
+    return f"{result['file']}, {result['runway_id']}, {result['takeoff_ts']}, {result['takeoff_idx']}\n"
+
+
+def _optional(value: str, cast):
+    return None if value in ("", "None") else cast(value)
+
+
+def parse_result(line: str, fmt: str) -> dict:
+    """
+    The result of an output line written by format_result. The text lines have no time nor error.
+    """
+    if fmt == "jsonl":
+        row = json.loads(line)
+        return {field: row.get(field) for field in RESULT_FIELDS}
+    if fmt == "csv":
+        values = dict(zip(RESULT_FIELDS, next(csv.reader([line]))))
+        return {
+            "file": values["file"],
+            "runway_id": int(values["runway_id"]),
+            "takeoff_ts": _optional(values["takeoff_ts"], float),
+            "takeoff_idx": int(values["takeoff_idx"]),
+            "wall_s": _optional(values["wall_s"], float),
+            "error": _optional(values["error"], str),
+        }
+    name, runway_id, ts, takeoff_idx = line.rstrip("\n").split(", ")
+    return make_result(name, _optional(ts, float), int(takeoff_idx), int(runway_id))
+
+
+def read_results(path: str | Path, fmt: str | None = None) -> dict[str, dict]:
+    """
+    The results of an output file by file name, the last line of a log wins. A partial last line left
+    by an interrupted run is ignored.
+    """
+    fmt = result_format(path, fmt)
+    path = Path(path)
+    if not path.exists():
+        return {}
+
+    results = {}
+    with open(path) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            if (fmt == "csv" and line == _csv_header()) or not line.strip():
+                continue
+            result = parse_result(line, fmt)
+            results[result["file"]] = result
+    return results
+
+
+class ResultWriter:
+    """
+    Write the result of every log to the output file as soon as it is known, so the results of an
+    interrupted run are kept and can be read while the run goes on.
+
+    Once the run completes, finish rewrites the file with one line per log in the order of the logs,
+    the same file as a run written at once.
+    """
+
+    def __init__(self, path: str | Path, fmt: str | None = None, resume: bool = False):
+        """
+        Params:
+            path: path of the output file
+            fmt: one of RESULT_FORMATS, defaults to result_format of the path
+            resume: keep the results already in the file and append to it, see completed
+        """
+        self.path = Path(path)
+        self.fmt = result_format(path, fmt)
+        self.results = read_results(self.path, self.fmt) if resume else {}
+
+        if resume and self.path.exists():
+            # drop a partial last line before appending
+            with open(self.path, "rb+") as f:
+                content = f.read()
+                f.truncate(content.rfind(b"\n") + 1)
+
+        self._file = open(self.path, "a" if resume else "w")
+        if self.fmt == "csv" and self._file.tell() == 0:
+            self._file.write(_csv_header())
+            self._file.flush()
+
+    def completed(self) -> set[str]:
+        """
+        The file names of the logs with a result, except the failed logs which are processed again.
+
+        A text line does not record the error, and a failed log is written like a log without takeoff, so
+        only the text lines with a takeoff are known to be complete. The logs without takeoff are processed
+        again when resuming a text output.
+        """
+        if self.fmt == "text":
+            return {name for name, result in self.results.items() if result["takeoff_idx"] >= 0}
+        return {name for name, result in self.results.items() if result["error"] is None}
+
+    def write(self, result: dict):
+        self.results[result["file"]] = result
+        self._file.write(format_result(result, self.fmt))
+        self._file.flush()
+
+    def finish(self, names: list[str]):
+        """
+        Rewrite the output file with the results of names in order, dropping the results of other logs
+        """
+        self.close()
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            # mkstemp creates the file readable by its owner only, keep the permissions of the output file
+            os.fchmod(fd, stat.S_IMODE(os.stat(self.path).st_mode))
+            with os.fdopen(fd, "w") as f:
+                if self.fmt == "csv":
+                    f.write(_csv_header())
+                f.writelines(format_result(self.results[name], self.fmt) for name in names if name in self.results)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,156 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import json
+import pathlib
+import numpy as np
+from functools import lru_cache
+
+# the runway geometry, also read by geo_utils.RunwayCatalog
+ASSET_FILEPATH = (
+    pathlib.Path(__file__).parent.parent / "data" / "geometry" / "runways.geojson"
+)
+
+# mean radius of the earth
+EARTH_RADIUS_M = 6371008.8
+
+
+def local_projection(
+    lat: np.ndarray, long: np.ndarray, origin_lat: float, origin_long: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Project coordinates to (east, north) meters on the plane tangent to the sphere at the origin,
+    accurate to well under a meter within a few kilometers of the origin
+    """
+    lat = np.asarray(lat, dtype=float)
+    long = np.asarray(long, dtype=float)
+    east = np.radians(long - origin_long) * np.cos(np.radians(origin_lat)) * EARTH_RADIUS_M
+    north = np.radians(lat - origin_lat) * EARTH_RADIUS_M
+    return east, north
+
+
+@lru_cache(maxsize=None)
+def _read_rings(filepath: pathlib.Path) -> dict[str, list[tuple[np.ndarray, float]]]:
+    # the exterior ring of every runway as an (n, 2) array of (long, lat), with the airport elevation
+    with open(filepath, "r") as f:
+        features = json.load(f)["features"]
+
+    airports: dict[str, list[tuple[np.ndarray, float]]] = {}
+    for feat in features:
+        properties = feat["properties"]
+        ring = np.asarray(feat["geometry"]["coordinates"][0], dtype=float)
+        airports.setdefault(properties["airportId"], []).append((ring, properties["elevationFtMSL"]))
+    return airports
+
+
+def load_airport_rings(airportId: str, filepath: pathlib.Path = ASSET_FILEPATH) -> list[tuple[np.ndarray, float]]:
+    """
+    Load the airport's runways from the GeoJSON file without shapely: the exterior ring of every runway as an
+    (n, 2) array of (long, lat), in file order like load_airport_runways, with the airport elevation in feet MSL
+    """
+    return list(_read_rings(pathlib.Path(filepath)).get(airportId, []))
+
+
+class RunwayFrame:
+    """
+    The runways of an airport projected once to a local metric frame centered on the airport, answering
+    which runway each sample of a flight is on with whole-array point-in-polygon tests.
+
+    The runways are tested in meters, so a runway keeps its shape at any latitude, and a runway can be
+    widened by a buffer in meters. No shapely or per-sample Python object is involved.
+    """
+
+    def __init__(self, rings: list[np.ndarray], buffer_m: float = 0.0):
+        """
+        Params:
+            rings: the exterior ring of every runway as an (n, 2) array of (long, lat), closed or not
+            buffer_m: samples within this distance in meters of a runway's edges are also on the runway
+        """
+        self.buffer_m = float(buffer_m)
+        vertices = np.concatenate(rings) if rings else np.zeros((0, 2))
+        self.origin = (float(vertices[:, 1].mean()), float(vertices[:, 0].mean())) if len(vertices) else (0.0, 0.0)
+
+        # the edges of every runway as (x0, y0, x1, y1) rows, and the bounding box of every runway widened
+        # by the buffer as (min_x, min_y, max_x, max_y)
+        self._edges = []
+        self._bounds = np.empty((len(rings), 4))
+        for runway_id, ring in enumerate(rings):
+            x, y = local_projection(ring[:, 1], ring[:, 0], *self.origin)
+            if x[0] != x[-1] or y[0] != y[-1]:
+                x, y = np.append(x, x[0]), np.append(y, y[0])
+            self._edges.append(np.column_stack((x[:-1], y[:-1], x[1:], y[1:])))
+            self._bounds[runway_id] = (
+                x.min() - self.buffer_m, y.min() - self.buffer_m, x.max() + self.buffer_m, y.max() + self.buffer_m
+            )
+
+    @classmethod
+    def from_polygons(cls, runways: list[tuple], buffer_m: float = 0.0) -> "RunwayFrame":
+        """
+        The frame of the runways returned by load_airport_runways
+        """
+        return cls([np.asarray(polygon.exterior.coords, dtype=float)[:, :2] for polygon, _ in runways], buffer_m)
+
+    @classmethod
+    def for_airport(cls, airportId: str, buffer_m: float = 0.0, filepath: pathlib.Path = ASSET_FILEPATH) -> "RunwayFrame":
+        """
+        The frame of an airport's runways read from the GeoJSON file, see load_airport_rings
+        """
+        return cls([ring for ring, _ in load_airport_rings(airportId, filepath)], buffer_m)
+
+    def __len__(self) -> int:
+        return len(self._edges)
+
+    def project(self, lat: np.ndarray, long: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (east, north) meters of coordinates from the center of the airport
+        """
+        return local_projection(lat, long, *self.origin)
+
+    def locate(self, lat: np.ndarray, long: np.ndarray) -> np.ndarray:
+        """
+        Vectorized geo_utils.on_runway in the local frame. Returns for every sample the id of the first
+        runway containing it, or within buffer_m of its edges, otherwise -1. NaN samples are on no runway.
+        """
+        x, y = self.project(lat, long)
+        ids = np.full(x.shape, -1, dtype=np.int64)
+        if len(self._edges) == 0:
+            return ids
+
+        # only the samples within the bounding box of all runways are tested against each runway
+        min_x, min_y = self._bounds[:, :2].min(axis=0)
+        max_x, max_y = self._bounds[:, 2:].max(axis=0)
+        near = np.flatnonzero((x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y))
+        x, y = x[near], y[near]
+
+        # visit the runways last to first so the lowest matching runway id wins, like on_runway
+        for runway_id in reversed(range(len(self._edges))):
+            min_x, min_y, max_x, max_y = self._bounds[runway_id]
+            candidates = np.flatnonzero((x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y))
+            if len(candidates) == 0:
+                continue
+            inside = self._contains(runway_id, x[candidates], y[candidates])
+            ids[near[candidates[inside]]] = runway_id
+
+        return ids
+
+    def _contains(self, runway_id: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        # even-odd rule over the candidate samples x all edges of the runway, plus the distance to the
+        # edges when the runway is buffered
+        x0, y0, x1, y1 = (column[None, :] for column in self._edges[runway_id].T)
+        px, py = x[:, None], y[:, None]
+
+        crosses = (y0 > py) != (y1 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+        inside = np.count_nonzero(crosses & (px < x_cross), axis=1) % 2 == 1
+
+        if self.buffer_m > 0:
+            dx, dy = x1 - x0, y1 - y0
+            length2 = dx * dx + dy * dy
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.clip(np.where(length2 > 0, ((px - x0) * dx + (py - y0) * dy) / length2, 0.0), 0.0, 1.0)
+            distance = np.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+            inside |= (distance <= self.buffer_m).any(axis=1)
+
+        return inside
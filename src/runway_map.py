@@ -0,0 +1,189 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import os
+import sys
+import tempfile
+import urllib.parse
+import urllib.request
+import numpy as np
+from pathlib import Path
+from shapely import MultiPolygon, Polygon
+
+# the imagery of every airport and zoom level is fetched once and read from this directory afterwards
+MAP_CACHE_DIR = Path(
+    os.getenv("SENSOR_DATA_MAP_CACHE_DIR", Path(__file__).parent.parent / ".cache" / "maps")
+)
+MAP_ZOOM = 15
+MAP_SIZE = (600, 400)
+MAP_TYPE = "satellite"
+# seconds before a stalled download of a static map is abandoned and the map drawn without imagery
+MAP_FETCH_TIMEOUT = float(os.getenv("SENSOR_DATA_MAP_FETCH_TIMEOUT", "10"))
+
+# the Web Mercator world is 256 pixels wide at zoom 0, like the map tiles and static map images
+TILE_SIZE = 256
+
+RUNWAY_COLOR = "lightblue"
+TAKEOFF_RUNWAY_COLOR = "steelblue"
+FLIGHT_PATH_COLOR = "magenta"
+
+
+def mercator_pixels(lat: np.ndarray, lng: np.ndarray, zoom: int = MAP_ZOOM) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Project coordinates to Web Mercator pixels at a zoom level, y grows southwards like image rows
+    """
+    scale = TILE_SIZE * 2 ** zoom
+    lat = np.radians(np.asarray(lat, dtype=float))
+    x = scale * (np.asarray(lng, dtype=float) + 180.0) / 360.0
+    y = scale * (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return x, y
+
+
+def airport_center(runways: list[tuple[Polygon, float]]) -> tuple[float, float]:
+    """
+    (lat, lng) of the center of the bounding box of an airport's runways
+    """
+    min_lng, min_lat, max_lng, max_lat = MultiPolygon([runway[0] for runway in runways]).bounds
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+def map_extent(center: tuple[float, float], zoom: int = MAP_ZOOM, size: tuple[int, int] = MAP_SIZE) -> tuple[float, float, float, float]:
+    """
+    (left, right, bottom, top) Web Mercator pixels of a map of size pixels centered on (lat, lng), the
+    extent of the static map image of the same center, zoom and size
+    """
+    cx, cy = mercator_pixels(center[0], center[1], zoom)
+    width, height = size
+    return float(cx - width / 2), float(cx + width / 2), float(cy + height / 2), float(cy - height / 2)
+
+
+def generate_static_map_url(center_lat, center_lng, zoom=15, size="600x400", map_type="satellite", poly:list[dict]|None=None, marker_config=None):
+    base_url = "https://maps.googleapis.com/maps/api/staticmap"
+    params = [
+        ("center", f"{center_lat},{center_lng}"),
+        ("zoom", zoom),
+        ("size", size),
+        ("maptype", map_type),
+        ("key", os.getenv('GOOGLE_MAPS_API_KEY'))
+    ]
+
+    if marker_config and marker_config['location']:
+        marker_style = f"color:{marker_config['color']}|size:3|label:{marker_config['label']}|"
+        params.append(('markers', marker_style + marker_config['location']))
+
+    query_string = urllib.parse.urlencode(
+        params,
+        safe="|:,",  # Do not URL-encode these characters
+        quote_via=urllib.parse.quote
+    )
+
+    if poly:
+        for pline in poly:
+            color = pline['color']
+            points = pline['points']
+            polyl = f"color:{color}|weight:3|" + "|".join(list(map(lambda p: f"{p.y},{p.x}", points)))
+            query_string += f"&path={polyl}"
+
+
+    return f"{base_url}?{query_string}"
+
+
+def map_cache_path(airport_code: str, zoom: int = MAP_ZOOM, size: tuple[int, int] = MAP_SIZE, map_type: str = MAP_TYPE) -> Path:
+    return MAP_CACHE_DIR / f"{airport_code}_z{zoom}_{size[0]}x{size[1]}_{map_type}.png"
+
+
+def fetch_airport_imagery(
+    airport_code: str,
+    center: tuple[float, float],
+    zoom: int = MAP_ZOOM,
+    size: tuple[int, int] = MAP_SIZE,
+    map_type: str = MAP_TYPE,
+) -> Path:
+    """
+    Return the path of the static map image of an airport, downloading it on first use only.
+    The image holds the imagery alone, the runways and flight paths are drawn over it.
+
+    Raises:
+        OSError when the image is not cached and cannot be downloaded
+    """
+    path = map_cache_path(airport_code, zoom, size, map_type)
+    if path.exists():
+        return path
+
+    url = generate_static_map_url(center[0], center[1], zoom=zoom, size=f"{size[0]}x{size[1]}", map_type=map_type)
+    with urllib.request.urlopen(url, timeout=MAP_FETCH_TIMEOUT) as response:
+        img_data = response.read()
+
+    # write atomically so concurrent plots of the same airport never read a partial image
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(img_data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def draw_runway_map(
+    ax,
+    airport_code: str,
+    runways: list[tuple[Polygon, float]],
+    path_lat: np.ndarray,
+    path_lng: np.ndarray,
+    takeoff: tuple[float, float] | None = None,
+    takeoff_runway: int = -1,
+    imagery: bool = False,
+    zoom: int = MAP_ZOOM,
+    size: tuple[int, int] = MAP_SIZE,
+):
+    """
+    Draw an airport's runways, a flight path and the takeoff position in matplotlib, without any network access.
+
+    Params:
+        ax: matplotlib axes to draw on
+        runways: the airport's runways returned by load_airport_runways
+        path_lat, path_lng: coordinates of the flight path
+        takeoff: (lat, lng) of the takeoff marker
+        takeoff_runway: id of the runway highlighted as the takeoff runway
+        imagery: draw the airport's cached static map under the runways, fetching it on first use. The map is
+            drawn without imagery when it cannot be fetched, e.g. on hosts without network access.
+    """
+    center = airport_center(runways)
+    left, right, bottom, top = map_extent(center, zoom, size)
+
+    if imagery:
+        try:
+            image = fetch_airport_imagery(airport_code, center, zoom, size)
+            ax.imshow(_read_image(image), extent=(left, right, bottom, top), zorder=0)
+        except OSError as e:
+            print(f"No imagery of {airport_code}: {e}", file=sys.stderr)
+
+    for runway_id, (polygon, _) in enumerate(runways):
+        lng, lat = polygon.exterior.xy
+        x, y = mercator_pixels(np.asarray(lat), np.asarray(lng), zoom)
+        color = TAKEOFF_RUNWAY_COLOR if runway_id == takeoff_runway else RUNWAY_COLOR
+        ax.fill(x, y, color=color, alpha=0.6 if imagery else 1.0, zorder=1)
+        ax.plot(x, y, color="blue", linewidth=1, zorder=2)
+
+    x, y = mercator_pixels(path_lat, path_lng, zoom)
+    ax.plot(x, y, color=FLIGHT_PATH_COLOR, linewidth=2, alpha=0.5, label="flight path", zorder=3)
+
+    if takeoff is not None:
+        x, y = mercator_pixels(takeoff[0], takeoff[1], zoom)
+        ax.plot(x, y, color=FLIGHT_PATH_COLOR, marker="o", linestyle="None", markersize=10, label="Takeoff Moment", zorder=4)
+
+    ax.set_xlim(left, right)
+    ax.set_ylim(bottom, top)
+    ax.set_aspect("equal")
+    ax.axis("off")
+
+
+def _read_image(path: Path) -> np.ndarray:
+    # read with Pillow like the original static map download, the maps may be palette PNGs
+    from PIL import Image
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"))
@@ -0,0 +1,128 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Iterator
+from src.detector import (
+    READ_COLUMNS,
+    SMOOTHED_COLUMNS,
+    SMOOTHING_WINDOW,
+    parse_airport_code,
+    takeoff_mask,
+)
+from src import metrics
+from src.geo_utils import load_airport_runways
+from src.log_reader import iter_log_chunks
+from src.utils import CSVColumns, create_timestamp
+
+STREAM_CHUNK_SIZE = 256
+
+
+class StreamingMovingAverage:
+    """
+    A moving average filter over a stream of (samples, channels) chunks, producing the same values
+    as moving_average_filter on the whole signal.
+
+    moving_average_filter centers the window on each sample, so a smoothed sample is only emitted once
+    the (window_size - 1) // 2 samples following it have been pushed. The samples still missing their
+    look-ahead are emitted by flush() at the end of the stream, zero padded like np.convolve(mode='same').
+    """
+
+    def __init__(self, window_size: int, channels: int):
+        self._kernel = 1 / window_size * np.ones(window_size)
+        self._lookahead = (window_size - 1) // 2
+        # the last raw samples still needed by the next window, zero padded before the first sample
+        self._history = np.zeros((window_size // 2, channels))
+
+    def push(self, arr: np.ndarray) -> np.ndarray:
+        """
+        Add (n, channels) samples and return the smoothed samples that became complete
+        """
+        buffer = np.concatenate([self._history, np.asarray(arr, dtype=float)])
+        count = max(0, len(buffer) - (len(self._kernel) - 1))
+
+        smoothed = np.empty((count, buffer.shape[1]))
+        if count > 0:
+            for col in range(buffer.shape[1]):
+                smoothed[:, col] = np.convolve(buffer[:, col], self._kernel, mode='valid')
+
+        self._history = buffer[count:]
+        return smoothed
+
+    def flush(self) -> np.ndarray:
+        """
+        Return the remaining smoothed samples at the end of the stream
+        """
+        return self.push(np.zeros((self._lookahead, self._history.shape[1])))
+
+
+def iter_smoothed_chunks(filepath: Path, chunksize: int = STREAM_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Read a flight log in chunks and yield the samples with SMOOTHED_COLUMNS smoothed like read_data.
+
+    The yielded chunks trail the file by the filter's look-ahead and keep the sample index of the whole file.
+    Closing the generator stops reading the file.
+    """
+    smoother = StreamingMovingAverage(SMOOTHING_WINDOW, len(SMOOTHED_COLUMNS))
+    pending: list[pd.DataFrame] = []
+
+    def emit(smoothed: np.ndarray) -> pd.DataFrame | None:
+        # pair the smoothed values with the oldest pending raw samples
+        if len(smoothed) == 0:
+            return None
+        rows = pd.concat(pending) if len(pending) > 1 else pending[0]
+        chunk, rest = rows.iloc[:len(smoothed)].copy(), rows.iloc[len(smoothed):]
+        pending[:] = [rest] if len(rest) > 0 else []
+        for col_idx, col in enumerate(SMOOTHED_COLUMNS):
+            chunk[col] = smoothed[:, col_idx]
+        return chunk
+
+    for raw in iter_log_chunks(filepath, READ_COLUMNS, chunksize):
+        pending.append(raw)
+        chunk = emit(smoother.push(raw[SMOOTHED_COLUMNS].to_numpy(dtype=float)))
+        if chunk is not None:
+            yield chunk
+
+    if pending:
+        chunk = emit(smoother.flush())
+        if chunk is not None:
+            yield chunk
+
+
+def detect_takeoff_streaming(filepath: Path, chunksize: int = STREAM_CHUNK_SIZE) -> tuple[float | str | None, int, int]:
+    """
+    Detect the first valid takeoff of a log like process_file, reading the log only up to the takeoff.
+
+    Returns:
+        (utc timestamp or None, takeoff index or -1, runway id or -1)
+    """
+    with metrics.stage("load_runways"):
+        runways = load_airport_runways(parse_airport_code(filepath))
+    if len(runways) == 0:
+        return 'None', -1, -1
+
+    runway_id = -1
+    chunks = iter_smoothed_chunks(filepath, chunksize)
+    try:
+        for chunk in chunks:
+            takeoff, runway_ids = takeoff_mask(chunk, runways)
+
+            if takeoff.any():
+                pos = int(np.argmax(takeoff))
+                row = chunk.iloc[pos]
+                utc_timestamp = create_timestamp(
+                    str(row[CSVColumns.LocalDate]),
+                    str(row[CSVColumns.LocalTime]),
+                    str(row[CSVColumns.UTCOffset]),
+                )
+                return utc_timestamp, int(chunk.index[pos]), int(runway_ids[pos])
+
+            # without a takeoff, the runway of the last sample is reported
+            runway_id = int(runway_ids[-1])
+    finally:
+        chunks.close()
+
+    return None, -1, runway_id
@@ -0,0 +1,214 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product, repeat
+from pathlib import Path
+from src.detector import (
+    ALTITUDE_ERROR,
+    ENGINE_SPEED_TAKEOFF_THRESHOLD,
+    GROUND_SPEED_TAKEOFF_THRESHOLD,
+    READ_COLUMNS,
+    SMOOTHED_COLUMNS,
+    SMOOTHING_WINDOW,
+    get_filepaths,
+    parse_airport_code,
+)
+from src.filters import moving_average
+from src.geo_utils import check_runway_engine, get_runway_catalog, load_airport_runways, runway_index
+from src.log_reader import read_log
+from src.utils import CSVColumns
+
+# the default grid, around the detector's constants
+SWEEP_WINDOWS = (1, 3, 5, 9, 15)
+SWEEP_ALTITUDE_ERRORS = (25, 50, 75, 100)
+SWEEP_GROUND_SPEEDS = (15, 20, 25, 30, 35, 40)
+SWEEP_ENGINE_SPEEDS = (1000, 1200, 1500, 1800, 2100)
+
+# the parameters of one combination of the grid, in the order of the result axes
+PARAMETERS = ("window_size", "altitude_error", "ground_speed_threshold", "engine_speed_threshold")
+
+
+class FlightFeatures:
+    """
+    The arrays of a flight the takeoff conditions depend on, computed once for the whole sweep: the raw
+    speed, engine speed and altitude channels, whether each sample is on a runway and the runway id.
+    """
+
+    __slots__ = ("name", "raw", "runway_ids", "elevation")
+
+    def __init__(self, name: str, raw: np.ndarray, runway_ids: np.ndarray, elevation: float):
+        self.name = name
+        self.raw = raw
+        self.runway_ids = runway_ids
+        self.elevation = elevation
+
+    @classmethod
+    def from_file(cls, filepath: Path) -> "FlightFeatures | None":
+        """
+        Read the features of a log, None for a log of an airport without runways
+        """
+        runways = load_airport_runways(parse_airport_code(filepath))
+        if len(runways) == 0:
+            return None
+
+        df = read_log(filepath, READ_COLUMNS)
+        raw = df[SMOOTHED_COLUMNS].to_numpy(dtype=float)
+        runway_ids = runway_index(df[CSVColumns.Latitude].to_numpy(), df[CSVColumns.Longitude].to_numpy(), runways)
+        return cls(filepath.name, raw, runway_ids, runways[0][1])
+
+
+def first_exceeding(values: np.ndarray, mask: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    For every threshold, the index of the first masked sample whose value exceeds it, or len(values).
+
+    The running maximum of the masked values is non-decreasing, so the first sample above each threshold
+    is found by a binary search instead of a scan per threshold. NaN values never exceed a threshold.
+    """
+    running = np.fmax.accumulate(np.where(mask & ~np.isnan(values), values, -np.inf))
+    return np.searchsorted(running, np.asarray(thresholds, dtype=float), side="right")
+
+
+def sweep_flight(
+    features: FlightFeatures,
+    windows: list[int],
+    altitude_errors: list[float],
+    ground_speeds: list[float],
+    engine_speeds: list[float],
+) -> np.ndarray:
+    """
+    Detect the takeoff of a flight for every combination of the parameters, like detect_valid_takeoff_timestamp.
+
+    Returns:
+        takeoff index or -1, an int64 array of shape (windows, altitude errors, ground speeds, engine speeds)
+    """
+    n = len(features.raw)
+    on_runway = features.runway_ids != -1
+    result = np.empty((len(windows), len(altitude_errors), len(ground_speeds), len(engine_speeds)), dtype=np.int64)
+
+    for w, window_size in enumerate(windows):
+        smoothed = moving_average(features.raw, window_size)
+        ground_speed, engine_speed = smoothed[:, 0], smoothed[:, 1]
+        margin = np.abs(smoothed[:, 2] - features.elevation)
+
+        for a, altitude_error in enumerate(altitude_errors):
+            candidates = on_runway & (margin < altitude_error)
+            # the first sample over either threshold is the earlier of the first samples over each one
+            first_speed = first_exceeding(ground_speed, candidates, ground_speeds)
+            first_rpm = first_exceeding(engine_speed, candidates, engine_speeds)
+            result[w, a] = np.minimum(first_speed[:, None], first_rpm[None, :])
+
+    result[result >= n] = -1
+    return result
+
+
+def _sweep_file(filepath: Path, grid: tuple[list, list, list, list]) -> tuple[str, np.ndarray | None, int]:
+    # returns the log name, its sweep result, or None for a log without runways, and its detector baseline
+    features = FlightFeatures.from_file(filepath)
+    if features is None:
+        return filepath.name, None, -1
+    baseline = sweep_flight(
+        features, [SMOOTHING_WINDOW], [ALTITUDE_ERROR], [GROUND_SPEED_TAKEOFF_THRESHOLD], [ENGINE_SPEED_TAKEOFF_THRESHOLD]
+    )
+    return filepath.name, sweep_flight(features, *grid), int(baseline.item())
+
+
+def run_sweep(
+    filepaths: list[Path],
+    windows: list[int] = SWEEP_WINDOWS,
+    altitude_errors: list[float] = SWEEP_ALTITUDE_ERRORS,
+    ground_speeds: list[float] = SWEEP_GROUND_SPEEDS,
+    engine_speeds: list[float] = SWEEP_ENGINE_SPEEDS,
+    jobs: int = 1,
+) -> pd.DataFrame:
+    """
+    Sweep the takeoff detection parameters over every log, reading each log once.
+
+    Returns:
+        one row per log and combination of PARAMETERS, with the takeoff index (-1 without a takeoff), the
+        takeoff index with the detector's constants and the shift between both (NaN when either has no takeoff)
+    """
+    grid = (list(windows), list(altitude_errors), list(ground_speeds), list(engine_speeds))
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs > 1 and len(filepaths) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=get_runway_catalog) as executor:
+            results = list(executor.map(_sweep_file, filepaths, repeat(grid)))
+    else:
+        results = list(map(_sweep_file, filepaths, repeat(grid)))
+
+    combinations = np.array(list(product(*grid)), dtype=float).reshape(-1, len(PARAMETERS))
+    frames = []
+    for name, takeoffs, baseline in results:
+        if takeoffs is None:
+            continue
+        frame = pd.DataFrame(combinations, columns=list(PARAMETERS))
+        frame.insert(0, "name", name)
+        frame["takeoff_idx"] = takeoffs.reshape(-1)
+        frame["baseline_idx"] = baseline
+        frame["shift"] = np.where(
+            (frame["takeoff_idx"] >= 0) & (baseline >= 0), frame["takeoff_idx"] - baseline, np.nan
+        )
+        frames.append(frame)
+
+    if not frames:
+        # no log has runways, e.g. logs of unknown airports
+        frames.append(pd.DataFrame({
+            "name": pd.Series(dtype=object),
+            **{parameter: pd.Series(dtype=float) for parameter in PARAMETERS},
+            "takeoff_idx": pd.Series(dtype=np.int64),
+            "baseline_idx": pd.Series(dtype=np.int64),
+            "shift": pd.Series(dtype=float),
+        }))
+
+    sweep = pd.concat(frames, ignore_index=True)
+    sweep["window_size"] = sweep["window_size"].astype(np.int64)
+    return sweep
+
+
+def summarize_sweep(sweep: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per combination of PARAMETERS: the number of flights with a takeoff, the number of flights whose takeoff
+    differs from the detector's constants, and the mean and largest absolute shift of the takeoff index
+    """
+    changed = sweep["takeoff_idx"] != sweep["baseline_idx"]
+    shift = sweep["shift"].abs()
+    summary = sweep.assign(detected=sweep["takeoff_idx"] >= 0, changed=changed, abs_shift=shift).groupby(
+        list(PARAMETERS), sort=True
+    ).agg(
+        detected=("detected", "sum"),
+        changed=("changed", "sum"),
+        mean_abs_shift=("abs_shift", "mean"),
+        max_abs_shift=("abs_shift", "max"),
+    )
+    return summary.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep the takeoff detection thresholds over every flight log")
+    parser.add_argument("-o", "--output", default="sweep.csv", help="CSV file of the takeoff index per log and combination")
+    parser.add_argument("--data-dir", type=Path, default=None, help="directory of the logs")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes, 0 for all CPUs")
+    parser.add_argument("--windows", type=int, nargs="+", default=SWEEP_WINDOWS, help="smoothing window sizes")
+    parser.add_argument("--altitude-errors", type=float, nargs="+", default=SWEEP_ALTITUDE_ERRORS, help="feet")
+    parser.add_argument("--ground-speeds", type=float, nargs="+", default=SWEEP_GROUND_SPEEDS, help="knots")
+    parser.add_argument("--engine-speeds", type=float, nargs="+", default=SWEEP_ENGINE_SPEEDS, help="rpm")
+    args = parser.parse_args()
+    try:
+        check_runway_engine()
+    except ValueError as e:
+        parser.error(str(e))
+
+    sweep = run_sweep(
+        get_filepaths(args.data_dir), args.windows, args.altitude_errors, args.ground_speeds, args.engine_speeds, args.jobs
+    )
+    sweep.to_csv(args.output, index=False)
+
+    summary = summarize_sweep(sweep)
+    print(summary.sort_values(["changed", "mean_abs_shift"]).to_string(index=False))
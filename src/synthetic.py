@@ -0,0 +1,295 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+from src.geo_utils import get_runway_catalog
+from src.utils import CSVColumns
+
+KNOTS_TO_MPS = 0.514444
+METERS_PER_DEGREE = 111320.0
+
+# the header rows of the logs: units row, then column names. Every field is right aligned to its width,
+# which includes the space following the comma
+UNITS = [
+    "#yyy-mm-dd", "hh:mm:ss", "hh:mm", "ident", "degrees", "degrees", "ft Baro", "inch", "ft msl", "deg C",
+    "kt", "kt", "fpm", "deg", "deg", "G", "G", "deg", "deg", "volts", "volts", "amps", "amps", "gals", "gals",
+    "gph", "deg F", "psi", "Hg", "rpm"] + ["deg F"] * 12 + [
+    "ft wgs", "kt", "enum", "deg", "MHz", "MHz", "MHz", "MHz", "fsd", "fsd", "kt", "deg", "nm", "deg", "deg",
+    "bool", "enum", "enum", "deg", "deg", "fpm", "enum", "mt", "mt", "mt", "mt", "mt",
+]
+WIDTHS = [
+    10, 9, 8, 7, 13, 13, 8, 6, 8, 6, 7, 7, 8, 7, 7, 7, 7, 6, 6, 6, 6, 6, 6, 7, 7, 9, 8, 8, 7, 7, 8, 8, 8, 8, 8,
+    8, 8, 8, 8, 8, 8, 8, 8, 4, 5, 7, 7, 7, 8, 8, 7, 7, 7, 6, 7, 7, 7, 7, 6, 7, 6, 6, 6, 7, 5, 6, 7, 6, 7,
+]
+COLUMNS = [value for name, value in vars(CSVColumns).items() if not name.startswith("_")]
+
+# decimals of the numeric columns, 2 when not listed
+DECIMALS = {
+    CSVColumns.Latitude: 7, CSVColumns.Longitude: 7, CSVColumns.AltB: 1, CSVColumns.AltMSL: 1,
+    CSVColumns.OAT: 1, CSVColumns.HDG: 1, CSVColumns.TRK: 1, CSVColumns.volt1: 1, CSVColumns.volt2: 1,
+    CSVColumns.amp1: 1, CSVColumns.amp2: 1, CSVColumns.E1_RPM: 1, CSVColumns.AltGPS: 1, CSVColumns.TAS: 0,
+    CSVColumns.CRS: 1, CSVColumns.COM1: 3, CSVColumns.COM2: 3, CSVColumns.WndDr: 1, CSVColumns.MagVar: 1,
+    CSVColumns.VSpdG: 1, CSVColumns.HAL: 0,
+}
+# columns the recorder leaves blank in every row of the sample logs
+BLANK_COLUMNS = {
+    CSVColumns.ActiveWaypoint, CSVColumns.HCDI, CSVColumns.VCDI, CSVColumns.WptDst, CSVColumns.WptBrg,
+    CSVColumns.AfcsOn, CSVColumns.RollM, CSVColumns.PitchM, CSVColumns.RollC, CSVColumns.PichC,
+    CSVColumns.VAL, CSVColumns.HPLwas, CSVColumns.HPLfd, CSVColumns.VPLwas,
+}
+# (mean, standard deviation) of the channels that are not simulated
+STEADY_CHANNELS = {
+    CSVColumns.BaroA: (29.92, 0.0), CSVColumns.OAT: (20.0, 0.2), CSVColumns.Pitch: (0.5, 0.3),
+    CSVColumns.Roll: (0.0, 0.5), CSVColumns.LatAc: (0.0, 0.01), CSVColumns.NormAc: (0.0, 0.03),
+    CSVColumns.volt1: (28.0, 0.05), CSVColumns.volt2: (28.0, 0.05), CSVColumns.amp1: (3.0, 0.3),
+    CSVColumns.amp2: (0.5, 0.1), CSVColumns.FQtyL: (35.0, 0.0), CSVColumns.FQtyR: (35.0, 0.0),
+    CSVColumns.E1_OilP: (65.0, 1.0), CSVColumns.CRS: (320.5, 0.0), CSVColumns.NAV1: (114.1, 0.0),
+    CSVColumns.NAV2: (114.1, 0.0), CSVColumns.COM1: (118.6, 0.0), CSVColumns.COM2: (135.275, 0.0),
+    CSVColumns.WndSpd: (8.0, 1.0), CSVColumns.WndDr: (-40.0, 5.0), CSVColumns.MagVar: (13.2, 0.0),
+    CSVColumns.VSpdG: (0.0, 0.0), CSVColumns.HAL: (3704.0, 0.0),
+}
+# channels blanked during a recorder dropout
+DROPOUT_COLUMNS = [
+    CSVColumns.Latitude, CSVColumns.Longitude, CSVColumns.AltMSL, CSVColumns.GndSpd, CSVColumns.TRK,
+    CSVColumns.AltGPS, CSVColumns.E1_RPM, CSVColumns.E1_FFlow,
+]
+
+# the flight profiles of generate_corpus, and how often they appear in the sample logs
+PROFILES = ("takeoff", "ground", "short")
+PROFILE_WEIGHTS = (0.65, 0.25, 0.10)
+
+
+def runway_axis(airport_code: str, runway_id: int = 0) -> tuple[np.ndarray, np.ndarray, float]:
+    """
+    Return the (lat, lon) of both runway ends, the centers of the short sides of the runway polygon,
+    and the airport elevation in feet MSL
+    """
+    polygon, elevation = get_runway_catalog().runways(airport_code)[runway_id]
+    corners = np.array(polygon.minimum_rotated_rectangle.exterior.coords)[:4]
+    sides = np.linalg.norm(corners - np.roll(corners, -1, axis=0), axis=1)
+    short = int(np.argmin(sides[:2]))
+    first = (corners[short] + corners[short + 1]) / 2
+    second = (corners[short + 2] + corners[(short + 3) % 4]) / 2
+    return first[::-1], second[::-1], elevation
+
+
+def _segment(start: np.ndarray, end: np.ndarray, speeds_kt: np.ndarray) -> np.ndarray:
+    # move from start to end in local meters at the given speed per sample, stopping at the end
+    distance = np.cumsum(speeds_kt * KNOTS_TO_MPS)
+    length = max(np.linalg.norm(end - start), 1e-9)
+    fraction = np.clip(distance / length, 0, 1)[:, None]
+    return start + fraction * (end - start)
+
+
+def simulate_flight(
+    airport_code: str, profile: str = "takeoff", duration: int = 1800, runway_id: int = 0, seed: int | None = None
+) -> tuple[dict[str, np.ndarray], int]:
+    """
+    Simulate the 1 Hz sensor channels of a flight from an airport: engine start, taxi to a run-up pad off the
+    runway, run-up, taxi onto the runway, takeoff roll and a climbing, meandering departure.
+
+    Params:
+        airport_code: an airport of the runway catalog
+        profile: "takeoff" for the full flight, "ground" stops after the run-up, "short" is a few samples
+            with the engine off
+        duration: number of samples of the "takeoff" profile
+        runway_id: the departure runway
+        seed: random seed
+
+    Returns:
+        (values per column with NaN for blank cells, index of the first takeoff roll sample or -1)
+    """
+    rng = np.random.default_rng(seed)
+    threshold, far_end, elevation = runway_axis(airport_code, runway_id)
+
+    # local (north, east) meters around the runway threshold, in the (lat, long) order of the coordinates
+    lat0 = np.radians(threshold[0])
+    scale = np.array([METERS_PER_DEGREE, METERS_PER_DEGREE * np.cos(lat0)])
+    runway_end = (far_end - threshold) * scale
+    along = runway_end / np.linalg.norm(runway_end)
+    across = np.array([-along[1], along[0]])
+
+    parking = 300 * along + 200 * across
+    runup_pad = -60 * along + 60 * across
+
+    phases = []  # (positions, ground speed, rpm) of each phase
+
+    def add(positions, speeds, rpm):
+        phases.append((positions, speeds, rpm))
+
+    engine_off = int(rng.integers(20, 60)) if profile != "short" else int(rng.integers(5, 40))
+    add(np.repeat(parking[None], engine_off, 0), np.zeros(engine_off), np.zeros(engine_off))
+
+    takeoff_idx = -1
+    if profile != "short":
+        idle = int(rng.integers(60, 120))
+        add(np.repeat(parking[None], idle, 0), np.zeros(idle), rng.normal(1000, 20, idle))
+
+        speeds = rng.normal(10, 1, 200).clip(0)
+        positions = _segment(parking, runup_pad, speeds)
+        taxi = int(np.argmax(np.all(positions == runup_pad, axis=1))) + 1
+        add(positions[:taxi], speeds[:taxi], rng.normal(1050, 30, taxi))
+
+        runup = int(rng.integers(30, 60))
+        add(np.repeat(runup_pad[None], runup, 0), np.zeros(runup), rng.normal(1800, 25, runup))
+
+    if profile == "takeoff":
+        speeds = rng.normal(6, 0.5, 60).clip(0)
+        positions = _segment(runup_pad, np.zeros(2), speeds)
+        lineup = int(np.argmax(np.all(positions == 0, axis=1))) + 1
+        add(positions[:lineup], speeds[:lineup], rng.normal(1000, 20, lineup))
+
+        takeoff_idx = sum(len(phase[0]) for phase in phases)
+        remaining = max(duration - takeoff_idx, 30)
+        t = np.arange(remaining)
+
+        # accelerate along the runway to 60 kt, then climb out at 90 kt and meander
+        speeds = np.minimum(3 + 2.5 * t, 60) + np.clip(t - 30, 0, 30)
+        heading = np.arctan2(along[1], along[0]) + np.cumsum(np.where(t > 90, rng.normal(0, 0.02, remaining), 0))
+        velocity = np.stack([np.cos(heading), np.sin(heading)], axis=1) * (speeds * KNOTS_TO_MPS)[:, None]
+        add(np.cumsum(velocity, axis=0), speeds, np.minimum(1000 + 400 * t, 2450) + rng.normal(0, 10, remaining))
+
+    positions = np.concatenate([phase[0] for phase in phases])
+    speeds = np.concatenate([phase[1] for phase in phases])
+    rpm = np.concatenate([phase[2] for phase in phases]).clip(0)
+    n = len(positions)
+
+    # climb at 700 fpm once the takeoff speed of 55 kt is reached
+    altitude = elevation + rng.normal(0, 2, n)
+    if takeoff_idx >= 0:
+        liftoff = takeoff_idx + int(np.argmax(speeds[takeoff_idx:] >= 55))
+        climb = np.minimum(np.arange(n - liftoff) * 700 / 60, 4500)
+        altitude[liftoff:] += climb
+
+    lat = threshold[0] + positions[:, 0] / scale[0]
+    lon = threshold[1] + positions[:, 1] / scale[1]
+    track = np.degrees(np.arctan2(np.gradient(positions[:, 1]), np.gradient(positions[:, 0]))) % 360
+    airborne = altitude - elevation > 50
+
+    values = {col: np.full(n, np.nan) for col in COLUMNS}
+    for col, (mean, std) in STEADY_CHANNELS.items():
+        values[col] = mean + (rng.normal(0, std, n) if std > 0 else np.zeros(n))
+    values.update({
+        CSVColumns.Latitude: lat,
+        CSVColumns.Longitude: lon,
+        CSVColumns.AltMSL: altitude,
+        CSVColumns.AltB: altitude + rng.normal(0, 1, n),
+        CSVColumns.AltGPS: altitude - 110 + rng.normal(0, 2, n),
+        CSVColumns.GndSpd: speeds + rng.normal(0, 0.2, n).clip(0) * (speeds > 0),
+        CSVColumns.IAS: np.where(airborne, speeds + 5, np.maximum(speeds - 5, 0)),
+        CSVColumns.TAS: np.where(airborne, speeds + 8, 0).round(),
+        CSVColumns.VSpd: np.gradient(altitude) * 60,
+        CSVColumns.HDG: track,
+        CSVColumns.TRK: np.where(speeds > 1, track, np.nan),
+        CSVColumns.E1_RPM: rpm,
+        CSVColumns.E1_MAP: np.where(rpm > 0, 12 + rpm / 200, 29.9),
+        CSVColumns.E1_FFlow: rpm / 170,
+        CSVColumns.E1_OilT: 80 + np.cumsum(rpm > 0) / n * 100,
+    })
+    for cylinder in range(1, 7):
+        values[getattr(CSVColumns, f"E1_CHT{cylinder}")] = 110 + rpm / 10 + rng.normal(0, 1, n)
+        values[getattr(CSVColumns, f"E1_EGT{cylinder}")] = 300 + rpm / 2.2 + rng.normal(0, 3, n)
+
+    return values, takeoff_idx
+
+
+def format_log(values: dict[str, np.ndarray], start: datetime, utc_offset: str = "-07:00") -> str:
+    """
+    Format simulated channels in the padded CSV format of the recorder, one row per second from start
+    """
+    n = len(values[CSVColumns.Latitude])
+    times = [start + timedelta(seconds=idx) for idx in range(n)]
+
+    fields = [
+        [t.strftime("%Y-%m-%d") for t in times],
+        [t.strftime("%H:%M:%S") for t in times],
+        [utc_offset] * n,
+    ]
+    for col in COLUMNS[3:]:
+        if col in BLANK_COLUMNS:
+            fields.append([""] * n)
+        elif col == CSVColumns.HSIS:
+            fields.append(["GPS"] * n)
+        elif col == CSVColumns.GPSfix:
+            fields.append(["3D"] * n)
+        else:
+            fmt = f"{{:.{DECIMALS.get(col, 2)}f}}".format
+            fields.append(["" if np.isnan(value) else fmt(value) for value in values[col].tolist()])
+
+    padded = [[value.rjust(width) for value in column] for column, width in zip(fields, WIDTHS)]
+    lines = [
+        ",".join(unit.rjust(width) for unit, width in zip(UNITS, WIDTHS)),
+        ",".join(col.rjust(width) for col, width in zip(COLUMNS, WIDTHS)),
+    ]
+    lines.extend(",".join(row) for row in zip(*padded))
+    return "\n".join(lines) + "\n"
+
+
+def inject_dropouts(values: dict[str, np.ndarray], rate: float, seed: int | None = None, max_length: int = 8):
+    """
+    Blank the DROPOUT_COLUMNS of random spans of samples in place, rate is the fraction of samples starting a span
+    """
+    rng = np.random.default_rng(seed)
+    n = len(values[CSVColumns.Latitude])
+    starts = np.flatnonzero(rng.random(n) < rate)
+    for start in starts:
+        span = slice(start, start + int(rng.integers(1, max_length + 1)))
+        for col in DROPOUT_COLUMNS:
+            values[col][span] = np.nan
+
+
+def write_synthetic_log(
+    directory: Path,
+    airport_code: str = "KPAO",
+    profile: str = "takeoff",
+    duration: int = 1800,
+    start: datetime = datetime(2020, 11, 1, 10, 0, 0),
+    dropout_rate: float = 0.002,
+    seed: int | None = None,
+) -> tuple[Path, int]:
+    """
+    Write a synthetic log named like the recorder's logs, see simulate_flight.
+
+    Returns:
+        (path of the log, index of the first takeoff roll sample or -1)
+    """
+    rng = np.random.default_rng(seed)
+    runway_id = int(rng.integers(len(get_runway_catalog().runways(airport_code))))
+    values, takeoff_idx = simulate_flight(airport_code, profile, duration, runway_id, seed)
+    inject_dropouts(values, dropout_rate, seed)
+
+    filepath = Path(directory) / f"log_{start:%y%m%d_%H%M%S}_{airport_code}.csv"
+    filepath.write_text(format_log(values, start))
+    return filepath, takeoff_idx
+
+
+def generate_corpus(
+    directory: Path, count: int, airports: tuple[str, ...] = ("KPAO", "KSBA"), seed: int = 0, jobs: int = 1
+) -> list[Path]:
+    """
+    Write count synthetic logs, mixing the PROFILES and flight durations of the sample logs.
+    The corpus only depends on the seed, not on the number of worker processes.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    tasks = []
+    start = datetime(2020, 9, 1, 8, 0, 0)
+    for idx in range(count):
+        profile = str(rng.choice(PROFILES, p=PROFILE_WEIGHTS))
+        duration = int(rng.integers(1500, 7000))
+        tasks.append((directory, airports[idx % len(airports)], profile, duration, start, 0.002, seed + idx))
+        start += timedelta(hours=int(rng.integers(2, 30)), seconds=int(rng.integers(0, 3600)))
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(write_synthetic_log, *zip(*tasks)))
+    else:
+        results = [write_synthetic_log(*task) for task in tasks]
+
+    return [filepath for filepath, _ in results]
@@ -1,12 +1,16 @@
-from datetime import datetime, timedelta
-from matplotlib import pyplot as plt
+from datetime import datetime, timezone
 import numpy as np
 import pandas as pd
 from shapely.geometry import Polygon, shape
+from src.filters import exponential_filter
 
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 OFFSET_FORMAT = "%z"
 
+# column added by read_data holding the UTC epoch seconds of each sample
+TIMESTAMP_COLUMN = "Timestamp"
+MISSING_TIMESTAMP = np.iinfo(np.int64).min
+
 
 class CSVColumns:
     LocalDate = "Lcl Date"
@@ -81,14 +85,73 @@ class CSVColumns:
 
 
 def create_timestamp(date: str, time: str, utc_offset: str) -> float:
-    offset_dt = datetime.strptime(utc_offset, OFFSET_FORMAT)
+    # the local time is ahead of UTC by the offset, i.e. UTC = local time - offset
+    offset = datetime.strptime(utc_offset, OFFSET_FORMAT).utcoffset()
     timestamp = datetime.strptime(f"{date} {time}", DATETIME_FORMAT)
 
-    utc_timestamp = timestamp + timedelta(offset_dt.hour, offset_dt.minute)
+    utc_timestamp = (timestamp - offset).replace(tzinfo=timezone.utc)
 
     return utc_timestamp.timestamp()
 
 
+def create_timestamps(dates: pd.Series, times: pd.Series, utc_offsets: pd.Series) -> np.ndarray:
+    """
+    Vectorized create_timestamp over whole columns.
+
+    Params:
+        dates: local dates, formatted as yyyy-mm-dd
+        times: local times, formatted as hh:mm:ss
+        utc_offsets: offsets of the local time from UTC, formatted as +hh:mm or -hh:mm
+
+    Returns:
+        int64 array of UTC epoch seconds, MISSING_TIMESTAMP where any field is missing or malformed
+    """
+    local = pd.to_datetime(
+        dates.astype(object) + " " + times.astype(object), format=DATETIME_FORMAT, errors="coerce"
+    )
+
+    # there are only a few distinct offsets in a flight, parse each once
+    codes, unique_offsets = pd.factorize(utc_offsets)
+    offset_seconds = np.array([_parse_offset_seconds(offset) for offset in unique_offsets] + [np.nan])
+
+    seconds = local.to_numpy(dtype="datetime64[s]").astype(np.float64)
+    seconds[local.isna().to_numpy()] = np.nan
+    seconds -= offset_seconds[codes]
+
+    timestamps = np.full(len(seconds), MISSING_TIMESTAMP, dtype=np.int64)
+    valid = ~np.isnan(seconds)
+    timestamps[valid] = seconds[valid]
+    return timestamps
+
+
+def _parse_offset_seconds(utc_offset: str) -> float:
+    try:
+        offset = datetime.strptime(str(utc_offset), OFFSET_FORMAT).utcoffset()
+    except ValueError:
+        return np.nan
+    return offset.total_seconds() if offset is not None else np.nan
+
+
+def timestamp_to_index(timestamps: np.ndarray, timestamp: float) -> int:
+    """
+    Find the first sample with the given UTC timestamp with a binary search of the time axis.
+
+    The axis is expected to be sorted, which holds for the logs' UTC time. An axis broken by missing or
+    out of order timestamps falls back to a linear search, where a binary search could land on a later
+    duplicate of the timestamp.
+
+    Returns:
+        index of the first matching sample, or -1
+    """
+    timestamps = np.asarray(timestamps)
+    if len(timestamps) < 2 or (timestamps[1:] >= timestamps[:-1]).all():
+        idx = int(np.searchsorted(timestamps, timestamp, side="left"))
+        return idx if idx < len(timestamps) and timestamps[idx] == timestamp else -1
+
+    matches = np.flatnonzero(timestamps == timestamp)
+    return int(matches[0]) if len(matches) > 0 else -1
+
+
 def low_pass_filter(arr: np.ndarray, alpha: float) -> np.ndarray:
     """
     This is a simple discrete-time realization of a low-pass filter.
@@ -101,12 +164,7 @@ def low_pass_filter(arr: np.ndarray, alpha: float) -> np.ndarray:
     Returns:
         Smoothed array
     """
-    smoothed = np.zeros_like(arr)
-    smoothed[0] = (1 - alpha) * arr[0]
-    for i in range(1, arr.shape[0]):
-        smoothed[i] = alpha * smoothed[i - 1] + (1 - alpha) * arr[i]
-
-    return smoothed
+    return exponential_filter(arr, alpha)
 
 
 def moving_average_filter(arr: np.ndarray, window_size: int) -> np.ndarray:
@@ -126,6 +184,9 @@ def moving_average_filter(arr: np.ndarray, window_size: int) -> np.ndarray:
 
 
 def plot_flight(df: pd.DataFrame, runways: list, filename: str):
+    # matplotlib is only loaded to plot, not on the detection path
+    from matplotlib import pyplot as plt
+
     fig, ax = plt.subplots()
 
     # Show runway outlines
@@ -142,6 +203,10 @@ def plot_flight(df: pd.DataFrame, runways: list, filename: str):
     plt.savefig(filename, format="png")
 
 class SpikeDetect:
+    """
+    Scalar spike detector fed one sample at a time. events.detect_edges finds every spike of whole
+    signals, and events.first_spike returns the same indices as this class.
+    """
 
     def __init__(self):
         self._rise_idx = -1
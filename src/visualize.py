@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 from src.utils import (
     CSVColumns
@@ -7,27 +8,58 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import matplotlib.lines as mlines
-from src.detector import read_data
-from src.geo_utils import get_points_near
+from src.detector import DATA_DIR, parse_airport_code, read_data
+from src.decimate import decimate
+from src.geo_utils import points_near
+from src.runway_map import draw_runway_map
 import os
-import io
-import requests
-import urllib.parse
-import urllib.request
-from PIL import Image as image_open
-from shapely import Polygon, Point
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from shapely import Polygon
 from datetime import datetime
-from IPython.display import Image, display
 
-def plot_charts(name: str, df: pd.DataFrame, takeoff_ind: int, runway: tuple[Polygon, float]|None, save_func=lambda fig, name: fig.savefig(f"plots/plot_{name}.png",  bbox_inches='tight')):
+# the samples of each series drawn by plot_charts when decimating, a few per pixel of the chart width
+DEFAULT_MAX_POINTS = 2000
+# the samples of the flight path drawn on the runway image after the takeoff
+FLIGHT_PATH_SAMPLES_AFTER_TAKEOFF = 200
+
+
+def save_chart(fig, name: str):
+    fig.savefig(f"plots/plot_{name}.png",  bbox_inches='tight')
+
+
+def plot_charts(
+    name: str,
+    df: pd.DataFrame,
+    takeoff_ind: int,
+    runway: tuple[Polygon, float]|None,
+    save_func=save_chart,
+    max_points: int|None=None,
+    runways: list[tuple[Polygon, float]]|None=None,
+    imagery: bool=False,
+):
+    """
+    Plot the ground speed, engine RPM and altitude of a flight and its path over the runway.
+
+    Params:
+        max_points: downsample each series to this many samples with LTTB, always keeping the takeoff
+            sample, None plots every sample
+        runways: all runways of the airport drawn around the takeoff runway, defaults to the takeoff runway
+        imagery: draw the runways over the airport's static map, fetched once per airport and cached on disk,
+            see runway_map.draw_runway_map. The runways are drawn offline otherwise.
+    """
 
     # Iterate through each row in the DataFrame
     # Create a new figure for each row
     fig, axes = plt.subplots(nrows=2, ncols=2, figsize=(12, 8))  # 2x2 grid of plots
     axes = axes.flatten()  # Flatten the axes array to make it easier to iterate over
 
+    index = df.index.to_numpy()
+    keep = [takeoff_ind] if takeoff_ind != -1 else []
+
     # Plot Ground Speed for this specific row
-    axes[0].plot(df.index, df[CSVColumns.GndSpd], label="Ground Speed (Knots)")
+    axes[0].plot(*decimate(index, df[CSVColumns.GndSpd], max_points, keep), label="Ground Speed (Knots)")
     axes[0].set_title(f"Ground Speed Over Time")
     axes[0].set_xlabel("Time (Index)")
     axes[0].set_ylabel("Ground Speed (Knots)")
@@ -38,7 +70,7 @@ def plot_charts(name: str, df: pd.DataFrame, takeoff_ind: int, runway: tuple[Pol
 
 
     # Plot Engine RPM for this specific row
-    axes[1].plot(df.index, df[CSVColumns.E1_RPM], label="Engine RPM", color="orange")
+    axes[1].plot(*decimate(index, df[CSVColumns.E1_RPM], max_points, keep), label="Engine RPM", color="orange")
     axes[1].set_title(f"Engine RPM Over Time")
     axes[1].set_xlabel("Time (Index)")
     axes[1].set_ylabel("Engine RPM")
@@ -48,7 +80,7 @@ def plot_charts(name: str, df: pd.DataFrame, takeoff_ind: int, runway: tuple[Pol
     axes[1].legend(loc='upper right')  # Explicitly set the legend location
 
     # Plot Altitude for this specific row
-    axes[2].plot(df.index, df[CSVColumns.AltMSL], label="Altitude (ft)", color="green")
+    axes[2].plot(*decimate(index, df[CSVColumns.AltMSL], max_points, keep), label="Altitude (ft)", color="green")
     axes[2].set_title(f"Altitude Over Time")
     axes[2].set_xlabel("Time (Index)")
     axes[2].set_ylabel("Altitude (ft)")
@@ -59,37 +91,34 @@ def plot_charts(name: str, df: pd.DataFrame, takeoff_ind: int, runway: tuple[Pol
 
     if runway:
 
-        marker_data = None
+        if runways is None:
+            runways = [runway]
+        takeoff_runway = next((runway_id for runway_id, r in enumerate(runways) if r is runway), -1)
+
+        takeoff = None
         if takeoff_ind != -1:
-            marker_data = {
-                'location': f"{df[CSVColumns.Latitude][takeoff_ind]},{df[CSVColumns.Longitude][takeoff_ind]}",
-                'color': "0xFF00FF",
-                'label': ''
-            }
+            takeoff = (df[CSVColumns.Latitude][takeoff_ind], df[CSVColumns.Longitude][takeoff_ind])
 
         # Plot the flight, zooming into the runway
         runway_poly = runway[0]
         centroid = runway_poly.centroid
-        gps_points = list(map(lambda x: Point(x[1], x[0]), zip(df[CSVColumns.Latitude], df[CSVColumns.Longitude])))[:takeoff_ind+200]
-        points_near_centroid = get_points_near(centroid, 0.015, gps_points)[::5]
-
-        flight_path_config = {
-            "color": "0xFF00FF80",
-            "points": points_near_centroid
-        }
-
-        url = generate_static_map_url(centroid.y, centroid.x, poly=[flight_path_config], marker_config=marker_data)
-
-        # Open the URL and read the image
-        with urllib.request.urlopen(url) as response:
-            img_data = response.read()
-
-        # Convert the response data to a Pillow Image
-        img = image_open.open(io.BytesIO(img_data))
-
-        axes[3].imshow(img)
+        # only the path up to shortly after the takeoff is drawn
+        path_end = takeoff_ind + FLIGHT_PATH_SAMPLES_AFTER_TAKEOFF
+        lat = df[CSVColumns.Latitude].to_numpy()[:path_end]
+        lng = df[CSVColumns.Longitude].to_numpy()[:path_end]
+        near_centroid = points_near(lat, lng, centroid.y, centroid.x, 0.015)[::5]
+
+        draw_runway_map(
+            axes[3],
+            parse_airport_code(Path(name)),
+            runways,
+            lat[near_centroid],
+            lng[near_centroid],
+            takeoff,
+            takeoff_runway,
+            imagery=imagery,
+        )
         axes[3].set_title("Runway")
-        axes[3].axis('off')
 
         # --- Add Legend to Subplot ---
         legend_patch = mpatches.Patch(color="magenta", label="flight path") # Create patch for THIS subplot
@@ -105,49 +134,81 @@ def plot_charts(name: str, df: pd.DataFrame, takeoff_ind: int, runway: tuple[Pol
 
     plt.close(fig)  # Close the figure to avoid display in the notebook
 
-def generate_static_map_url(center_lat, center_lng, zoom=15, size="600x400", map_type="satellite", poly:list[dict]|None=None, marker_config=None):
-    base_url = "https://maps.googleapis.com/maps/api/staticmap"
-    params = [
-        ("center", f"{center_lat},{center_lng}"),
-        ("zoom", zoom),
-        ("size", size),
-        ("maptype", map_type),
-        ("key", os.getenv('GOOGLE_MAPS_API_KEY'))
-    ]
-
-    if marker_config and marker_config['location']:
-        marker_style = f"color:{marker_config['color']}|size:3|label:{marker_config['label']}|"
-        params.append(('markers', marker_style + marker_config['location']))
-
-    query_string = urllib.parse.urlencode(
-        params,
-        safe="|:,",  # Do not URL-encode these characters
-        quote_via=urllib.parse.quote
-    )
-
-    if poly:
-        for pline in poly:
-            color = pline['color']
-            points = pline['points']
-            polyl = f"color:{color}|weight:3|" + "|".join(list(map(lambda p: f"{p.y},{p.x}", points)))
-            query_string += f"&path={polyl}"
-
-
-    return f"{base_url}?{query_string}"
-
 def display_static_map(url, size="400x400"):
+    # notebook helper, its dependencies are only needed to display the map
+    import requests
+    from IPython.display import Image, display
+
     response = requests.get(url)
     if response.status_code == 200:
         display(Image(data=response.content, embed=True, format='png', width=int(size.split('x')[0]), height=int(size.split('x')[1])))
     else:
         print(f"Failed to retrieve the static map. Status code: {response.status_code}")
 
-if __name__ == "__main__":
-    output_file_path = "output.txt"
+def _use_agg_backend():
+    # render off screen, the charts are only written to files
+    plt.switch_backend("Agg")
+
+
+def _render_chart_safe(name: str, runway_id: int, takeoff_ind: int, data_dir: Path, max_points: int|None, imagery: bool) -> str|None:
+    # returns the error message if the chart failed
+    try:
+        takeoff_df, runways = read_data(data_dir / name)
+        runway = runways[runway_id] if 0 <= runway_id < len(runways) else None
+        plot_charts(name, takeoff_df, takeoff_ind, runway, max_points=max_points, runways=runways, imagery=imagery)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def render_charts(
+    output_file_path: str, data_dir: Path = DATA_DIR, jobs: int = 1, max_points: int|None = DEFAULT_MAX_POINTS, imagery: bool = False
+) -> list[tuple[str, str]]:
+    """
+    Render the charts of every log listed in a detector output file to the plots directory, on the Agg backend.
+
+    Params:
+        output_file_path: detector output, one "name, runway id, timestamp, takeoff index" line per log
+        jobs: number of worker processes, 0 to use all CPUs
+        max_points, imagery: see plot_charts
+
+    Returns:
+        (file name, error message) of every chart that failed
+    """
+    results = pd.read_csv(output_file_path, header=None, skipinitialspace=True, names=["name", "runway", "timestamp", "takeoff"])
+    names = results["name"].tolist()
+    Path("plots").mkdir(exist_ok=True)
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    args = (names, results["runway"].astype(int).tolist(), results["takeoff"].astype(int).tolist(), repeat(Path(data_dir)), repeat(max_points), repeat(imagery))
+    if jobs > 1 and len(names) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_use_agg_backend) as executor:
+            errors = list(executor.map(_render_chart_safe, *args))
+    else:
+        _use_agg_backend()
+        errors = list(map(_render_chart_safe, *args))
 
-    df = pd.read_csv(output_file_path, header=None)
-    for (row_idx, row) in df.iterrows():
-        takeoff_df, runways = read_data(Path(f"data/cessna_182t/{row[0]}"))
+    failures = [(name, error) for name, error in zip(names, errors) if error is not None]
+    for name, error in failures:
+        print(f"Failed {name}: {error}", file=sys.stderr)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot the flight data and takeoff of every log of a detector output file")
+    parser.add_argument("output_file_path", nargs="?", default="output.txt")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes, 0 for all CPUs")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="directory of the logs")
+    parser.add_argument(
+        "--max-points", type=int, default=DEFAULT_MAX_POINTS,
+        help="samples plotted per series, 0 to plot every sample",
+    )
+    parser.add_argument(
+        "--imagery", action="store_true",
+        help="draw the runways over static map imagery, downloaded once per airport (needs GOOGLE_MAPS_API_KEY)",
+    )
+    args = parser.parse_args()
 
-        takeoff_ind = row[2]
-        plot_charts(row[0], takeoff_df, runways[row[1]], takeoff_ind)
+    render_charts(args.output_file_path, args.data_dir, args.jobs, args.max_points or None, args.imagery)
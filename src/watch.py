@@ -0,0 +1,232 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable
+from src.detector import DATA_DIR, DETECTION_MODES, _init_worker, _process_file_safe, check_detection_options
+from src.geo_utils import check_runway_engine
+from src.results import RESULT_FORMATS, ResultWriter, format_result, make_result
+
+# seconds between two scans of the watched directory
+POLL_INTERVAL = float(os.getenv("SENSOR_DATA_WATCH_INTERVAL", "1.0"))
+# a log is complete once it has not been modified for this many seconds
+SETTLE_TIME = float(os.getenv("SENSOR_DATA_WATCH_SETTLE", "2.0"))
+# at most this many complete logs wait for a worker, the directory is not scanned while the queue is full
+QUEUE_SIZE = 64
+# the state of the watch is kept next to its output file, in the file named after the output with this suffix
+STATE_SUFFIX = ".watch.json"
+
+
+class FolderWatcher:
+    """
+    Poll a directory for the logs that are new or changed and no longer being written.
+    """
+
+    def __init__(self, data_dir: Path, settle: float = SETTLE_TIME, processed: dict[str, tuple[int, int]] | None = None):
+        """
+        Params:
+            data_dir: the watched directory
+            settle: seconds without a modification after which a log is complete
+            processed: (size, modification time in nanoseconds) of the logs already processed, they are only
+                processed again once they change
+        """
+        self.data_dir = Path(data_dir)
+        self.settle = settle
+        # (size, modification time) of every log at the last scan, and of the logs when they were handed out
+        self._seen: dict[str, tuple[int, int]] = {}
+        self._done: dict[str, tuple[int, int]] = dict(processed or {})
+
+    def signature(self, name: str) -> tuple[int, int]:
+        """
+        (size, modification time in nanoseconds) of a log when it was last handed out by poll
+        """
+        return self._done[name]
+
+    def poll(self) -> list[Path]:
+        """
+        Scan the directory once and return the logs that became complete since the last scan, in name order.
+
+        A log is complete when its size and modification time did not change since the previous scan and it
+        was not modified for settle seconds.
+        """
+        now = time.time_ns()
+        seen = {}
+        ready = []
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".csv") or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # renamed or removed since the directory was listed
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                seen[entry.name] = signature
+
+                done = self._done.get(entry.name)
+                if done == signature or self._seen.get(entry.name) != signature:
+                    continue
+                if stat.st_size > 0 and now - stat.st_mtime_ns >= self.settle * 1e9:
+                    self._done[entry.name] = signature
+                    ready.append(Path(entry.path))
+
+        self._seen = seen
+        return sorted(ready)
+
+
+def state_path(output_file_path: str | Path) -> Path:
+    return Path(str(output_file_path) + STATE_SUFFIX)
+
+
+def read_state(path: Path) -> dict[str, tuple[int, int]]:
+    """
+    (size, modification time in nanoseconds) of every log processed without error, see write_state
+    """
+    try:
+        with open(path) as f:
+            return {name: tuple(signature) for name, signature in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+
+
+def write_state(path: Path, state: dict[str, tuple[int, int]]):
+    # replaced atomically, so a stopped service leaves either state
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+async def watch(
+    data_dir: Path,
+    output_file_path: str,
+    jobs: int = 1,
+    mode: str = "vectorized",
+    output_format: str | None = None,
+    interval: float = POLL_INTERVAL,
+    settle: float = SETTLE_TIME,
+    queue_size: int = QUEUE_SIZE,
+    stop: asyncio.Event | None = None,
+    on_result: Callable[[dict], None] | None = None,
+) -> int:
+    """
+    Detect the takeoff of every log landing in a directory until stop is set, appending every result to the
+    output file as soon as the log is processed, see results.ResultWriter.
+
+    The size and modification time of every log processed without error are kept in the state file next to
+    the output, see state_path. These logs are skipped unless they changed, the failed logs are retried, and the
+    other logs of the directory are processed first, including logs of the output without a state. The directory is scanned every interval seconds, the complete logs are queued and processed by jobs
+    worker processes. Once stop is set, the queued logs are processed before returning. A log failing, even by
+    crashing its worker process, is written as failed and the service goes on. On return the output file is
+    rewritten with one line per log, in name order.
+
+    Params:
+        on_result: called with every result, see results.make_result
+
+    Returns:
+        the number of logs processed
+    """
+    check_runway_engine()
+    check_detection_options(mode)
+    stop = stop or asyncio.Event()
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    writer = ResultWriter(output_file_path, output_format, resume=True)
+    state_file_path = state_path(output_file_path)
+    state = read_state(state_file_path)
+    watcher = FolderWatcher(data_dir, settle, state)
+    queue: asyncio.Queue[Path | None] = asyncio.Queue(maxsize=queue_size)
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker)
+    processed = 0
+
+    async def scan():
+        while not stop.is_set():
+            for fp in await asyncio.to_thread(watcher.poll):
+                await queue.put(fp)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+        for _ in range(jobs):
+            await queue.put(None)
+
+    async def work():
+        nonlocal executor, processed
+        while (fp := await queue.get()) is not None:
+            pool = executor
+            try:
+                result, _, _ = await loop.run_in_executor(pool, _process_file_safe, fp, mode, False)
+            except Exception as e:
+                result = make_result(fp.name, None, -1, -1, error=f"{type(e).__name__}: {e}")
+                if isinstance(e, BrokenProcessPool) and executor is pool:
+                    # a worker died, e.g. killed for memory, the other workers share the new pool
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker)
+            writer.write(result)
+            if result["error"] is None:
+                state[fp.name] = watcher.signature(fp.name)
+            else:
+                state.pop(fp.name, None)
+            write_state(state_file_path, state)
+            processed += 1
+            if result["error"] is not None:
+                print(f"Failed {fp.name}: {result['error']}", file=sys.stderr)
+            print(format_result(result, "text"), end="", flush=True)
+            if on_result is not None:
+                on_result(result)
+
+    try:
+        await asyncio.gather(scan(), *(work() for _ in range(jobs)))
+        writer.finish(sorted(writer.results))
+    finally:
+        executor.shutdown(cancel_futures=True)
+        writer.close()
+
+    return processed
+
+
+async def _serve(args: argparse.Namespace):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Watching {args.data_dir}", file=sys.stderr)
+    await watch(
+        args.data_dir, args.output_file_path, args.jobs, args.mode, args.format, args.interval, args.settle, stop=stop
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect the takeoff of every flight log written to a directory")
+    parser.add_argument("output_file_path", nargs="?", default="output.txt")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="the watched directory")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes, 0 for all CPUs")
+    parser.add_argument("--mode", choices=DETECTION_MODES, default="vectorized")
+    parser.add_argument("--format", choices=RESULT_FORMATS, default=None, help="format of the output file")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between two directory scans")
+    parser.add_argument("--settle", type=float, default=SETTLE_TIME, help="seconds without writes before a log is read")
+    args = parser.parse_args()
+    try:
+        check_runway_engine()
+        check_detection_options(args.mode)
+    except ValueError as e:
+        parser.error(str(e))
+
+    asyncio.run(_serve(args))
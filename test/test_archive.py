@@ -0,0 +1,58 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.archive import FleetArchive, build_archive
+from src.log_reader import read_log
+from src.utils import CSVColumns
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_fleet_archive(tmp_path, capsys):
+    filepaths = [DATA_DIR / name for name in TEST_FILES]
+    archive = build_archive(filepaths, tmp_path / "archive")
+    assert archive.flights == TEST_FILES
+    assert archive.offsets[-1] == archive.samples
+
+    for idx, fp in enumerate(filepaths):
+        df = read_log(fp)
+        rpm = archive.flight(idx, CSVColumns.E1_RPM)
+        assert isinstance(rpm, np.memmap)
+        assert np.array_equal(rpm, df[CSVColumns.E1_RPM].to_numpy(dtype=np.float32), equal_nan=True)
+        assert np.array_equal(archive.flight(idx, CSVColumns.Latitude), df[CSVColumns.Latitude].to_numpy(), equal_nan=True)
+        assert list(archive.decode(CSVColumns.GPSfix, archive.flight(idx, CSVColumns.GPSfix))) == \
+            [None if pd.isna(value) else value.strip() for value in df[CSVColumns.GPSfix]]
+
+    stats = archive.flight_stats(CSVColumns.GndSpd, archive.select("KSBA"))
+    assert stats["flight"].tolist() == TEST_FILES[1:3]
+    expected = [read_log(DATA_DIR / name)[CSVColumns.GndSpd].astype(np.float32) for name in TEST_FILES[1:3]]
+    assert stats["count"].tolist() == [values.count() for values in expected]
+    assert np.allclose(stats["max"], [values.max() for values in expected])
+    assert np.allclose(stats["mean"], [values.astype(float).mean() for values in expected])
+    assert archive.select(start=datetime(2020, 10, 1)).tolist() == [1, 2]
+
+    # an unreadable or malformed log is skipped
+    malformed = tmp_path / "log_200101_000000_KPAO.csv"
+    malformed.write_text("not a flight log\n")
+    archive = build_archive([malformed, filepaths[0], tmp_path / "log_missing_KPAO.csv", filepaths[1]], tmp_path / "archive")
+    assert archive.flights == TEST_FILES[:2] and archive.offsets[-1] == archive.samples
+    assert [line.split(":")[0] for line in capsys.readouterr().err.splitlines()] == [f"Skipped {malformed.name}", "Skipped log_missing_KPAO.csv"]
+    assert np.array_equal(archive.flight(1, CSVColumns.E1_RPM), read_log(filepaths[1])[CSVColumns.E1_RPM].to_numpy(dtype=np.float32), equal_nan=True)
+
+    # a rebuild replaces the archive
+    build_archive(filepaths[:1], tmp_path / "archive")
+    assert FleetArchive(tmp_path / "archive").flights == TEST_FILES[:1]
+
@@ -0,0 +1,38 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import subprocess
+import sys
+from pathlib import Path
+from src import detector
+from src.__main__ import main as cli_main
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_cli_detect(capsys):
+    assert cli_main(["detect", str(DATA_DIR / TEST_FILES[0]), str(DATA_DIR / TEST_FILES[2])]) == 0
+    expected = [detector.process_file(DATA_DIR / name) for name in (TEST_FILES[0], TEST_FILES[2])]
+    assert capsys.readouterr().out.splitlines() == [
+        f"{name}, {runway_id}, {ts}, {idx}" for name, (ts, idx, runway_id) in zip((TEST_FILES[0], TEST_FILES[2]), expected)
+    ]
+    assert cli_main(["detect", str(DATA_DIR / "log_missing_KPAO.csv")]) == 1
+
+    for mode in detector.DETECTION_MODES:
+        assert cli_main(["detect", "--mode", mode, str(DATA_DIR / TEST_FILES[0])]) == 0
+
+
+def test_detection_does_not_import_matplotlib():
+    code = "import sys, src.detector, src.results; print('matplotlib' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=Path(__file__).parent.parent)
+    assert output.stdout.strip() == "False"
+
@@ -0,0 +1,85 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import json
+from pathlib import Path
+import numpy as np
+import pytest
+from src import detector
+from src.detector import read_data, read_flight, detect_valid_takeoff_timestamp
+from src.utils import TIMESTAMP_COLUMN
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_repaired_detection_matches(monkeypatch):
+    for name in TEST_FILES:
+        flight = read_flight(DATA_DIR / name, repair=True)
+        assert (np.diff(flight[TIMESTAMP_COLUMN]) == 1).all()
+        assert detect_valid_takeoff_timestamp(flight) == detector.process_file(DATA_DIR / name)
+
+    # a takeoff in an interpolated dropout is reported as the row after it, with the timestamp of that row
+    name = "log_201010_150447_KPAO.csv"
+    timestamp, takeoff_idx, _ = detect_valid_takeoff_timestamp(read_flight(DATA_DIR / name, repair=True))
+    assert (timestamp, takeoff_idx) == (1602368425, 933)
+    df, _ = read_data(DATA_DIR / name)
+    assert df[TIMESTAMP_COLUMN].iloc[takeoff_idx] == timestamp
+
+    df, runways = read_data(DATA_DIR / TEST_FILES[0], repair=True)
+    with pytest.raises(ValueError):
+        detect_valid_takeoff_timestamp(df, runways, "reference")
+
+    # the streaming reader and the reference mode read the logs as recorded, the repair is rejected
+    for mode, stream in (("vectorized", True), ("reference", False)):
+        with pytest.raises(ValueError):
+            detector.check_detection_options(mode, stream, repair=True)
+    detector.check_detection_options("vectorized", False, repair=True)
+    monkeypatch.setattr(detector, "REPAIR_GAPS", True)
+    with pytest.raises(ValueError):
+        detector.process_file(DATA_DIR / TEST_FILES[0], stream=True)
+
+
+def test_vectorized_matches_reference():
+    for filename in TEST_FILES:
+        df, runways = read_data(DATA_DIR / filename)
+        assert detect_valid_takeoff_timestamp(df, runways, mode="vectorized") == \
+            detect_valid_takeoff_timestamp(df, runways, mode="reference")
+
+
+def test_main_reports_failures(tmp_path, monkeypatch):
+    filepaths = [DATA_DIR / "log_200927_082601_KPAO.csv", tmp_path / "log_missing_KPAO.csv", DATA_DIR / TEST_FILES[0]]
+    monkeypatch.setattr(detector, "get_filepaths", lambda data_dir=None: filepaths)
+
+    output_file_path = tmp_path / "output.txt"
+    failures = detector.main(str(output_file_path), jobs=2)
+
+    assert [name for name, _ in failures] == ["log_missing_KPAO.csv"]
+    lines = output_file_path.read_text().splitlines()
+    assert [line.split(",")[0] for line in lines] == [fp.name for fp in filepaths]
+    assert lines[1] == "log_missing_KPAO.csv, -1, None, -1"
+
+
+def test_main_metrics(tmp_path, monkeypatch):
+    filepaths = [DATA_DIR / TEST_FILES[0], tmp_path / "log_missing_KPAO.csv"]
+    monkeypatch.setattr(detector, "get_filepaths", lambda data_dir=None: filepaths)
+
+    metrics_path = tmp_path / "metrics.jsonl"
+    detector.main(str(tmp_path / "output.txt"), metrics_path=str(metrics_path), trace_memory=True)
+
+    records = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+    assert [record["file"] for record in records] == [fp.name for fp in filepaths]
+    stages = {s["stage"]: s for s in records[0]["stages"]}
+    assert {"smooth", "timestamps", "load_runways", "runway_lookup"} <= stages.keys()
+    assert stages["smooth"]["rows"] == records[0]["rows"] > 0
+    assert 0 < stages["smooth"]["peak_bytes"] <= records[0]["peak_bytes"]
+    assert records[1]["error"] is not None
+
@@ -0,0 +1,189 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import numpy as np
+import pytest
+from src.decimate import lttb_indices
+from src.events import detect_edges, first_spike
+from src.filters import exponential_filter, moving_average
+from src.resample import resample_uniform
+from src.utils import MISSING_TIMESTAMP, SpikeDetect, moving_average_filter
+
+rng = np.random.default_rng(0)
+SIGNALS = rng.normal(loc=1500, scale=400, size=(2000, 3))
+
+
+def low_pass_loop(arr, alpha):
+    # the original per sample realization of utils.low_pass_filter
+    smoothed = np.zeros_like(arr)
+    smoothed[0] = (1 - alpha) * arr[0]
+    for i in range(1, arr.shape[0]):
+        smoothed[i] = alpha * smoothed[i - 1] + (1 - alpha) * arr[i]
+    return smoothed
+
+
+@pytest.mark.parametrize("window_size", [1, 2, 5, 8, 16, 17, 31])
+def test_moving_average_matches_convolution(window_size):
+    expected = np.stack([moving_average_filter(SIGNALS[:, col], window_size) for col in range(3)], axis=1)
+    assert np.allclose(moving_average(SIGNALS, window_size), expected)
+    assert np.allclose(moving_average(SIGNALS[:, 0], window_size), expected[:, 0])
+
+
+def test_moving_average_nan_and_edges():
+    signal = np.array([1.0, 2.0, np.nan, 4.0, 5.0, 6.0])
+
+    assert np.array_equal(
+        moving_average(signal, 3), [1.0, np.nan, np.nan, np.nan, 5.0, 11 / 3], equal_nan=True
+    )
+    assert np.allclose(moving_average(signal, 3, nan_policy="omit", edge="shrink"), [1.5, 1.5, 3.0, 4.5, 5.0, 5.5])
+
+
+def test_moving_average_in_place():
+    data = SIGNALS.copy()
+    result = moving_average(data, 5, out=data)
+    assert result is data
+    assert np.allclose(data, moving_average(SIGNALS, 5))
+
+
+@pytest.mark.parametrize("alpha", [0.0, 0.5, 0.9, 0.995])
+def test_exponential_filter_matches_recursion(alpha):
+    assert np.allclose(exponential_filter(SIGNALS, alpha), low_pass_loop(SIGNALS, alpha))
+
+
+def test_exponential_filter_nan():
+    signal = SIGNALS[:50, 0].copy()
+    signal[20] = np.nan
+
+    assert np.isnan(exponential_filter(signal, 0.8)[20:]).all()
+
+    held = exponential_filter(signal, 0.8, nan_policy="omit")
+    assert held[20] == held[19]
+    expected = low_pass_loop(signal[:20], 0.8)
+    assert np.allclose(held[:20], expected)
+
+
+def test_detect_edges():
+    signal = np.array([0, 5, 3, 1, 0, 6, np.nan, 2, 7, 0.5, 9])
+
+    rises, falls = detect_edges(signal, rise_threshold=4, fall_threshold=1)
+    assert rises.tolist() == [1, 5, 10]
+    assert falls.tolist() == [3, 9, -1]
+
+    rises, falls = detect_edges(signal, rise_threshold=4, fall_threshold=1, min_dwell=3)
+    assert rises.tolist() == [5]
+    assert falls.tolist() == [9]
+
+
+def test_detect_edges_per_channel():
+    signals = rng.normal(size=(500, 3)).cumsum(axis=0)
+    rise_thresholds, fall_thresholds = [1.0, 2.0, 0.0], [0.0, 1.0, -1.0]
+
+    edges = detect_edges(signals, rise_thresholds, fall_thresholds)
+    for col, (rises, falls) in enumerate(edges):
+        expected_rises, expected_falls = detect_edges(signals[:, col], rise_thresholds[col], fall_thresholds[col])
+        assert np.array_equal(rises, expected_rises)
+        assert np.array_equal(falls, expected_falls)
+
+
+def test_first_spike_matches_spike_detect():
+    for _ in range(50):
+        signal = rng.normal(size=rng.integers(1, 80)).cumsum()
+        signal[rng.integers(0, len(signal))] = np.nan
+
+        detector = SpikeDetect()
+        for idx, value in enumerate(signal):
+            detector.detect(idx, value, 1.0, -0.5)
+
+        assert first_spike(signal, 1.0, -0.5) == (detector.rise_idx, detector.fall_idx)
+
+
+def lttb_loop(x, y, max_points):
+    # the textbook per bucket realization of Largest-Triangle-Three-Buckets
+    n = len(x)
+    bucket_size = (n - 2) / (max_points - 2)
+    selected = [0]
+    for bucket in range(max_points - 2):
+        lo, hi = int(bucket * bucket_size) + 1, int((bucket + 1) * bucket_size) + 1
+        next_lo, next_hi = hi, min(int((bucket + 2) * bucket_size) + 1, n)
+        if bucket == max_points - 3:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_x, next_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        a = selected[-1]
+        areas = [abs((x[a] - next_x) * (y[i] - y[a]) - (x[a] - x[i]) * (next_y - y[a])) for i in range(lo, hi)]
+        selected.append(lo + int(np.argmax(areas)))
+    return selected + [n - 1]
+
+
+def test_lttb_matches_loop():
+    x = np.arange(1002, dtype=float)
+    y = rng.normal(size=1002).cumsum()
+
+    assert lttb_indices(x, y, 102).tolist() == lttb_loop(x, y, 102)
+    assert lttb_indices(x[:50], y[:50], 100).tolist() == list(range(50))
+
+
+def lttb_bucket_loop(x, y, points):
+    # the buckets of _lttb_segment, with every bucket average taken by a plain loop over its samples
+    n = len(x)
+    edges = np.linspace(1, n - 1, points + 1).astype(np.int64)
+    selected = [0]
+    for bucket in range(points):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        if bucket == points - 1:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_lo, next_hi = edges[bucket + 1], edges[bucket + 2]
+            next_x = sum(x[i] for i in range(next_lo, next_hi)) / (next_hi - next_lo)
+            next_y = sum(y[i] for i in range(next_lo, next_hi)) / (next_hi - next_lo)
+        a = selected[-1]
+        areas = [abs((x[a] - next_x) * (y[i] - y[a]) - (x[a] - x[i]) * (next_y - y[a])) for i in range(lo, hi)]
+        selected.append(int(lo) + int(np.argmax(areas)))
+    return selected + [n - 1]
+
+
+@pytest.mark.parametrize("n,points", [(10, 3), (57, 5), (203, 17), (1000, 48)])
+def test_lttb_bucket_averages(n, points):
+    local_rng = np.random.default_rng(n)
+    x = np.sort(local_rng.uniform(0, 100, n))
+    # a large last sample pulls a wrong last bucket average away from the bucket
+    y = np.append(local_rng.normal(size=n - 1), 1e6)
+
+    assert lttb_indices(x, y, points + 2).tolist() == lttb_bucket_loop(x, y, points)
+
+
+def test_lttb_keeps_samples():
+    x = np.arange(5000, dtype=float)
+    y = rng.normal(size=5000).cumsum()
+    y[1000:1100] = np.nan
+
+    indices = lttb_indices(x, y, 300, keep=[1234, -1])
+    assert len(indices) <= 300
+    assert 1234 in indices
+    assert indices[0] == 0 and indices[-1] == 4999
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_resample_uniform():
+    # a repeated timestamp, a row without timestamp, a NaN value, a 1 s and a 13 s dropout
+    timestamps = np.array([100, 101, 101, 102, MISSING_TIMESTAMP, 104, 105, 106, 120, 121])
+    values = np.column_stack((
+        [0.0, 1.0, 9.0, 2.0, 9.0, 4.0, np.nan, 6.0, 20.0, 21.0],
+        np.arange(10.0),
+    ))
+
+    axis, resampled, valid, rows = resample_uniform(timestamps, values, max_gap=5)
+
+    assert axis.tolist() == list(range(100, 122))
+    assert resampled[:7, 0].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    assert resampled[:7, 1].tolist() == [0.0, 1.0, 3.0, 4.0, 5.0, 6.0, 7.0]
+    assert np.isnan(resampled[7:20, 0]).all() and resampled[20:, 0].tolist() == [20.0, 21.0]
+    assert valid.tolist() == [True] * 7 + [False] * 13 + [True] * 2
+    # every sample points to the first row recorded at or after it
+    assert rows[:8].tolist() == [0, 1, 3, 5, 5, 6, 7, 8]
+    assert rows[20:].tolist() == [8, 9]
+
+    # the clock going backwards sorts the rows, a 1-D channel keeps its shape
+    axis, resampled, valid, rows = resample_uniform(np.array([10, 12, 11]), np.array([0.0, 2.0, 1.0]))
+    assert axis.tolist() == [10, 11, 12] and resampled.tolist() == [0.0, 1.0, 2.0] and rows.tolist() == [0, 2, 1]
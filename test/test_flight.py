@@ -0,0 +1,52 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src import detector
+from src.detector import read_data, read_flight, detect_valid_takeoff_timestamp
+from src.flight import Flight
+from src.log_reader import read_log
+from src.utils import CSVColumns, TIMESTAMP_COLUMN
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_flight_detection_matches_dataframe():
+    for filename in TEST_FILES:
+        df, runways = read_data(DATA_DIR / filename)
+        flight = read_flight(DATA_DIR / filename)
+
+        assert flight.airport_code == filename[-8:-4]
+        assert flight[CSVColumns.GndSpd].dtype == flight[CSVColumns.Latitude].dtype == np.float64
+        assert np.array_equal(flight[TIMESTAMP_COLUMN], df[TIMESTAMP_COLUMN])
+        assert detect_valid_takeoff_timestamp(flight) == detect_valid_takeoff_timestamp(df, runways)
+
+    # a smoothed ground speed just above the threshold is a takeoff in both, float32 would round it down
+    df, runways = read_data(DATA_DIR / TEST_FILES[0])
+    _, takeoff_idx, _ = detect_valid_takeoff_timestamp(df, runways)
+    df.loc[takeoff_idx, CSVColumns.GndSpd] = detector.GROUND_SPEED_TAKEOFF_THRESHOLD + 1e-7
+    df.loc[takeoff_idx, CSVColumns.E1_RPM] = detector.ENGINE_SPEED_TAKEOFF_THRESHOLD
+    flight = Flight.from_dataframe(df, TEST_FILES[0], "KPAO", runways)
+    assert detect_valid_takeoff_timestamp(flight)[1] == detect_valid_takeoff_timestamp(df, runways)[1] == takeoff_idx
+
+
+def test_flight_text_channels():
+    df = read_log(DATA_DIR / "log_201007_164426______.csv", [CSVColumns.GPSfix, CSVColumns.E1_OilT])
+    flight = Flight("log", "", [], np.zeros(len(df), dtype=np.int64), {col: df[col].to_numpy() for col in df.columns})
+
+    assert flight[CSVColumns.GPSfix].dtype == np.int32
+    assert flight[CSVColumns.E1_OilT].dtype == np.float32
+    assert list(flight.decode(CSVColumns.GPSfix)) == [None if pd.isna(value) else value for value in df[CSVColumns.GPSfix]]
+    assert flight.nbytes < df.memory_usage(deep=True).sum()
+
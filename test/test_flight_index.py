@@ -0,0 +1,59 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import shutil
+from datetime import datetime
+from pathlib import Path
+from src import detector
+from src.flight_index import FlightIndex
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_main_flight_index(tmp_path, capsys):
+    data_dir = tmp_path / "logs"
+    data_dir.mkdir()
+    for name in TEST_FILES[:2]:
+        shutil.copy(DATA_DIR / name, data_dir / name)
+    index_path = tmp_path / "index.sqlite"
+
+    detector.main(str(tmp_path / "expected.txt"), data_dir=data_dir)
+    expected = (tmp_path / "expected.txt").read_text()
+
+    detector.main(str(tmp_path / "output.txt"), data_dir=data_dir, index_path=index_path)
+    assert (tmp_path / "output.txt").read_text() == expected
+
+    # only the changed log is read again, the output of the other comes from the index
+    capsys.readouterr()
+    changed = data_dir / TEST_FILES[1]
+    changed.write_bytes(changed.read_bytes())
+    detector.main(str(tmp_path / "output.txt"), data_dir=data_dir, index_path=index_path)
+    assert capsys.readouterr().out.splitlines() == [f"Read {TEST_FILES[1]}"]
+    assert (tmp_path / "output.txt").read_text() == expected
+
+    # only the logs read again are timed, so only they can be profiled
+    changed.write_bytes(changed.read_bytes())
+    detector.main(str(tmp_path / "output.txt"), data_dir=data_dir, index_path=index_path, profile=2, profile_dir=tmp_path / "profiles")
+    assert [path.name for path in (tmp_path / "profiles").iterdir()] == [f"{changed.stem}.prof"]
+
+    with FlightIndex(index_path) as index:
+        # the logs indexed without gap repair are read again by a repaired run
+        filepaths = [data_dir / name for name in TEST_FILES[:2]]
+        assert index.stale(filepaths, repair=False) == [] and index.stale(filepaths, repair=True) == filepaths
+        takeoffs = index.takeoffs(start=datetime(2020, 9, 1), end=datetime(2021, 1, 1))
+        assert [row["name"] for row in takeoffs] == TEST_FILES[:2]
+        assert [row["name"] for row in index.takeoffs("KSBA")] == [TEST_FILES[1]]
+        assert index.takeoffs("KPAO", end=datetime(2020, 9, 25)) == []
+        for row in takeoffs:
+            assert row["start_ts"] <= row["takeoff_ts"] <= row["end_ts"]
+            assert row["min_lat"] <= row["max_lat"] and row["min_long"] <= row["max_long"]
+
@@ -0,0 +1,87 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+from src.detector import read_data
+from shapely import Point
+from src.geo_utils import PointGrid, get_runway_catalog, load_airport_runways, on_runway, points_near, runway_index
+from src.utils import CSVColumns
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_runway_index_matches_on_runway():
+    df, runways = read_data(DATA_DIR / "log_201026_175003_KSBA.csv")
+    lat = df[CSVColumns.Latitude].to_numpy()
+    lng = df[CSVColumns.Longitude].to_numpy()
+
+    expected = [on_runway(la, lo, runways) for la, lo in zip(lat, lng)]
+    assert np.array_equal(runway_index(lat, lng, runways), expected)
+
+
+def test_runway_buffer_needs_numpy_engine(tmp_path):
+    # the batch stops before reading any log
+    env = {**os.environ, "SENSOR_DATA_RUNWAY_BUFFER_M": "10"}
+    output = subprocess.run(
+        [sys.executable, "-m", "src.detector", str(tmp_path / "output.txt")],
+        capture_output=True, text=True, env=env, cwd=Path(__file__).parent.parent,
+    )
+    assert output.returncode == 2 and "does not buffer the runways" in output.stderr
+    assert not (tmp_path / "output.txt").exists()
+
+    env["SENSOR_DATA_RUNWAY_ENGINE"] = "numpy"
+    command = [sys.executable, "-m", "src", "detect", str(DATA_DIR / TEST_FILES[0])]
+    output = subprocess.run(command, capture_output=True, text=True, env=env, cwd=Path(__file__).parent.parent, check=True)
+    assert output.stdout.startswith(TEST_FILES[0])
+
+
+def test_points_near_and_grid():
+    df, _ = read_data(DATA_DIR / "log_201026_175003_KSBA.csv")
+    lat = df[CSVColumns.Latitude].to_numpy()
+    lng = df[CSVColumns.Longitude].to_numpy()
+    center = Point(lng[300], lat[300])
+
+    expected = [idx for idx, (la, lo) in enumerate(zip(lat, lng)) if center.distance(Point(lo, la)) < 0.015]
+    assert points_near(lat, lng, center.y, center.x, 0.015).tolist() == expected
+
+    grid = PointGrid(lat, lng)
+    for idx in range(0, len(lat), 500):
+        for radius, metric in [(0.015, False), (0.001, False), (100.0, True), (2000.0, True)]:
+            assert np.array_equal(
+                grid.query(lat[idx], lng[idx], radius, metric), points_near(lat, lng, lat[idx], lng[idx], radius, metric)
+            )
+
+    # 0.001 degrees of latitude are 111 m
+    assert 0 in points_near(lat[:1] + 0.001, lng[:1], lat[0], lng[0], 112, metric=True)
+    assert 0 not in points_near(lat[:1] + 0.001, lng[:1], lat[0], lng[0], 110, metric=True)
+
+
+def test_runway_catalog():
+    catalog = get_runway_catalog()
+    assert get_runway_catalog() is catalog
+    assert load_airport_runways("_____") == []
+    assert catalog.runway_names("KSBA") == ["15R/33L", "15L/33R", "07/25"]
+
+    df, runways = read_data(DATA_DIR / "log_201026_175003_KSBA.csv")
+    lat = df[CSVColumns.Latitude].to_numpy()
+    lng = df[CSVColumns.Longitude].to_numpy()
+
+    # the flight departs KSBA and lands at KPAO
+    airport_ids, runway_ids = catalog.locate(lat, lng)
+    assert set(airport_ids) == {"", "KPAO", "KSBA"}
+    at_ksba = airport_ids != "KPAO"
+    assert np.array_equal(runway_ids[at_ksba], runway_index(lat, lng, runways)[at_ksba])
+
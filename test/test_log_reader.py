@@ -0,0 +1,48 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import os
+from pathlib import Path
+import pandas as pd
+from src import log_reader
+from src.log_reader import parse_log, read_log, cache_path
+from src.utils import CSVColumns
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+
+def test_c_engine_matches_regex_delimiter():
+    # a log with blank date/time cells and a truncated last row
+    for filename in ["log_201007_164426______.csv", "log_201125_092648_KPAO.csv"]:
+        filepath = DATA_DIR / filename
+        expected = pd.read_csv(filepath, header=1, delimiter=r',\s*', engine='python')
+        pd.testing.assert_frame_equal(parse_log(filepath), expected)
+
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_reader, "CACHE_DIR", tmp_path)
+    filepath = DATA_DIR / "log_201026_173916_KSBA.csv"
+    columns = [CSVColumns.LocalDate, CSVColumns.UTCOffset, CSVColumns.GndSpd, CSVColumns.E1_RPM]
+
+    first = read_log(filepath, columns, use_cache=True)
+    assert cache_path(filepath).exists()
+
+    cached = read_log(filepath, columns, use_cache=True)
+    pd.testing.assert_frame_equal(cached, first)
+    pd.testing.assert_frame_equal(cached, parse_log(filepath, columns))
+
+
+def test_cache_invalidated_on_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_reader, "CACHE_DIR", tmp_path / "cache")
+    filepath = tmp_path / "log_201026_173916_KSBA.csv"
+    filepath.write_bytes((DATA_DIR / filepath.name).read_bytes())
+
+    rows = len(read_log(filepath, use_cache=True))
+
+    # drop the last sample, the cache key must change with the file size and mtime
+    lines = filepath.read_text().splitlines(keepends=True)
+    filepath.write_text("".join(lines[:-1]))
+    os.utime(filepath, ns=(0, 0))
+
+    assert len(read_log(filepath, use_cache=True)) == rows - 1
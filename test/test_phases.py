@@ -0,0 +1,43 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+from pathlib import Path
+from src.detector import read_flight, detect_valid_takeoff_timestamp
+from src.phases import AIRBORNE, LANDING, LANDING_ROLL, TAKEOFF, TAKEOFF_ROLL, segment_phases
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_segment_phases_matches_first_takeoff():
+    for name in TEST_FILES:
+        flight = read_flight(DATA_DIR / name)
+        phases, events = segment_phases(flight)
+        _, takeoff_idx, runway_id = detect_valid_takeoff_timestamp(flight)
+
+        takeoffs = [(idx, runway) for kind, idx, runway in events if kind == TAKEOFF]
+        assert takeoffs[:1] == ([(takeoff_idx, runway_id)] if takeoff_idx >= 0 else [])
+        if takeoff_idx >= 0:
+            assert phases[takeoff_idx] == TAKEOFF_ROLL
+
+
+def test_segment_phases_touch_and_goes():
+    # a pattern flight of six circuits
+    flight = read_flight(DATA_DIR / "log_201114_112003_KPAO.csv")
+    phases, events = segment_phases(flight)
+
+    assert [kind for kind, _, _ in events] == [TAKEOFF, LANDING] * 6
+    assert all(runway == 0 for _, _, runway in events)
+    for (_, takeoff_idx, _), (_, landing_idx, _) in zip(events[::2], events[1::2]):
+        assert phases[takeoff_idx] == TAKEOFF_ROLL
+        assert phases[landing_idx] == LANDING_ROLL
+        assert (phases[takeoff_idx:landing_idx] == AIRBORNE).any()
+
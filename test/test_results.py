@@ -0,0 +1,78 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import json
+import os
+from pathlib import Path
+from src import detector
+from src.results import read_results
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_main_resume(tmp_path, monkeypatch, capsys):
+    filepaths = [DATA_DIR / name for name in TEST_FILES] + [tmp_path / "log_missing_KPAO.csv"]
+    monkeypatch.setattr(detector, "get_filepaths", lambda data_dir=None: filepaths)
+
+    output_file_path = tmp_path / "output.jsonl"
+    detector.main(str(output_file_path))
+    expected = output_file_path.read_text().splitlines()
+    results = read_results(output_file_path)
+    assert list(results) == [fp.name for fp in filepaths]
+    assert results[TEST_FILES[0]]["wall_s"] > 0 and results[TEST_FILES[0]]["error"] is None
+    assert results["log_missing_KPAO.csv"]["error"] is not None
+
+    # an interrupted run: the first result and part of the second were written
+    output_file_path.write_text(expected[0] + "\n" + expected[1][:20])
+    capsys.readouterr()
+    detector.main(str(output_file_path), resume=True)
+    assert capsys.readouterr().out.splitlines() == [f"Read {fp.name}" for fp in filepaths[1:]]
+    lines = output_file_path.read_text().splitlines()
+    assert lines[0] == expected[0]
+    assert [json.loads(line)["takeoff_idx"] for line in lines] == [json.loads(line)["takeoff_idx"] for line in expected]
+
+    # the failed log is retried
+    detector.main(str(output_file_path), resume=True)
+    assert capsys.readouterr().out.splitlines() == ["Read log_missing_KPAO.csv"]
+
+    # the text and csv results read back the same
+    for suffix in (".txt", ".csv"):
+        detector.main(str(tmp_path / f"output{suffix}"))
+        for name, result in read_results(tmp_path / f"output{suffix}").items():
+            assert (result["takeoff_ts"], result["takeoff_idx"], result["runway_id"]) == \
+                (results[name]["takeoff_ts"], results[name]["takeoff_idx"], results[name]["runway_id"])
+
+
+def test_main_resume_text(tmp_path, monkeypatch, capsys):
+    filepaths = [DATA_DIR / name for name in TEST_FILES] + [tmp_path / "log_missing_KPAO.csv"]
+    monkeypatch.setattr(detector, "get_filepaths", lambda data_dir=None: filepaths)
+
+    output_file_path = tmp_path / "output.txt"
+    detector.main(str(output_file_path))
+    expected = output_file_path.read_text()
+    # the failed log is written like a log without takeoff
+    assert "log_missing_KPAO.csv, -1, None, -1" in expected.splitlines()
+    # the rewritten output is created like any file, and keeps its permissions when resumed
+    umask = os.umask(0)
+    os.umask(umask)
+    assert output_file_path.stat().st_mode & 0o777 == 0o666 & ~umask
+    output_file_path.chmod(0o640)
+
+    # only the logs with a takeoff are known to be complete, the failed log is retried with the logs without takeoff
+    capsys.readouterr()
+    detector.main(str(output_file_path), resume=True)
+    retried = [line.split(", ")[0] for line in expected.splitlines() if line.endswith(", -1")]
+    assert "log_missing_KPAO.csv" in retried and len(retried) < len(filepaths)
+    assert capsys.readouterr().out.splitlines() == [f"Read {name}" for name in retried]
+    assert output_file_path.read_text() == expected
+    assert output_file_path.stat().st_mode & 0o777 == 0o640
+
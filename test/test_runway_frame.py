@@ -0,0 +1,70 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from src import detector
+from src.detector import read_data
+from src.runway_frame import EARTH_RADIUS_M, RunwayFrame
+from src.geo_utils import _runway_frame, load_airport_runways, runway_index
+from src.utils import CSVColumns
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_runway_frame_matches_shapely():
+    for name in TEST_FILES:
+        df, runways = read_data(DATA_DIR / name)
+        lat = df[CSVColumns.Latitude].to_numpy()
+        lng = df[CSVColumns.Longitude].to_numpy()
+        expected = runway_index(lat, lng, runways, engine="shapely")
+
+        frame = RunwayFrame.for_airport(detector.parse_airport_code(DATA_DIR / name))
+        assert len(frame) == len(runways)
+        assert np.array_equal(frame.locate(lat, lng), expected)
+        assert np.array_equal(runway_index(lat, lng, runways, engine="numpy"), expected)
+
+        # the buffer only adds samples next to the runways
+        buffered = runway_index(lat, lng, runways, engine="numpy", buffer_m=10)
+        assert (buffered[expected != -1] != -1).all()
+        assert (buffered != -1).sum() >= (expected != -1).sum()
+
+    # the runways of an airport are projected once per buffer
+    _runway_frame.cache_clear()
+    for _ in range(3):
+        runway_index(lat, lng, load_airport_runways("KMHR"), engine="numpy")
+    runway_index(lat, lng, load_airport_runways("KMHR"), engine="numpy", buffer_m=10)
+    assert _runway_frame.cache_info().misses == 2 and _runway_frame.cache_info().hits == 2
+
+    with pytest.raises(ValueError):
+        runway_index(lat, lng, runways, engine="shapely", buffer_m=10)
+
+
+def test_runway_frame_buffer_in_meters():
+    # a 1000 x 30 m runway at 70 degrees north, aligned east-west
+    half_lat = np.degrees(15 / EARTH_RADIUS_M)
+    half_long = np.degrees(500 / EARTH_RADIUS_M) / np.cos(np.radians(70))
+    ring = np.array([[-half_long, 70 - half_lat], [half_long, 70 - half_lat], [half_long, 70 + half_lat], [-half_long, 70 + half_lat]])
+    north_of_edge = np.degrees(np.array([14.0, 16.0, 24.0, 26.0]) / EARTH_RADIUS_M)
+
+    lat = np.append(70 + north_of_edge, np.nan)
+    lng = np.zeros(len(lat))
+    assert RunwayFrame([ring]).locate(lat, lng).tolist() == [0, -1, -1, -1, -1]
+    assert RunwayFrame([ring], buffer_m=10).locate(lat, lng).tolist() == [0, 0, 0, -1, -1]
+
+    code = "import sys, src.runway_frame; print('shapely' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=Path(__file__).parent.parent)
+    assert output.stdout.strip() == "False"
+
@@ -0,0 +1,60 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import io
+import matplotlib.pyplot as plt
+import numpy as np
+from src import runway_map
+from src.geo_utils import load_airport_runways
+
+def test_fetch_airport_imagery_downloads_once(tmp_path, monkeypatch):
+    from PIL import Image
+
+    png = io.BytesIO()
+    Image.new("RGB", (4, 4), "green").save(png, format="PNG")
+    downloads = []
+
+    class Response(io.BytesIO):
+        def __enter__(self):
+            return self
+
+    def urlopen(url, timeout=None):
+        downloads.append((url, timeout))
+        return Response(png.getvalue())
+
+    monkeypatch.setattr(runway_map, "MAP_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(runway_map.urllib.request, "urlopen", urlopen)
+
+    path = runway_map.fetch_airport_imagery("KPAO", (37.46, -122.11))
+    assert runway_map.fetch_airport_imagery("KPAO", (37.46, -122.11)) == path
+    assert path.read_bytes() == png.getvalue()
+    assert len(downloads) == 1 and downloads[0][1] == runway_map.MAP_FETCH_TIMEOUT
+
+    # another zoom level is another image
+    runway_map.fetch_airport_imagery("KPAO", (37.46, -122.11), zoom=16)
+    assert len(downloads) == 2
+
+    fig, ax = plt.subplots()
+    runways = load_airport_runways("KPAO")
+    runway_map.draw_runway_map(ax, "KPAO", runways, np.array([37.46]), np.array([-122.11]), imagery=True)
+    assert len(ax.images) == 1 and len(downloads) == 2
+    plt.close(fig)
+
+
+def test_draw_runway_map_offline(tmp_path, monkeypatch, capsys):
+    def urlopen(url, timeout=None):
+        raise OSError("network is unreachable")
+
+    monkeypatch.setattr(runway_map, "MAP_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(runway_map.urllib.request, "urlopen", urlopen)
+
+    fig, ax = plt.subplots()
+    runways = load_airport_runways("KSBA")
+    runway_map.draw_runway_map(ax, "KSBA", runways, np.array([34.42]), np.array([-119.84]), (34.42, -119.84), 2, imagery=True)
+
+    assert "No imagery of KSBA: network is unreachable" in capsys.readouterr().err
+    assert len(ax.images) == 0 and len(ax.patches) == len(runways)
+    assert not any(tmp_path.iterdir())
+    plt.close(fig)
+
@@ -0,0 +1,38 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+from pathlib import Path
+import numpy as np
+from src.detector import read_data, detect_valid_takeoff_timestamp
+from src.streaming import StreamingMovingAverage, detect_takeoff_streaming
+from src.utils import moving_average_filter
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_streaming_moving_average_matches_filter():
+    signal = np.random.default_rng(0).normal(size=(40, 2))
+    signal[7, 1] = np.nan
+
+    smoother = StreamingMovingAverage(5, 2)
+    smoothed = np.concatenate([smoother.push(signal[:2]), smoother.push(signal[2:3]), smoother.push(signal[3:]), smoother.flush()])
+
+    expected = np.stack([moving_average_filter(signal[:, col], 5) for col in range(2)], axis=1)
+    assert np.allclose(smoothed, expected, equal_nan=True)
+
+
+def test_streaming_matches_vectorized():
+    for filename in TEST_FILES:
+        df, runways = read_data(DATA_DIR / filename)
+        expected = detect_valid_takeoff_timestamp(df, runways)
+        assert detect_takeoff_streaming(DATA_DIR / filename, chunksize=100) == expected
+
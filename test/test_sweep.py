@@ -0,0 +1,57 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import shutil
+from pathlib import Path
+from src import detector
+from src.sweep import run_sweep, summarize_sweep
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_sweep_matches_detector():
+    filepaths = [DATA_DIR / name for name in TEST_FILES]
+    sweep = run_sweep(filepaths, windows=[1, 5], altitude_errors=[25, 50], ground_speeds=[25, 40], engine_speeds=[1200, 2100])
+    assert len(sweep) == len(filepaths) * 16
+
+    for fp in filepaths:
+        _, takeoff_idx, _ = detector.process_file(fp, "vectorized")
+        rows = sweep[sweep["name"] == fp.name]
+        baseline = rows[
+            (rows["window_size"] == 5) & (rows["altitude_error"] == 50) &
+            (rows["ground_speed_threshold"] == 25) & (rows["engine_speed_threshold"] == 1200)
+        ]
+        assert baseline["takeoff_idx"].tolist() == [takeoff_idx]
+        assert (rows["baseline_idx"] == takeoff_idx).all()
+        # raising the thresholds never detects the takeoff earlier
+        strict = rows[(rows["ground_speed_threshold"] == 40) & (rows["engine_speed_threshold"] == 2100)]["takeoff_idx"]
+        loose = rows[(rows["ground_speed_threshold"] == 25) & (rows["engine_speed_threshold"] == 1200)]["takeoff_idx"]
+        detected = strict.to_numpy() >= 0
+        assert (strict.to_numpy()[detected] >= loose.to_numpy()[detected]).all()
+
+    summary = summarize_sweep(sweep)
+    assert len(summary) == 16
+    assert summary["changed"].min() == 0
+
+
+def test_sweep_without_runways(tmp_path):
+    filepath = tmp_path / "log_200925_142645_XXXX.csv"
+    shutil.copy(DATA_DIR / TEST_FILES[0], filepath)
+
+    sweep = run_sweep([filepath], windows=[1, 5], altitude_errors=[50], ground_speeds=[25], engine_speeds=[1200])
+    assert sweep.empty
+    assert sweep.columns.tolist() == [
+        "name", "window_size", "altitude_error", "ground_speed_threshold", "engine_speed_threshold",
+        "takeoff_idx", "baseline_idx", "shift",
+    ]
+    assert summarize_sweep(sweep).empty
+
@@ -0,0 +1,17 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+from src import detector
+from src.synthetic import write_synthetic_log
+
+def test_synthetic_log_takeoff(tmp_path):
+    filepath, takeoff_idx = write_synthetic_log(tmp_path, "KPAO", "takeoff", duration=1500, seed=3)
+    _, takeoff_ts_idx, _ = detector.process_file(filepath, "vectorized")
+    assert takeoff_idx >= 0
+    assert 0 <= takeoff_ts_idx - takeoff_idx <= 3
+
+    filepath, takeoff_idx = write_synthetic_log(tmp_path, "KPAO", "ground", duration=1500, seed=4)
+    assert takeoff_idx == -1
+    assert detector.process_file(filepath, "vectorized")[1] == -1
+
@@ -4,7 +4,8 @@
 
 import csv
 from pathlib import Path
-from src.utils import CSVColumns, create_timestamp
+from src.utils import CSVColumns, TIMESTAMP_COLUMN, timestamp_to_index
+from src import detector
 from src.detector import read_data, GROUND_SPEED_TAKEOFF_THRESHOLD, ENGINE_SPEED_TAKEOFF_THRESHOLD, ALTITUDE_ERROR
 from src.geo_utils import on_runway
 from shapely import Polygon
@@ -16,20 +17,23 @@ ALTITUDE_KERNEL = [1., 0, 0, 0, 0, 0, 0, 0, -1.0]
 def determine_runway(df: pd.DataFrame, runways: list[tuple[Polygon, float]]):
     for row_ind, row in df.iterrows():
         for runway in runways:
-            if on_runway(row[CSVColumns.Latitude], row[CSVColumns.Longitude], runway):
+            if on_runway(row[CSVColumns.Latitude], row[CSVColumns.Longitude], runway) != -1:
                 return runway
     return None
 
 
-def test_takeoff_detection():
-    # load output file
+def test_takeoff_detection(tmp_path):
+    # detect the takeoffs of every log into a fresh output file
     data_dir = Path(__file__).parent / ".." / "data" / "cessna_182t" / ""
-    with open('output.txt') as fp:
+    output_file_path = tmp_path / "output.txt"
+    detector.main(str(output_file_path), data_dir=data_dir)
+    with open(output_file_path) as fp:
         reader = csv.reader(fp, delimiter=',', quotechar='|')
         for row in reader:
             takeoff_test_indx = -1
+            # output rows are: filename, runway id, timestamp, takeoff index
             filename = row[0]
-            timestamp = float(row[1].strip()) if row[1].strip() != 'None' else None
+            timestamp = float(row[2].strip()) if row[2].strip() != 'None' else None
 
             df, runways = read_data(Path(data_dir / filename))
 
@@ -39,7 +43,7 @@ def test_takeoff_detection():
 
             # add 'on runway' feature
             if runway is not None:
-                df['on_runway'] = [on_runway(lat, long, runway) for lat, long in zip(df[CSVColumns.Latitude], df[CSVColumns.Longitude])]
+                df['on_runway'] = [on_runway(lat, long, runway) != -1 for lat, long in zip(df[CSVColumns.Latitude], df[CSVColumns.Longitude])]
             else:
                 df['on_runway'] = [False] * df[CSVColumns.Latitude].size
 
@@ -50,20 +54,9 @@ def test_takeoff_detection():
             non_zero_ground_speed = (df[CSVColumns.GndSpd].transpose().to_numpy() > GROUND_SPEED_TAKEOFF_THRESHOLD) & on_runway_true & altitude_on_ground
             engine_rpm_reached = (df[CSVColumns.E1_RPM].transpose().to_numpy() > ENGINE_SPEED_TAKEOFF_THRESHOLD) & on_runway_true & altitude_on_ground
 
-            def get_timestamp(item):
-                _, row = item
-                try:
-                    return create_timestamp(
-                        row[CSVColumns.LocalDate],
-                        row[CSVColumns.LocalTime],
-                        row[CSVColumns.UTCOffset]
-                    ) == timestamp
-                except Exception as e:
-                    return False
-
             takeoff_indx = -1
             if timestamp != None:
-                takeoff_indx = list(map(get_timestamp, df.iterrows())).index(True)
+                takeoff_indx = timestamp_to_index(df[TIMESTAMP_COLUMN].to_numpy(), timestamp)
 
                 assert(takeoff_indx >= 0)
 
@@ -88,5 +81,3 @@ def test_takeoff_detection():
                 assert df[CSVColumns.GndSpd].iloc[takeoff_indx] > GROUND_SPEED_TAKEOFF_THRESHOLD or df[CSVColumns.E1_RPM].iloc[takeoff_indx] > ENGINE_SPEED_TAKEOFF_THRESHOLD
             else:
                 assert timestamp == None
-
-test_takeoff_detection()
\ No newline at end of file
@@ -0,0 +1,41 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+from pathlib import Path
+import numpy as np
+from src.detector import read_data
+from src.utils import CSVColumns, MISSING_TIMESTAMP, TIMESTAMP_COLUMN, create_timestamp, timestamp_to_index
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+
+def test_create_timestamp_applies_utc_offset():
+    # 13:32:18 PDT is 20:32:18 UTC
+    assert create_timestamp("2020-09-22", "13:32:18", "-07:00") == 1600806738.0
+
+
+def test_timestamp_axis():
+    # this log has rows with blank date and time cells and a truncated offset in its last row
+    for filename in ["log_201007_164426______.csv", "log_200922_133229_KPAO.csv"]:
+        df, _ = read_data(DATA_DIR / filename)
+        timestamps = df[TIMESTAMP_COLUMN].to_numpy()
+
+        for idx, (date, time, offset) in enumerate(
+            zip(df[CSVColumns.LocalDate], df[CSVColumns.LocalTime], df[CSVColumns.UTCOffset])
+        ):
+            try:
+                expected = create_timestamp(str(date), str(time), str(offset))
+            except ValueError:
+                assert timestamps[idx] == MISSING_TIMESTAMP
+                continue
+
+            assert timestamps[idx] == expected
+            # duplicated timestamps resolve to their first sample
+            assert timestamp_to_index(timestamps, expected) == np.flatnonzero(timestamps == expected)[0]
+
+    # a missing timestamp breaks the order, the first duplicate still wins
+    assert timestamp_to_index(np.array([10, MISSING_TIMESTAMP, 10, 11]), 10) == 0
+    assert timestamp_to_index(np.array([10, MISSING_TIMESTAMP, 10, 11]), 12) == -1
+    assert timestamp_to_index(np.array([10, 10, 11]), 11) == 2
+
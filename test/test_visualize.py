@@ -0,0 +1,56 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+from pathlib import Path
+from src import detector
+from src.detector import read_data
+from src.visualize import plot_charts, render_charts
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_plot_charts():
+    df, runways = read_data(DATA_DIR / TEST_FILES[1])
+    ts, takeoff_idx, runway_id = detector.process_file(DATA_DIR / TEST_FILES[1])
+    figures = []
+    plot_charts(TEST_FILES[1], df, takeoff_idx, runways[runway_id], lambda fig, name: figures.append(fig), max_points=500, runways=runways)
+
+    ground_speed, rpm, altitude, runway_panel = figures[0].axes[:4]
+    for ax in (ground_speed, rpm, altitude):
+        series, takeoff = ax.lines
+        assert len(series.get_xdata()) <= 500
+        # the takeoff sample survives the decimation
+        assert takeoff_idx in series.get_xdata() and takeoff.get_xdata()[0] == takeoff_idx
+    assert runway_panel.get_title() == "Runway"
+
+    # a log without takeoff has no takeoff marker nor runway map
+    df, _ = read_data(DATA_DIR / TEST_FILES[2])
+    plot_charts(TEST_FILES[2], df, -1, None, lambda fig, name: figures.append(fig))
+    assert [len(ax.lines) for ax in figures[1].axes[:3]] == [1, 1, 1]
+    assert not figures[1].axes[3].has_data()
+
+
+def test_render_charts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    names = [TEST_FILES[0], TEST_FILES[2], "log_missing_KPAO.csv"]
+    output_file_path = tmp_path / "output.txt"
+    lines = []
+    for name in names[:2]:
+        ts, idx, runway_id = detector.process_file(DATA_DIR / name)
+        lines.append(f"{name}, {runway_id}, {ts}, {idx}\n")
+    output_file_path.write_text("".join(lines) + "log_missing_KPAO.csv, -1, None, -1\n")
+
+    failures = render_charts(str(output_file_path), DATA_DIR)
+
+    assert [name for name, _ in failures] == ["log_missing_KPAO.csv"]
+    assert sorted(path.name for path in (tmp_path / "plots").iterdir()) == [f"plot_{name}.png" for name in sorted(names[:2])]
+
@@ -0,0 +1,134 @@
+#
+# Copyright: Jose Rojas, 2024
+#
+
+import asyncio
+import os
+import shutil
+from pathlib import Path
+from src import detector, watch as watch_module
+from src.results import read_results
+from src.watch import watch
+
+DATA_DIR = Path(__file__).parent / ".." / "data" / "cessna_182t"
+
+TEST_FILES = [
+    "log_200925_142645_KPAO.csv",  # takeoff on the only runway
+    "log_201026_175003_KSBA.csv",  # takeoff on the third of several runways
+    "log_201026_171400_KSBA.csv",  # no takeoff
+    "log_200927_082601_KPAO.csv",  # short log, no takeoff
+    "log_200927_101351_KMHR.csv",
+]
+
+
+def test_watch_folder(tmp_path):
+    data_dir = tmp_path / "logs"
+    data_dir.mkdir()
+    shutil.copy(DATA_DIR / TEST_FILES[0], data_dir / TEST_FILES[0])
+    output_file_path = tmp_path / "output.txt"
+
+    async def scenario():
+        stop = asyncio.Event()
+        results = []
+
+        def on_result(result):
+            results.append(result["file"])
+            if len(results) == 1:
+                # a log being written is only read once complete
+                with open(data_dir / TEST_FILES[1], "wb") as f:
+                    f.write((DATA_DIR / TEST_FILES[1]).read_bytes()[:1000])
+            else:
+                stop.set()
+
+        task = asyncio.create_task(
+            watch(data_dir, str(output_file_path), interval=0.05, settle=0.5, stop=stop, on_result=on_result)
+        )
+        while len(results) < 1:
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.2)
+        with open(data_dir / TEST_FILES[1], "ab") as f:
+            f.write((DATA_DIR / TEST_FILES[1]).read_bytes()[1000:])
+        assert await asyncio.wait_for(task, timeout=30) == 2
+        return results
+
+    assert asyncio.run(scenario()) == TEST_FILES[:2]
+    expected = [detector.process_file(DATA_DIR / name) for name in TEST_FILES[:2]]
+    results = read_results(output_file_path)
+    assert [(r["takeoff_idx"], r["runway_id"]) for r in results.values()] == [(idx, runway) for _, idx, runway in expected]
+
+    # the processed logs are not read again
+    async def rerun():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.3, stop.set)
+        return await watch(data_dir, str(output_file_path), interval=0.05, settle=0, stop=stop)
+
+    assert asyncio.run(rerun()) == 0
+
+    # a log modified while the service was down is read again
+    modified = (data_dir / TEST_FILES[0]).stat().st_mtime_ns - 10 ** 10
+    os.utime(data_dir / TEST_FILES[0], ns=(modified, modified))
+    assert asyncio.run(rerun()) == 1
+
+    # restarts over logs without takeoff keep one line per log
+    shutil.copy(DATA_DIR / TEST_FILES[2], data_dir / TEST_FILES[2])
+    assert [asyncio.run(rerun()) for _ in range(3)] == [1, 0, 0]
+    assert [line.split(",")[0] for line in output_file_path.read_text().splitlines()] == sorted(TEST_FILES[:3])
+    assert read_results(output_file_path)[TEST_FILES[2]]["takeoff_idx"] == -1
+
+
+def _crash_on_kpao(fp, mode, stream):
+    # kills the worker process running it, like the out of memory killer
+    if fp.name.endswith("KPAO.csv"):
+        os._exit(1)
+    return detector._process_file_safe(fp, mode, stream)
+
+
+def test_watch_survives_failures(tmp_path, monkeypatch, capsys):
+    data_dir = tmp_path / "logs"
+    data_dir.mkdir()
+    for name in TEST_FILES[:2]:
+        shutil.copy(DATA_DIR / name, data_dir / name)
+    (data_dir / "log_vanishing_KPAO.csv").write_text("removed between the listing and the stat")
+    output_file_path = tmp_path / "output.txt"
+
+    # a log removed while the directory is scanned is skipped
+    listing = os.scandir
+
+    class Vanishing:
+        def __init__(self, path):
+            self.entries = listing(path)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.entries.close()
+
+        def __iter__(self):
+            for entry in self.entries:
+                if entry.name == "log_vanishing_KPAO.csv":
+                    os.remove(entry.path)
+                yield entry
+
+    monkeypatch.setattr(watch_module.os, "scandir", Vanishing)
+    # the crashed worker fails its log, the next log is processed by a new pool
+    monkeypatch.setattr(watch_module, "_process_file_safe", _crash_on_kpao)
+
+    def run():
+        async def until_idle():
+            stop = asyncio.Event()
+            asyncio.get_running_loop().call_later(1.0, stop.set)
+            return await watch(data_dir, str(output_file_path), interval=0.05, settle=0, stop=stop)
+        return asyncio.run(until_idle())
+
+    assert run() == 2
+    results = read_results(output_file_path)
+    assert list(results) == TEST_FILES[:2]
+    assert results[TEST_FILES[0]]["takeoff_idx"] == -1 and results[TEST_FILES[1]]["takeoff_idx"] >= 0
+    assert f"Failed {TEST_FILES[0]}: BrokenProcessPool" in capsys.readouterr().err
+
+    # the failed log of the text output is retried
+    monkeypatch.undo()
+    assert run() == 1
+    assert read_results(output_file_path)[TEST_FILES[0]]["takeoff_idx"] >= 0
+